@@ -1,7 +1,7 @@
 #%% send a component to a lumerical instance
 import os
 import lumapi
-from gds_fdtd.lum_tools import to_lumerical, setup_lum_fdtd
+from gds_fdtd.lum_tools import setup_lum_fdtd
 from gds_fdtd.core import parse_yaml_tech
 from gds_fdtd.simprocessor import load_component_from_tech
 from gds_fdtd.lyprocessor import load_layout
@@ -19,9 +19,15 @@ if __name__ == "__main__":
     fdtd = lumapi.FDTD()  # can also be mode/device
     print(type(fdtd))
 
-    to_lumerical(c=component, lum=fdtd)
-
-    #setup_lum_fdtd(c=component, lum=fdtd)
+    # geometry, ports, mesh and an s-parameter sweep exciting all ports
+    setup_lum_fdtd(
+        c=component,
+        lum=fdtd,
+        in_port="all",
+        wavl_min=1.5,
+        wavl_max=1.6,
+        mesh_accuracy=2,
+    )
 
     input('Proceed to terminate the GUI?')
 # %%
@@ -0,0 +1,27 @@
+#%% export a lumerical fdtd setup script, no lumerical installation required
+import os
+from gds_fdtd.lum_tools import export_lsf
+from gds_fdtd.core import parse_yaml_tech
+from gds_fdtd.simprocessor import load_component_from_tech
+from gds_fdtd.lyprocessor import load_layout
+
+if __name__ == "__main__":
+    # note materials definition format in yaml
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = parse_yaml_tech(tech_path)
+
+    file_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = load_layout(file_gds)
+    component = load_component_from_tech(ly=layout, tech=technology)
+
+    # run the script on a licensed host, i.e. fdtd-solutions -run si_sin_escalator.lsf
+    export_lsf(
+        component,
+        f"{component.name}.lsf",
+        wavl_min=1.5,
+        wavl_max=1.6,
+        num_modes=1,
+        mesh_accuracy=2,
+        fsp=f"{component.name}.fsp",
+    )
+# %%
@@ -4,7 +4,6 @@
 @author: Mustafa Hammood
 """
 import gds_fdtd as gtd
-import tidy3d as td
 import os
 
 
@@ -12,33 +11,40 @@ if __name__ == "__main__":
 
     tech_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tech.yaml")
     technology = gtd.core.parse_yaml_tech(tech_path)
+    layers = [d["layer"] for d in technology["device"]]
 
     # Define the path to the GDS file
     file_gds = os.path.join(os.path.dirname(os.path.dirname(__file__)), "devices.gds")
 
-    device = gtd.lyprocessor.load_device(file_gds, top_cell='bragg_te1550', tech=technology, prefab="ANT_NanoSOI_ANF1_d9")
+    # the grating's periods are detected on the nominal layout
+    layout = gtd.lyprocessor.load_layout(file_gds, top_cell="bragg_te1550")
+    section = gtd.periodic.detect_periodic(layout, layers)
+    print(section)
 
-    simulation = gtd.simprocessor.build_sim_from_tech(
+    # writes the prefab prediction of the device to devices_with_extensions.gds
+    gtd.lyprocessor.load_device(
+        file_gds,
+        top_cell="bragg_te1550",
         tech=technology,
-        layout=layout,
-        in_port=0,
-        wavl_min=1.,
-        wavl_max=1.4,
+        prefab="ANT_NanoSOI_ANF1_d9",
+    )
+    layout = gtd.lyprocessor.load_layout(
+        file_gds.replace(".gds", "_with_extensions.gds"), top_cell="bragg_te1550"
+    )
+
+    # simulate one unit cell (and the leads, if any), then cascade the cells.
+    # CHECK THE SIMULATIONS IN THE UI BEFORE RUNNING!
+    sparams = gtd.periodic.run_periodic(
+        layout,
+        technology,
+        section=section,
+        wavl_min=1.5,
+        wavl_max=1.6,
         wavl_pts=501,
         grid_cells_per_wvl=6,
-        symmetry=(
-            0,
-            0,
-            0,
-        ),  # ensure structure is symmetric across symmetry axis before triggering this!
         z_span=4,
-        field_monitor_axis="y",
     )
-
-    simulation.upload()
-    # run the simulation. CHECK THE SIMULATION IN THE UI BEFORE RUNNING!
-    simulation.execute()
     #  visualize the results
-    simulation.visualize_results()
+    sparams.plot()
 
 # %%
@@ -1,5 +1,23 @@
 """gds_fdtd Top-level package imports."""
-from . import core, lyprocessor, simprocessor
+from . import (
+    core,
+    lyprocessor,
+    simprocessor,
+    rational,
+    execution,
+    cache,
+    backends,
+    ledger,
+    results,
+    sparam_io,
+    circuit,
+    periodic,
+    sweep,
+    convergence,
+    pipeline,
+    variation,
+    lum_tools,
+)
 
 __author__ = """Mustafa Hammood"""
 __email__ = "mustafa@siepic.com"
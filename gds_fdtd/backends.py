@@ -0,0 +1,176 @@
+"""
+gds_fdtd integration toolbox.
+
+Simulation execution backends module.
+@author: Mustafa Hammood, 2024
+"""
+
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+import tidy3d as td
+
+
+class backend:
+    """Execution backend interface.
+
+    A backend submits simulations, reports their status, downloads their results
+    into a local .hdf5 file and loads the downloaded results.
+    """
+
+    def submit(self, sim: td.Simulation, task_name: str) -> str:
+        """Submit a simulation for execution and return its task id."""
+        raise NotImplementedError
+
+    def poll(self, task_id: str) -> str:
+        """Return the task's status, i.e. 'queued', 'running', 'success' or 'error'."""
+        raise NotImplementedError
+
+    def download(self, task_id: str, path: str):
+        """Download the results of a finished task to path."""
+        raise NotImplementedError
+
+    def load(self, path: str):
+        """Load downloaded results lazily, see results.lazy_sim_data."""
+        from .results import lazy_sim_data
+
+        return lazy_sim_data(path)
+
+
+class tidy3d_backend(backend):
+    """Tidy3D cloud backend."""
+
+    def __init__(self, folder_name: str = "default", verbose: bool = False):
+        self.folder_name = folder_name
+        self.verbose = verbose
+
+    def submit(self, sim, task_name):
+        from tidy3d import web
+
+        task_id = web.upload(
+            sim, task_name=task_name, folder_name=self.folder_name, verbose=self.verbose
+        )
+        web.start(task_id)
+        return task_id
+
+    def poll(self, task_id):
+        from tidy3d import web
+
+        return web.get_info(task_id).status
+
+    def download(self, task_id, path):
+        from tidy3d import web
+
+        web.download(task_id=task_id, path=path, verbose=self.verbose)
+
+
+def synthetic_sim_data(sim: td.Simulation, delay: float = 1e-13) -> td.SimulationData:
+    """Generate passive synthetic mode monitor data for a simulation.
+
+    The monitor nearest to each mode source records a unit amplitude in the
+    source's direction and mode. Every other port, direction and mode carries an
+    equal share of the power, with the phase exp(2j * pi * f * delay) of tidy3d's
+    exp(-1j * w * t) convention and an all-pass resonance at the source's central
+    frequency.
+
+    Args:
+        sim (td.Simulation): Simulation to generate data for.
+        delay (float, optional): Group delay of the synthetic response, in seconds.
+            Defaults to 1e-13.
+
+    Returns:
+        td.SimulationData: Synthetic results, field monitors are left empty.
+    """
+    monitors = [m for m in sim.monitors if isinstance(m, td.ModeMonitor)]
+    num_channels = max(sum(2 * m.mode_spec.num_modes for m in monitors) - 1, 1)
+    sources = [s for s in sim.sources if isinstance(s, td.ModeSource)]
+    if sources:
+        f_res = sources[0].source_time.freq0
+        width = sources[0].source_time.fwidth / 10
+    elif monitors:
+        freqs = [f for m in monitors for f in m.freqs]
+        f_res, width = np.mean(freqs), np.ptp(freqs) / 10 or 1.0
+
+    data = []
+    for m in monitors:
+        num_modes = m.mode_spec.num_modes
+        freqs = np.array(m.freqs)
+        # pole at f_res - 1j * width, stable under exp(-1j * w * t)
+        u = 1j * (freqs - f_res) / width
+        resonance = (1 + u) / (1 - u)
+        response = np.exp(2j * np.pi * freqs * delay) * resonance
+        amps = np.ones((2, len(freqs), num_modes), dtype=complex)
+        amps *= response[None, :, None] / np.sqrt(num_channels)
+        for source in sources:
+            nearest = min(
+                monitors,
+                key=lambda mon: np.linalg.norm(np.subtract(mon.center, source.center)),
+            )
+            if nearest.name == m.name:
+                amps[0 if source.direction == "+" else 1, :, source.mode_index] = 1.0
+        coords = dict(f=list(freqs), mode_index=list(range(num_modes)))
+        data.append(
+            td.ModeData(
+                monitor=m,
+                amps=td.ModeAmpsDataArray(
+                    amps, coords=dict(direction=["+", "-"], **coords)
+                ),
+                n_complex=td.ModeIndexDataArray(
+                    np.ones((len(freqs), num_modes)), coords=coords
+                ),
+            )
+        )
+    return td.SimulationData(simulation=sim, data=data)
+
+
+class local_backend(backend):
+    """Offline stand-in backend returning synthetic or replayed results.
+
+    Tasks finish after latency and fail with probability failure_rate. Results are
+    replayed from replay_dir/<task_name>.hdf5, or else from synthetic_sim_data.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        replay_dir: str | None = None,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.replay_dir = replay_dir
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.tasks = {}
+
+    def submit(self, sim, task_name):
+        task_id = f"local-{uuid.uuid4().hex}"
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+            self.tasks[task_id] = {
+                "sim": sim,
+                "task_name": task_name,
+                "submitted": time.monotonic(),
+                "failed": failed,
+            }
+        return task_id
+
+    def poll(self, task_id):
+        task = self.tasks[task_id]
+        if time.monotonic() - task["submitted"] < self.latency:
+            return "running"
+        return "error" if task["failed"] else "success"
+
+    def download(self, task_id, path):
+        task = self.tasks[task_id]
+        if self.replay_dir is not None:
+            replay_path = os.path.join(self.replay_dir, f"{task['task_name']}.hdf5")
+            if os.path.exists(replay_path):
+                shutil.copyfile(replay_path, path)
+                return
+        synthetic_sim_data(task["sim"]).to_file(path)
@@ -0,0 +1,140 @@
+"""
+gds_fdtd integration toolbox.
+
+Simulation result cache module.
+@author: Mustafa Hammood, 2024
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tidy3d as td
+
+
+def simulation_hash(sim: td.Simulation) -> str:
+    """Stable content hash of a simulation.
+
+    Args:
+        sim (td.Simulation): Simulation to hash.
+
+    Returns:
+        str: sha256 hex digest of the simulation's JSON definition.
+    """
+    return hashlib.sha256(sim._json_string.encode("utf-8")).hexdigest()
+
+
+class result_cache:
+    """Local simulation result cache, keyed on the simulation's content hash.
+
+    Results are stored as <hash>.hdf5 files in cache_dir. Each hit refreshes the
+    entry's modification time, and the least recently used entries are evicted
+    once the cache grows beyond max_size.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_size: float = 10e9):
+        """
+        Args:
+            cache_dir (str, optional): Cache directory. Defaults to ~/.cache/gds_fdtd.
+            max_size (float, optional): Cache size cap, in bytes. Defaults to 10 GB.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "gds_fdtd")
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.hdf5")
+
+    def __contains__(self, sim: td.Simulation) -> bool:
+        return os.path.exists(self.path(simulation_hash(sim)))
+
+    def get(self, sim: td.Simulation):
+        """Load the cached results of a simulation.
+
+        Args:
+            sim (td.Simulation): Simulation to look up.
+
+        Returns:
+            results.lazy_sim_data: Handle to the cached results, None on a cache miss.
+        """
+        from .results import lazy_sim_data
+
+        path = self.path(simulation_hash(sim))
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # mark as recently used
+        return lazy_sim_data(path)
+
+    def put(self, sim: td.Simulation, data_path: str) -> str:
+        """Store a simulation's results file, evicting old entries over the size cap.
+
+        Args:
+            sim (td.Simulation): Simulation the results belong to.
+            data_path (str): Path of the .hdf5 results file to store.
+
+        Returns:
+            str: Cache key of the stored entry.
+        """
+        key = simulation_hash(sim)
+        tmp_path = self.path(key) + ".tmp"
+        shutil.copyfile(data_path, tmp_path)
+        os.replace(tmp_path, self.path(key))
+        self.prune()
+        return key
+
+    def entries(self) -> list[dict]:
+        """List the cached entries, most recently used first.
+
+        Returns:
+            list: Entries as dicts with 'key', 'path', 'size' (bytes) and 'last_used'
+                (timestamp).
+        """
+        entries = []
+        for fname in os.listdir(self.cache_dir):
+            if not fname.endswith(".hdf5"):
+                continue
+            path = os.path.join(self.cache_dir, fname)
+            stat = os.stat(path)
+            entries.append(
+                {
+                    "key": fname[: -len(".hdf5")],
+                    "path": path,
+                    "size": stat.st_size,
+                    "last_used": stat.st_mtime,
+                }
+            )
+        return sorted(entries, key=lambda e: e["last_used"], reverse=True)
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached entries, in bytes."""
+        return sum(e["size"] for e in self.entries())
+
+    def evict(self, key: str):
+        """Remove an entry from the cache."""
+        if os.path.exists(self.path(key)):
+            os.remove(self.path(key))
+
+    def prune(self, max_size: float | None = None):
+        """Evict least recently used entries until the cache is within max_size.
+
+        Args:
+            max_size (float, optional): Size cap, in bytes. Defaults to the cache's
+                max_size.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = self.entries()
+        total = sum(e["size"] for e in entries)
+        while entries and total > max_size:
+            e = entries.pop()
+            self.evict(e["key"])
+            total -= e["size"]
+            logging.info(f"Evicted cached result {e['key']}.")
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for e in self.entries():
+            self.evict(e["key"])
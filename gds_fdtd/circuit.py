@@ -0,0 +1,160 @@
+"""
+gds_fdtd integration toolbox.
+
+Circuit-level s-parameter solver module.
+@author: Mustafa Hammood, 2024
+"""
+
+import logging
+import numpy as np
+from .core import s_parameters
+
+
+def resample(sparams: s_parameters, freq) -> s_parameters:
+    """Linearly interpolate s-parameters onto a new frequency grid.
+
+    Real and imaginary parts are interpolated for all entries at once. Frequencies
+    outside of the original range are clamped to the edge values.
+
+    Args:
+        sparams (s_parameters): s-parameters to resample.
+        freq (np.ndarray): New frequencies (Hz).
+
+    Returns:
+        s_parameters: Resampled s-parameters.
+    """
+    freq = np.asarray(freq, dtype=float)
+    order = np.argsort(sparams.freq)
+    f_src = np.asarray(sparams.freq, dtype=float)[order]
+    data = sparams.data[..., order]
+    if len(f_src) == 1:
+        resampled = np.repeat(data, len(freq), axis=-1)
+    else:
+        f_new = np.clip(freq, f_src[0], f_src[-1])
+        hi = np.clip(np.searchsorted(f_src, f_new), 1, len(f_src) - 1)
+        w = (f_new - f_src[hi - 1]) / (f_src[hi] - f_src[hi - 1])
+        resampled = data[..., hi - 1] * (1 - w) + data[..., hi] * w
+    return s_parameters.from_array(
+        resampled, ports=sparams.ports, freq=freq, filled=sparams._filled
+    )
+
+
+class circuit:
+    """Circuit of s-parameter instances connected by a netlist.
+
+    Instances are s_parameters of already simulated components, referred to by
+    name. Connections join one instance port to another, mode by mode. Ports
+    that are not connected become the circuit's external ports.
+    """
+
+    def __init__(self, instances: dict, connections: list, ports: dict | None = None):
+        """
+        Args:
+            instances (dict): s_parameters of each instance, keyed by instance name.
+            connections (list): Connected port pairs as ((instance, port_idx),
+                (instance, port_idx)).
+            ports (dict, optional): External port index -> (instance, port_idx).
+                Defaults to None (unconnected ports numbered from 1, in instance order).
+        """
+        self.instances = instances
+        self.connections = [tuple(tuple(p) for p in c) for c in connections]
+
+        num_modes = {s.num_modes for s in instances.values()}
+        if len(num_modes) != 1:
+            raise ValueError(
+                f"All instances must have the same number of modes, got {num_modes}."
+            )
+        self.num_modes = num_modes.pop()
+
+        # (instance, port_idx) -> first row of its modes in the composite matrix
+        self._offsets = {}
+        n = 0
+        for name, sparams in instances.items():
+            for idx in sparams.ports:
+                self._offsets[(name, idx)] = n
+                n += self.num_modes
+
+        connected = set()
+        for c in self.connections:
+            for p in c:
+                if p not in self._offsets:
+                    raise ValueError(f"Connection {c} refers to unknown port {p}.")
+                if p in connected:
+                    raise ValueError(f"Port {p} is connected more than once.")
+                connected.add(p)
+
+        if ports is None:
+            unconnected = [p for p in self._offsets if p not in connected]
+            ports = {i + 1: p for i, p in enumerate(unconnected)}
+        for idx, p in ports.items():
+            if p not in self._offsets or p in connected:
+                raise ValueError(
+                    f"External port {idx} must be an unconnected instance port, "
+                    f"got {p}."
+                )
+        self.ports = {idx: tuple(p) for idx, p in ports.items()}
+
+    def _rows(self, port):
+        return self._offsets[port] + np.arange(self.num_modes)
+
+    def s_parameters(self, freq=None) -> s_parameters:
+        """Solve the circuit's s-parameters at all frequencies at once.
+
+        With S split into external (e) and internal (i) ports, and C the
+        permutation joining connected internal ports (a_i = C b_i):
+            S_ext = S_ee + S_ei (I - C S_ii)^-1 C S_ie
+
+        Args:
+            freq (np.ndarray, optional): Frequencies to solve at (Hz). Instances on a
+                different grid are resampled. Defaults to None (the first instance's
+                frequencies).
+
+        Returns:
+            s_parameters: Composite s-parameters of the external ports.
+        """
+        if freq is None:
+            freq = next(iter(self.instances.values())).freq
+        freq = np.asarray(freq)
+
+        # block diagonal scattering matrix of all instance ports, [f, n, n]
+        n = len(self._offsets) * self.num_modes
+        S = np.zeros((len(freq), n, n), dtype=complex)
+        for name, sparams in self.instances.items():
+            if not sparams._filled.all():
+                logging.warning(
+                    f"Instance '{name}' has missing s-parameter entries, "
+                    "they are taken as 0."
+                )
+            if sparams.freq.shape != freq.shape or not np.allclose(sparams.freq, freq):
+                sparams = resample(sparams, freq)
+            rows = np.concatenate([self._rows((name, idx)) for idx in sparams.ports])
+            S[:, rows[:, None], rows[None, :]] = sparams.matrix()
+
+        ext = (
+            np.concatenate([self._rows(p) for p in self.ports.values()])
+            if self.ports
+            else np.zeros(0, dtype=int)
+        )
+        internal = [p for c in self.connections for p in c]
+        partner = [p for a, b in self.connections for p in (b, a)]
+        num_int = len(internal) * self.num_modes
+        if num_int == 0:
+            S_ext = S[:, ext[:, None], ext[None, :]]
+        else:
+            i = np.concatenate([self._rows(p) for p in internal])
+            # row of C S: the partner's outgoing wave
+            c = np.concatenate([self._rows(p) for p in partner])
+            A = np.eye(num_int) - S[:, c[:, None], i[None, :]]
+            B = S[:, c[:, None], ext[None, :]]
+            S_ext = S[:, ext[:, None], ext[None, :]] + S[
+                :, ext[:, None], i[None, :]
+            ] @ np.linalg.solve(A, B)
+
+        # [f, (out, mode_out), (in, mode_in)] -> [out, in, mode_out, mode_in, f]
+        num_ports = len(self.ports)
+        data = S_ext.reshape(
+            len(freq), num_ports, self.num_modes, num_ports, self.num_modes
+        )
+        return s_parameters.from_array(
+            data.transpose(1, 3, 2, 4, 0), ports=list(self.ports), freq=freq
+        )
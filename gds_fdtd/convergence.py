@@ -0,0 +1,202 @@
+"""
+gds_fdtd integration toolbox.
+
+Convergence study module.
+@author: Mustafa Hammood, 2024
+"""
+
+import logging
+import numpy as np
+
+
+def estimate_order(h, m) -> float:
+    """Estimate the order p of m(h) = m0 + C h^p from the last three samples.
+
+    Args:
+        h (list): Grid spacings, decreasing.
+        m (list): Metric at each spacing, scalars or arrays.
+
+    Returns:
+        float: Estimated order, NaN if the samples are not converging monotonically.
+    """
+    h1, h2, h3 = h[-3:]
+    d12 = np.linalg.norm(np.ravel(np.asarray(m[-3]) - np.asarray(m[-2])))
+    d23 = np.linalg.norm(np.ravel(np.asarray(m[-2]) - np.asarray(m[-1])))
+    if d23 == 0 or d12 <= d23:
+        return np.nan
+
+    # solve d12 / d23 = (h1^p - h2^p) / (h2^p - h3^p) for p by bisection
+    def ratio(p):
+        return (h1**p - h2**p) / (h2**p - h3**p)
+
+    target, lo, hi = d12 / d23, 1e-3, 20.0
+    if not ratio(lo) <= target <= ratio(hi):
+        return np.nan
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        lo, hi = (mid, hi) if ratio(mid) < target else (lo, mid)
+    return (lo + hi) / 2
+
+
+def richardson(h, m, order: float | None = None):
+    """Richardson extrapolation of a metric to zero grid spacing.
+
+    Args:
+        h (list): Grid spacings, decreasing.
+        m (list): Metric at each spacing, scalars or arrays.
+        order (float, optional): Order of convergence. Defaults to None (estimated from
+            the last three samples).
+
+    Returns:
+        tuple: (extrapolated metric, order used). The extrapolated metric is None if the
+            order cannot be estimated.
+    """
+    if order is None:
+        if len(h) < 3:
+            return None, np.nan
+        order = estimate_order(h, m)
+        if np.isnan(order):
+            return None, order
+    r = (h[-2] / h[-1]) ** order
+    m1, m2 = np.asarray(m[-2]), np.asarray(m[-1])
+    return m2 + (m2 - m1) / (r - 1), order
+
+
+def default_metric(simulation):
+    """|S|^2 of all s-parameter entries."""
+    return simulation.s_parameters.power()
+
+
+def refinements(start: float, factor: float = 2.0, steps: int = 6) -> list:
+    """Parameter values refined geometrically from a coarse start.
+
+    Args:
+        start (float): Coarsest value.
+        factor (float, optional): Ratio of successive values, i.e. 2 halves the grid
+            step of 'grid_cells_per_wvl'. Defaults to 2.
+        steps (int, optional): Number of values. Defaults to 6.
+
+    Returns:
+        list: start, start * factor, start * factor^2, ...
+    """
+    return [start * factor**k for k in range(steps)]
+
+
+def run_convergence(
+    source,
+    tech: dict | None,
+    param: str,
+    values: list | None = None,
+    start: float | None = None,
+    factor: float = 2.0,
+    max_steps: int = 6,
+    metric=default_metric,
+    tol: float = 1e-2,
+    extrapolate: bool = False,
+    order: float | None = None,
+    spacing=None,
+    batch: int = 1,
+    backend=None,
+    max_workers: int = 4,
+    poll_interval: float = 5.0,
+    cache=None,
+    **fixed,
+) -> dict:
+    """Run a convergence study that stops as soon as the metric settles.
+
+    Values (given, or refined from start) are run batch at a time until the
+    metric, or its Richardson extrapolation, changes by less than tol.
+
+    Args:
+        source (layout, component or callable): Component source, see sweep.sweep.
+        tech (dict): Technology stack, used when source is a layout.
+        param (str): Parameter to converge, i.e. 'grid_cells_per_wvl' or 'z_span'.
+        values (list, optional): Explicit values, in the order they are tried. Defaults
+            to None (refined from start).
+        start (float, optional): Coarsest value of the refinement. Defaults to None.
+        factor (float, optional): Refinement ratio between successive values. Defaults
+            to 2.
+        max_steps (int, optional): Largest number of refinements. Defaults to 6.
+        metric (callable, optional): Metric of a core.Simulation, a scalar or an array.
+            Defaults to |S|^2 of all entries.
+        tol (float, optional): Largest absolute change of the metric considered
+            converged. Defaults to 1e-2.
+        extrapolate (bool, optional): Converge the Richardson extrapolation to zero grid
+            spacing instead. Defaults to False.
+        order (float, optional): Order of convergence for the extrapolation. Defaults to
+            None (estimated, needs three points).
+        spacing (callable, optional): Grid spacing of a parameter value. Defaults to 1 /
+            value for 'grid_cells_per_wvl'.
+        batch (int, optional): Number of values simulated concurrently per step.
+            Defaults to 1.
+        backend (backends.backend, optional): Backend to run the jobs on. Defaults to
+            None (tidy3d cloud).
+        max_workers (int, optional): Maximum number of concurrently running jobs.
+            Defaults to 4.
+        poll_interval (float, optional): Time between job status checks, in seconds.
+            Defaults to 5.
+        cache (result_cache or bool, optional): Result cache, see Simulation.execute.
+            Defaults to None.
+        fixed (dict): Parameters shared by all points, see sweep.sweep.
+
+    Returns:
+        dict: 'values' run, their 'metrics' and 'simulations', the 'estimates' compared
+            at each step, 'converged', the final 'result', the convergence 'order' (NaN
+            without extrapolation) and the 'sweep' the steps ran in.
+    """
+    from .sweep import sweep
+
+    if (values is None) == (start is None):
+        raise ValueError("Give either the values or a start value to refine from.")
+    if extrapolate and spacing is None:
+        if param != "grid_cells_per_wvl":
+            raise ValueError(
+                f"Extrapolating over '{param}' requires a spacing function."
+            )
+        spacing = lambda v: 1 / v
+
+    study = {
+        "values": [],
+        "metrics": [],
+        "simulations": [],
+        "estimates": [],
+        "converged": False,
+        "result": None,
+        "order": np.nan,
+    }
+    values = (
+        list(values) if values is not None else refinements(start, factor, max_steps)
+    )
+    s = study["sweep"] = sweep(source, tech, {param: []}, **fixed)
+    for first in range(0, len(values), batch):
+        step = values[first : first + batch]
+        s.params, s.simulations = {param: step}, None
+        s.run(
+            backend=backend,
+            max_workers=max_workers,
+            poll_interval=poll_interval,
+            cache=cache,
+        )
+
+        for value, simulation in zip(step, s.simulations):
+            study["values"].append(value)
+            study["simulations"].append(simulation)
+            study["metrics"].append(np.asarray(metric(simulation)))
+            if extrapolate:
+                h = [spacing(v) for v in study["values"]]
+                estimate, study["order"] = richardson(h, study["metrics"], order=order)
+            else:
+                estimate = study["metrics"][-1]
+            if estimate is None:
+                continue
+            study["estimates"].append(estimate)
+            study["result"] = estimate
+            if len(study["estimates"]) > 1:
+                change = np.max(np.abs(study["estimates"][-1] - study["estimates"][-2]))
+                logging.info(f"{param} = {value}: metric changed by {change:.2e}.")
+                if change < tol:
+                    study["converged"] = True
+                    return study
+
+    logging.warning(f"{param} did not converge to within {tol} over {study['values']}.")
+    return study
@@ -6,8 +6,10 @@ Core objects module.
 """
 
 import tidy3d as td
+import numpy as np
 import logging
 import os
+from collections.abc import Mapping
 
 
 def is_point_inside_polygon(point, polygon_points):
@@ -117,9 +119,12 @@ class structure:
         z_span: float,
         material: str,
         sidewall_angle: float = 90.0,
+        holes: list | None = None,
     ):
         self.name = name
         self.polygon = polygon  # polygon should be in the form of list of list of 2 pts, i.e. [[0,0],[0,1],[1,1]]
+        # holes of the polygon, each in the same form as the polygon
+        self.holes = holes or []
         self.z_base = z_base
         self.z_span = z_span
         self.material = material
@@ -174,12 +179,13 @@ class region:
 
 
 class component:
-    def __init__(self, name, structures, ports, bounds):
+    def __init__(self, name, structures, ports, bounds, initialize_ports=True):
         self.name = name
         self.structures = structures
         self.ports = ports
         self.bounds = bounds
-        self.initialize_ports_z()  # initialize ports z center and z span
+        if initialize_ports:
+            self.initialize_ports_z()  # initialize ports z center and z span
 
     def initialize_ports_z(self):
         initialize_ports_z(self.ports, self.structures)
@@ -193,8 +199,22 @@ class component:
         layer_info = pya.LayerInfo(1, 0)  # You might want to adjust the layer information as needed
         layer = layout.layer(layer_info)
 
-        for polygon in [s[0].polygon for s in self.structures if isinstance(s, list)]:
-            pya_polygon = pya.Polygon([pya.Point(int(point[0] / layout.dbu), int(point[1] / layout.dbu)) for point in polygon])
+        for s in [s[0] for s in self.structures if isinstance(s, list)]:
+            pya_polygon = pya.Polygon(
+                [
+                    pya.Point(int(point[0] / layout.dbu), int(point[1] / layout.dbu))
+                    for point in s.polygon
+                ]
+            )
+            for hole in s.holes:
+                pya_polygon.insert_hole(
+                    [
+                        pya.Point(
+                            int(point[0] / layout.dbu), int(point[1] / layout.dbu)
+                        )
+                        for point in hole
+                    ]
+                )
             top_cell.shapes(layer).insert(pya_polygon)
 
         if export_dir is None:
@@ -221,7 +241,15 @@ def initialize_ports_z(ports, structures):
 
 class Simulation:
     def __init__(
-        self, in_port, device, wavl_min=1.45, wavl_max=1.65, wavl_pts=101, sim_jobs=None
+        self,
+        in_port,
+        device,
+        wavl_min=1.45,
+        wavl_max=1.65,
+        wavl_pts=101,
+        sim_jobs=None,
+        wavl_sample=None,
+        backend=None,
     ):
         self.in_port = in_port
         self.device = device
@@ -229,184 +257,663 @@ class Simulation:
         self.wavl_max = wavl_max
         self.wavl_pts = wavl_pts
         self.sim_jobs = sim_jobs
+        # sparse monitor wavelengths, s-parameters are reconstructed on wavl_pts if set
+        self.wavl_sample = wavl_sample
+        # execution backend, defaults to the tidy3d cloud
+        self.backend = backend
         self.results = None
+        self.fit_models = None
+
+    @property
+    def wavl(self):
+        """Dense wavelength grid the s-parameters are reported on."""
+        return np.linspace(self.wavl_min, self.wavl_max, self.wavl_pts)
 
     def upload(self):
-        from tidy3d import web
+        """Validate the simulation jobs before they are submitted to the backend."""
+        from .backends import tidy3d_backend
 
-        # divide between job and sim, how to attach them?
+        if self.backend is None:
+            self.backend = tidy3d_backend()
         for sim_job in self.sim_jobs:
-            sim = sim_job["sim"]
-            name = sim_job["name"]
-            sim_job["job"] = web.Job(simulation=sim, task_name=name)
-
-    def execute(self):
-        import numpy as np
-
-        def get_directions(ports):
-            directions = []
-            for p in ports:
-                if p.direction in [0, 90]:
-                    directions.append("+")
-                else:
-                    directions.append("-")
-            return tuple(directions)
-
-        def get_source_direction(port):
-            if port.direction in [0, 90]:
-                return "-"
-            else:
-                return "+"
+            sim_job["sim"].validate_pre_upload()
+            sim_job["task_id"] = None
+
+    def extract_sparams(self, idx: int, results) -> list:
+        """Extract the s-parameters of a finished job.
+
+        Args:
+            idx (int): Index of the job in sim_jobs.
+            results (results.lazy_sim_data): The job's results.
+
+        Returns:
+            list: sparam entries of the job's input port and mode.
+        """
+        ports = self.device.ports
+        sim_job = self.sim_jobs[idx]
+        in_mode = sim_job["source"].mode_index
+
+        # outgoing direction index (0: '+', 1: '-') of each port's monitor
+        out_direction = np.array([0 if p.direction in [0, 90] else 1 for p in ports])
+        # (port, direction, mode, freq)
+        amps = results.mode_amps([p.name for p in ports])
+        src = [p.name for p in ports].index(sim_job["in_port"].name)
+        # the source launches opposite to its port's outgoing direction
+        input_amp = amps[src, 1 - out_direction[src], in_mode]
+        amps = amps[np.arange(len(ports)), out_direction] / input_amp
+
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info("Mode amplitudes in each port: \n")
+            for p, amp in zip(ports, amps):
+                logging.info(f'\tmonitor     = "{p.name}"')
+                logging.info(f"\tamplitude^2 = {np.abs(amp) ** 2}")
+                logging.info(f"\tphase       = {np.angle(amp)} (rad)\n")
+
+        # monitor wavelengths, either the dense grid or the sparse samples
+        wavl = self.wavl if self.wavl_sample is None else np.asarray(self.wavl_sample)
+        freq = td.C_0 / wavl
+        return [
+            sparam(
+                idx_in=sim_job["in_port"].idx,
+                idx_out=p.idx,
+                mode_in=in_mode,
+                mode_out=mode,
+                freq=freq,
+                s=amps[i, mode],
+            )
+            for mode in range(sim_job["num_modes"])
+            for i, p in enumerate(ports)
+        ]
 
-        def get_port_name(port):
-            return [int(i) for i in port if i.isdigit()][0]
+    def assemble_sparams(
+        self, job_entries: list, fit_tol: float = 1e-3, passivity_tol: float = 1e-2
+    ):
+        """Assemble the s-parameters from the entries of each job, see extract_sparams.
+
+        Args:
+            job_entries (list): sparam entries of each job, in job order.
+            fit_tol (float, optional): Rational fit rms tolerance, used for sparse
+                sampling. Defaults to 1e-3.
+            passivity_tol (float, optional): Passivity violation above which a warning
+                is logged. Defaults to 1e-2.
+        """
+        self.s_parameters = s_parameters(
+            entries=[entry for entries in job_entries for entry in entries]
+        )
+
+        if self.wavl_sample is not None:
+            self.s_parameters_sampled = self.s_parameters
+            self.fit_models = self.s_parameters_sampled.fit(tol=fit_tol)
+            self.s_parameters = self.s_parameters_sampled.reconstruct(
+                freq=td.C_0 / self.wavl, models=self.fit_models
+            )
+            for label, model in self.fit_models.items():
+                logging.info(
+                    f"{label}: {model.n_poles} poles, rms error {model.rms_error:.2e}, "
+                    f"max error {model.max_error:.2e}"
+                )
 
-        def measure_transmission(
-            in_port: port, in_mode_idx: int, out_mode_idx: int
-        ):
-            """
-            Constructs a "row" of the scattering matrix.
-            """
-            num_ports = np.size(self.device.ports)
-
-            if isinstance(self.results, list):
-                if len(self.results) == 1:
-                    results = self.results[0]
-                else:
-                    # TBD: Handle the case where self.results is a list with more than one item
-                    logger.warning("Multiple results handler is WIP, using first results entry")
-                    results = self.results[0]
-            else:
-                results = self.results
+        # non-passive results usually mean a too short run time or too small ports
+        check = self.s_parameters.check(tol=passivity_tol)
+        if not check["passive"]:
+            logging.warning(
+                "S-parameters are not passive, singular values exceed 1 by up to "
+                f"{check['passivity_violation']:.2e}."
+            )
+        return self.s_parameters
 
-            input_amp = results[in_port.name].amps.sel(
-                direction=get_source_direction(in_port),
-                mode_index=in_mode_idx,
+    def execute(
+        self,
+        fit_tol: float = 1e-3,
+        max_workers: int = 4,
+        poll_interval: float = 5.0,
+        cache=None,
+        retries: int = 0,
+        resume: bool = False,
+        passivity_tol: float = 1e-2,
+        refine: int = 0,
+        refine_pts: int = 10,
+    ):
+        """Run the simulation jobs concurrently and extract the s-parameters.
+
+        Args:
+            fit_tol (float, optional): Rational fit rms tolerance, used for sparse
+                sampling. Defaults to 1e-3.
+            max_workers (int, optional): Maximum number of concurrently running jobs.
+                Defaults to 4.
+            poll_interval (float, optional): Time between job status checks, in seconds.
+                Defaults to 5.
+            cache (result_cache or bool, optional): Result cache to load finished
+                simulations from and store new results in. True uses the default cache.
+                Defaults to None (no caching).
+            retries (int, optional): Number of resubmissions of a failed job. Defaults
+                to 0.
+            resume (bool, optional): Skip jobs the job ledger records as completed and
+                reattach to jobs still running. Defaults to False.
+            passivity_tol (float, optional): Passivity violation above which a warning
+                is logged. Defaults to 1e-2.
+            refine (int, optional): Largest number of sparse sampling refinements. While
+                a fit's rms error exceeds fit_tol, refine_pts wavelengths are added (see
+                refine_wavl) and the jobs are run again. Defaults to 0.
+            refine_pts (int, optional): Number of wavelengths added per refinement.
+                Defaults to 10.
+        """
+        from .execution import run_jobs
+        from .cache import result_cache
+        from .ledger import job_ledger
+
+        if cache is True:
+            cache = result_cache()
+
+        # s-parameters are extracted as each job finishes, then assembled in job order
+        job_entries = [[] for _ in self.sim_jobs]
+        self.results = [None] * len(self.sim_jobs)
+
+        # load cached results, only the remaining jobs are run
+        pending = []
+        for idx, sim_job in enumerate(self.sim_jobs):
+            data = cache.get(sim_job["sim"]) if cache is not None else None
+            if data is None:
+                pending.append(idx)
+            else:
+                logging.info(f"Loaded job {sim_job['name']} from cache.")
+                self.results[idx] = data
+                job_entries[idx] = self.extract_sparams(idx, data)
+
+        def on_result(i, data):
+            idx = pending[i]
+            self.results[idx] = data
+            if cache is not None:
+                path = os.path.join(
+                    self.device.name, f"{self.sim_jobs[idx]['name']}.hdf5"
+                )
+                cache.put(self.sim_jobs[idx]["sim"], path)
+            job_entries[idx] = self.extract_sparams(idx, data)
+
+        if pending:
+            if self.backend is None:
+                self.upload()
+            # task ids and states are recorded so an interrupted run can be resumed
+            os.makedirs(self.device.name, exist_ok=True)
+            ledger = job_ledger(os.path.join(self.device.name, "jobs.sqlite"))
+            run_jobs(
+                [self.sim_jobs[idx] for idx in pending],
+                backend=self.backend,
+                out_dir=self.device.name,
+                on_result=on_result,
+                max_workers=max_workers,
+                poll_interval=poll_interval,
+                retries=retries,
+                ledger=ledger,
+                resume=resume,
             )
-            amps = np.zeros((num_ports, self.wavl_pts), dtype=complex)
-            directions = get_directions(self.device.ports)
-            for i, (monitor, direction) in enumerate(
-                zip(results.simulation.monitors[:num_ports], directions)
-            ):
-                amp = results[monitor.name].amps.sel(
-                    direction=direction, mode_index=out_mode_idx
+        self.assemble_sparams(job_entries, fit_tol=fit_tol, passivity_tol=passivity_tol)
+
+        if refine and self.fit_models:
+            error = max(m.rms_error for m in self.fit_models.values())
+            if error > fit_tol:
+                logging.info(f"Fit rms error {error:.2e} above tolerance, refining.")
+                self.resample(self.refine_wavl(refine_pts))
+                return self.execute(
+                    fit_tol=fit_tol,
+                    max_workers=max_workers,
+                    poll_interval=poll_interval,
+                    cache=cache,
+                    retries=retries,
+                    resume=resume,
+                    passivity_tol=passivity_tol,
+                    refine=refine - 1,
+                    refine_pts=refine_pts,
                 )
-                amp_normalized = amp / input_amp
-                amps[i] = np.squeeze(amp_normalized.values)
+        if isinstance(self.results, list) and len(self.results) == 1:
+            self.results = self.results[0]
 
-            return amps
+    def resume(self, **kwargs):
+        """Resume an interrupted execute, reattaching to jobs still running.
 
-        self.s_parameters = s_parameters()  # initialize empty s parameters
+        Args:
+            kwargs: Keyword arguments passed to execute.
+        """
+        self.execute(resume=True, **kwargs)
 
-        self.results = []
-        for sim_job in self.sim_jobs:
-            if not os.path.exists(self.device.name):
-                os.makedirs(self.device.name)
-            self.results.append(sim_job["job"].run(
-                path=os.path.join(self.device.name, f"{sim_job['name']}.hdf5")
-            ))
-            for mode in range(sim_job["num_modes"]):
-                amps_arms = measure_transmission(
-                    in_port=sim_job["in_port"],
-                    in_mode_idx=sim_job["source"].mode_index,
-                    out_mode_idx=mode,
-                )
+    def resample(self, wavl_sample):
+        """Set the sparse sample wavelengths of the port mode monitors of every job.
 
-                logging.info("Mode amplitudes in each port: \n")
-                wavl = np.linspace(self.wavl_min, self.wavl_max, self.wavl_pts)
-                for amp, monitor in zip(amps_arms, self.results[-1].simulation.monitors):
-                    logging.info(f'\tmonitor     = "{monitor.name}"')
-                    logging.info(f"\tamplitude^2 = {[abs(i)**2 for i in amp]}")
-                    logging.info(
-                        f"\tphase       = {[np.angle(i)**2 for i in amp]} (rad)\n"
-                    )
-
-                    self.s_parameters.add_param(
-                        sparam(
-                            idx_in=sim_job["in_port"].idx,
-                            idx_out=get_port_name(monitor.name),
-                            mode_in=sim_job["source"].mode_index,
-                            mode_out=mode,
-                            freq=td.C_0 / (wavl),
-                            s=amp,
-                        )
-                    )
-        if isinstance(self.results, list) and len(self.results) == 1:
-            self.results = self.results[0]
+        Args:
+            wavl_sample (list): Sample wavelengths (um).
+        """
+        self.wavl_sample = np.sort(np.asarray(wavl_sample, dtype=float))
+        freqs = list(td.C_0 / self.wavl_sample)
+        for sim_job in self.sim_jobs:
+            monitors = [
+                m.updated_copy(freqs=freqs) if isinstance(m, td.ModeMonitor) else m
+                for m in sim_job["sim"].monitors
+            ]
+            sim_job["sim"] = sim_job["sim"].updated_copy(monitors=monitors)
+
+    def refine_wavl(self, n_pts: int = 10):
+        """Suggest a refined set of sparse sample wavelengths from the current fit.
+
+        Args:
+            n_pts (int, optional): Number of wavelengths to add. Defaults to 10.
+
+        Returns:
+            np.ndarray: Sorted sample wavelengths, to be passed as
+            make_sim(sparse_wavl=...).
+        """
+        from .rational import refine_freqs
+
+        if self.fit_models is None:
+            raise ValueError(
+                "No rational fit available, execute a sparse simulation first."
+            )
+        freqs = refine_freqs(
+            list(self.fit_models.values()),
+            td.C_0 / np.asarray(self.wavl_sample),
+            n_pts=n_pts,
+        )
+        return np.sort(td.C_0 / freqs)
 
     def visualize_results(self):
         import matplotlib.pyplot as plt
 
         self.s_parameters.plot()
 
+        results = self.results if isinstance(self.results, list) else [self.results]
         try:
-            if isinstance(self.results, list):
-                for job_result in self.results:
-                    fig, ax = plt.subplots(1, 1, figsize=(16, 3))
-                    job_result.plot_field(
-                        "field",
-                        "Ey",
-                        freq=td.C_0 / ((self.wavl_max + self.wavl_min) / 2),
-                        ax=ax,
-                    )
-                    fig.show()
-            else:
-                fig, ax = plt.subplots(1, 1, figsize=(16, 3))
-                self.results.plot_field(
-                    "field",
-                    "Ey",
-                    freq=td.C_0 / ((self.wavl_max + self.wavl_min) / 2),
-                    ax=ax,
-                )
-                fig.show()
+            for job_result in results:
+                field_monitors = [
+                    m
+                    for m in job_result.simulation.monitors
+                    if isinstance(m, td.FieldMonitor)
+                ]
+                if not field_monitors:
+                    continue
+                # field data is only loaded here, execute keeps lightweight handles
+                data = job_result.load()
+                try:
+                    for monitor in field_monitors:
+                        # plot Ey if recorded (TE), otherwise the first component
+                        field = "Ey" if "Ey" in monitor.fields else monitor.fields[0]
+                        fig, ax = plt.subplots(1, 1, figsize=(16, 3))
+                        data.plot_field(
+                            monitor.name,
+                            field,
+                            freq=td.C_0 / ((self.wavl_max + self.wavl_min) / 2),
+                            ax=ax,
+                        )
+                        fig.show()
+                finally:
+                    job_result.release()
         except:
             return
 
 
+class _sparam_labels(Mapping):
+    """Read-only label -> sparam mapping whose entries are views into the tensor."""
+
+    def __init__(self, sparams):
+        self._sparams = sparams
+
+    def __getitem__(self, label):
+        return self._sparams._view(self._sparams._labels[label])
+
+    def __iter__(self):
+        return iter(self._sparams._labels)
+
+    def __len__(self):
+        return len(self._sparams._labels)
+
+
 class s_parameters:
+    """Scattering parameters backed by a dense tensor.
+
+    The tensor is indexed as [port_out, port_in, mode_out, mode_in, freq]. Entries
+    returned by S, entries_in_mode and entries_in_ports are views into it.
+    """
+
     def __init__(self, entries=None):
-        if entries is None:
-            self._entries = []
-        else:
-            self._entries = entries
+        self.freq = None
+        self._data = np.zeros((0, 0, 0, 0, 0), dtype=complex)
+        self._filled = np.zeros((0, 0, 0, 0), dtype=bool)
+        self._ports = []  # port index of each tensor port axis entry
+        self._port_map = {}  # port index -> tensor port axis entry
+        # label -> tensor (port_out, port_in, mode_out, mode_in), insertion ordered
+        self._labels = {}
+        if entries:
+            # allocate the tensor once for all entries
+            self._resize(
+                ports=[i for e in entries for i in (e.idx_out, e.idx_in)],
+                num_modes=max(max(e.mode_out, e.mode_in) for e in entries) + 1,
+                num_freqs=np.size(entries[0].freq),
+            )
+            for e in entries:
+                self.add_param(e)
         return
 
+    @classmethod
+    def from_array(cls, data, ports: list[int], freq, filled=None):
+        """Create s-parameters from a tensor.
+
+        Args:
+            data (np.ndarray): Complex tensor indexed as [port_out, port_in, mode_out,
+                mode_in, freq].
+            ports (list): Port index of each port axis entry.
+            freq (np.ndarray): Frequency axis (Hz).
+            filled (np.ndarray, optional): Boolean mask [port_out, port_in, mode_out,
+                mode_in] of valid entries. Defaults to all.
+
+        Returns:
+            s_parameters: s-parameters wrapping data.
+        """
+        sparams = cls()
+        sparams._data = np.asarray(data, dtype=complex)
+        sparams.freq = np.asarray(freq)
+        sparams._ports = list(ports)
+        sparams._port_map = {idx: i for i, idx in enumerate(sparams._ports)}
+        sparams._filled = (
+            np.ones(sparams._data.shape[:4], dtype=bool)
+            if filled is None
+            else np.asarray(filled)
+        )
+        for key in zip(*np.nonzero(sparams._filled)):
+            key = tuple(int(k) for k in key)
+            sparams._labels[sparams._label(key)] = key
+        return sparams
+
+    def _resize(self, ports=(), num_modes=0, num_freqs=0):
+        """Grow the tensor to hold new ports and modes."""
+        for idx in ports:
+            if idx not in self._port_map:
+                self._port_map[idx] = len(self._ports)
+                self._ports.append(idx)
+        num_ports = len(self._ports)
+        num_modes = max(num_modes, self._data.shape[2])
+        num_freqs = max(num_freqs, self._data.shape[4])
+        shape = (num_ports, num_ports, num_modes, num_modes)
+        if shape != self._filled.shape:
+            data = np.zeros(shape + (num_freqs,), dtype=complex)
+            filled = np.zeros(shape, dtype=bool)
+            if self._filled.size:
+                old = tuple(slice(0, n) for n in self._filled.shape)
+                data[old] = self._data
+                filled[old] = self._filled
+            self._data, self._filled = data, filled
+
+    def _label(self, key):
+        po, pi, mo, mi = key
+        return f"S{self._ports[po]}{self._ports[pi]}_idx{mo}{mi}"
+
+    def _view(self, key):
+        po, pi, mo, mi = key
+        return sparam(
+            idx_in=self._ports[pi],
+            idx_out=self._ports[po],
+            mode_in=mi,
+            mode_out=mo,
+            freq=self.freq,
+            s=self._data[po, pi, mo, mi],
+        )
+
     @property
     def S(self):
-        return dict(zip([i.label for i in self._entries], self._entries))
+        return _sparam_labels(self)
+
+    @property
+    def _entries(self):
+        return [self._view(key) for key in self._labels.values()]
+
+    @property
+    def data(self):
+        """Complex tensor indexed as [port_out, port_in, mode_out, mode_in, freq]."""
+        return self._data
+
+    @property
+    def ports(self):
+        """Port index of each port axis entry."""
+        return list(self._ports)
+
+    @property
+    def num_modes(self):
+        return self._data.shape[2]
+
+    def port_index(self, idx):
+        """Tensor axis position of a port index."""
+        return self._port_map[idx]
 
     def add_param(self, sparam):
-        self._entries.append(sparam)
+        if self.freq is None:
+            self.freq = np.asarray(sparam.freq)
+        elif np.size(sparam.freq) != np.size(self.freq) or not np.allclose(
+            sparam.freq, self.freq
+        ):
+            raise ValueError(
+                f"{sparam.label} frequencies do not match the s-parameters frequencies."
+            )
+        self._resize(
+            ports=(sparam.idx_out, sparam.idx_in),
+            num_modes=max(sparam.mode_out, sparam.mode_in) + 1,
+            num_freqs=np.size(self.freq),
+        )
+        key = (
+            self._port_map[sparam.idx_out],
+            self._port_map[sparam.idx_in],
+            sparam.mode_out,
+            sparam.mode_in,
+        )
+        self._data[key] = sparam.s
+        self._filled[key] = True
+        self._labels[self._label(key)] = key
 
     def entries_in_mode(self, mode_in=0, mode_out=0):
-        entries = []
-        for s in self._entries:
-            if s.mode_in == mode_in and s.mode_out == mode_out:
-                entries.append(s)
-        return entries
+        if mode_in >= self.num_modes or mode_out >= self.num_modes:
+            return []
+        filled = self._filled[:, :, mode_out, mode_in]
+        return [
+            self._view((int(po), int(pi), mode_out, mode_in))
+            for po, pi in np.argwhere(filled)
+        ]
 
     def entries_in_ports(self, input_entries=None, idx_in=0, idx_out=0):
-        entries = []
-        if input_entries == None:
-            input_entries = self._entries
+        if input_entries is not None:
+            return [
+                s for s in input_entries if s.idx_in == idx_in and s.idx_out == idx_out
+            ]
+        if idx_in not in self._port_map or idx_out not in self._port_map:
+            return []
+        po, pi = self._port_map[idx_out], self._port_map[idx_in]
+        return [
+            self._view((po, pi, int(mo), int(mi)))
+            for mo, mi in np.argwhere(self._filled[po, pi])
+        ]
+
+    def matrix(self, freq_index: int | None = None):
+        """Scattering matrices with (port, mode) pairs flattened, port-major.
+
+        Args:
+            freq_index (int, optional): Frequency index. Defaults to None (all
+                frequencies).
+
+        Returns:
+            np.ndarray: Matrix [out, in] at freq_index, or stacked matrices [freq, out,
+            in].
+        """
+        num_ports, _, num_modes, _, num_freqs = self._data.shape
+        n = num_ports * num_modes
+        # [port_out, port_in, mode_out, mode_in, f] -> [f, out, mode_out, in, mode_in]
+        matrices = self._data.transpose(4, 0, 2, 1, 3).reshape(num_freqs, n, n)
+        return matrices if freq_index is None else matrices[freq_index]
+
+    def power(self):
+        """|S|^2 of the full tensor."""
+        return np.abs(self._data) ** 2
+
+    def db(self):
+        """|S|^2 of the full tensor in dB."""
+        with np.errstate(divide="ignore"):
+            return 10 * np.log10(self.power())
+
+    def phase(self, unwrap: bool = True):
+        """Phase of the full tensor in radians, optionally unwrapped along frequency."""
+        phase = np.angle(self._data)
+        return np.unwrap(phase, axis=-1) if unwrap else phase
+
+    def _with_matrix(self, matrices):
+        """s-parameters of these ports and frequencies from [freq, out, in] matrices."""
+        num_ports, _, num_modes, _, num_freqs = self._data.shape
+        data = matrices.reshape(num_freqs, num_ports, num_modes, num_ports, num_modes)
+        return s_parameters.from_array(
+            data.transpose(1, 3, 2, 4, 0),
+            ports=self._ports,
+            freq=self.freq,
+            filled=self._filled,
+        )
+
+    def singular_values(self):
+        """Singular values of the scattering matrix, [freq, n] in descending order.
+
+        A passive device has no singular value above 1.
+        """
+        return np.linalg.svd(self.matrix(), compute_uv=False)
+
+    def passivity_violation(self):
+        """Largest singular value in excess of 1 at each frequency, 0 where passive."""
+        return np.maximum(self.singular_values()[:, 0] - 1, 0)
+
+    def energy_balance(self):
+        """Total output power for a unit input in each (port, mode) pair, [freq, n].
+
+        Values above 1 are non-physical gain, 1 minus the value is the loss.
+        """
+        return np.sum(np.abs(self.matrix()) ** 2, axis=1)
+
+    def reciprocity_error(self):
+        """Relative reciprocity error ||S - S^T|| / ||S|| at each frequency.
+
+        Only entries filled in both directions are compared.
+        """
+        num_ports, _, num_modes, _ = self._filled.shape
+        n = num_ports * num_modes
+        filled = self._filled.transpose(0, 2, 1, 3).reshape(n, n)
+        both = filled & filled.T
+        S = np.where(both, self.matrix(), 0)
+        norm = np.linalg.norm(S, axis=(1, 2))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.nan_to_num(
+                np.linalg.norm(S - S.transpose(0, 2, 1), axis=(1, 2)) / norm
+            )
+
+    def check(self, tol: float = 1e-2) -> dict:
+        """Passivity and reciprocity diagnostics.
+
+        Args:
+            tol (float, optional): Tolerance of the passivity violation and relative
+                reciprocity error. Defaults to 1e-2.
+
+        Returns:
+            dict: Worst 'passivity_violation' and 'reciprocity_error' over frequency,
+                and whether they are 'passive' and 'reciprocal' within tol.
+        """
+        violation = float(self.passivity_violation().max(initial=0))
+        error = float(self.reciprocity_error().max(initial=0))
+        return {
+            "passivity_violation": violation,
+            "reciprocity_error": error,
+            "passive": violation <= tol,
+            "reciprocal": error <= tol,
+        }
+
+    def enforce_passivity(self, reciprocal: bool = False):
+        """Make the s-parameters passive by clipping singular values to 1.
+
+        Args:
+            reciprocal (bool, optional): Also symmetrize the matrices, (S + S^T) / 2,
+                before clipping. Only use with all entries filled. Defaults to False.
+
+        Returns:
+            s_parameters: Passive s-parameters.
+        """
+        S = self.matrix()
+        if reciprocal:
+            S = (S + S.transpose(0, 2, 1)) / 2
+        U, sigma, Vh = np.linalg.svd(S)
+        # clipping a symmetric matrix's singular values keeps it symmetric
+        S = (U * np.minimum(sigma, 1)[:, None, :]) @ Vh
+        return self._with_matrix(S)
+
+    def fit(self, tol: float = 1e-3, max_poles: int | None = None):
+        """Fit a rational model to each s-parameter entry.
+
+        Args:
+            tol (float, optional): Target rms error of each fit. Defaults to 1e-3.
+            max_poles (int, optional): Maximum model order. Defaults to None (half the
+                samples).
+
+        Returns:
+            dict: rational_model for each entry, keyed by label.
+        """
+        from .rational import fit_response
+
+        return {
+            s.label: fit_response(s.freq, s.s, tol=tol, max_poles=max_poles)
+            for s in self._entries
+        }
+
+    def reconstruct(self, freq, models=None, **kwargs):
+        """Reconstruct the s-parameters on a new frequency grid from rational fits.
+
+        Args:
+            freq (np.ndarray): Frequencies to evaluate (Hz).
+            models (dict, optional): Fitted models from fit(). Fitted with kwargs if
+                None.
+
+        Returns:
+            s_parameters: Reconstructed s-parameters.
+        """
+        if models is None:
+            models = self.fit(**kwargs)
+        freq = np.asarray(freq)
+        return s_parameters(
+            entries=[
+                sparam(
+                    idx_in=s.idx_in,
+                    idx_out=s.idx_out,
+                    mode_in=s.mode_in,
+                    mode_out=s.mode_out,
+                    freq=freq,
+                    s=models[s.label](freq),
+                )
+                for s in self._entries
+            ]
+        )
+
+    def to_touchstone(self, path: str, **kwargs) -> str:
+        """Export to a Touchstone .sNp file, see sparam_io.write_touchstone."""
+        from .sparam_io import write_touchstone
+
+        return write_touchstone(self, path, **kwargs)
 
-        for s in input_entries:
-            if s.idx_in == idx_in and s.idx_out == idx_out:
-                entries.append(s)
-        return entries
+    def to_interconnect(self, path: str, ports: list | None = None, **kwargs) -> str:
+        """Export to a Lumerical INTERCONNECT file, see sparam_io.write_interconnect."""
+        from .sparam_io import write_interconnect
+
+        return write_interconnect(self, path, ports=ports, **kwargs)
+
+    def to_hdf5(self, path: str, **kwargs) -> str:
+        """Export to a compressed HDF5 file, see sparam_io.write_hdf5."""
+        from .sparam_io import write_hdf5
+
+        return write_hdf5(path, self, **kwargs)
 
     def plot(self):
         import matplotlib.pyplot as plt
-        import numpy as np
 
         fig, ax = plt.subplots(1, 1)
         ax.set_xlabel("Wavelength [microns]")
         ax.set_ylabel("Transmission [dB]")
-        for i in self._entries:
-            logging.info("Mode amplitudes in each port: \n")
-            mag = [10 * np.log10(abs(i) ** 2) for i in i.s]
-            phase = [np.angle(i) ** 2 for i in i.s]
-            ax.plot(1e6 * td.C_0 / i.freq, mag, label=i.label)
+        mag = self.db()
+        for label, key in self._labels.items():
+            ax.plot(1e6 * td.C_0 / self.freq, mag[key], label=label)
         ax.legend()
         return fig, ax
 
@@ -425,7 +932,6 @@ class sparam:
         return f"S{self.idx_out}{self.idx_in}_idx{self.mode_out}{self.mode_in}"
 
     def plot(self):
-        import numpy as np
         import matplotlib.pyplot as plt
         plt.plot((1e-6*td.C_0)/np.array(self.freq), 10*np.log10(self.s**2))
         plt.xlabel('Wavelength [um]')
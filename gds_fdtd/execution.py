@@ -0,0 +1,187 @@
+"""
+gds_fdtd integration toolbox.
+
+Simulation job execution module.
+@author: Mustafa Hammood, 2024
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# task statuses after which a job will not progress any further
+END_STATUSES = ("success", "error", "errored", "diverged", "deleted", "draft", "abort")
+
+
+def wait_for(backend, task_id: str, poll_interval: float = 5.0) -> str:
+    """Poll a task until it reaches an end status.
+
+    Args:
+        backend (backends.backend): Backend the task was submitted to.
+        task_id (str): Task to poll.
+        poll_interval (float, optional): Time between status checks, in seconds.
+            Defaults to 5.
+
+    Returns:
+        str: Final task status.
+    """
+    status = backend.poll(task_id)
+    while status not in END_STATUSES:
+        time.sleep(poll_interval)
+        status = backend.poll(task_id)
+    return status
+
+
+def _reattach(
+    backend, sim_job: dict, path: str, poll_interval: float, ledger, sim_hash
+):
+    """Pick up a job recorded in the ledger, None if it must be resubmitted."""
+    from .ledger import SUBMITTED, COMPLETED, FAILED
+
+    entry = ledger.get(sim_job["name"])
+    if entry is None or entry["sim_hash"] != sim_hash:
+        return None
+    if entry["state"] == COMPLETED and os.path.exists(entry["result_path"]):
+        path = entry["result_path"]
+        logging.info(f"Job '{sim_job['name']}' completed, loading {path}.")
+        sim_job["task_id"] = entry["task_id"]
+        return backend.load(path)
+    if entry["state"] == SUBMITTED:
+        logging.info(f"Reattaching job '{sim_job['name']}' to task {entry['task_id']}.")
+        sim_job["task_id"] = entry["task_id"]
+        try:
+            status = wait_for(backend, sim_job["task_id"], poll_interval)
+        except Exception as e:
+            logging.warning(
+                f"Cannot reattach to task {entry['task_id']} ({e}), resubmitting."
+            )
+            return None
+        if status == "success":
+            backend.download(sim_job["task_id"], path)
+            ledger.record(
+                sim_job["name"], sim_hash, sim_job["task_id"], COMPLETED, path
+            )
+            return backend.load(path)
+        ledger.record(sim_job["name"], sim_hash, sim_job["task_id"], FAILED)
+    return None
+
+
+def run_job(
+    backend,
+    sim_job: dict,
+    path: str,
+    poll_interval: float = 5.0,
+    retries: int = 0,
+    ledger=None,
+    resume: bool = False,
+):
+    """Submit a job, poll it until it finishes, then download and load its data.
+
+    Args:
+        backend (backends.backend): Backend to run the job on.
+        sim_job (dict): Simulation job with 'sim' and 'name' entries. The task id is
+            recorded in 'task_id'.
+        path (str): Path of the downloaded .hdf5 results file.
+        poll_interval (float, optional): Time between status checks, in seconds.
+            Defaults to 5.
+        retries (int, optional): Number of resubmissions of a failed job. Defaults to 0.
+        ledger (ledger.job_ledger, optional): Ledger to record the job's task id and
+            state in. Defaults to None.
+        resume (bool, optional): Reuse a completed or reattach to a running task
+            recorded in the ledger for the same simulation. Defaults to False.
+
+    Returns:
+        results.lazy_sim_data: Handle to the simulation results.
+    """
+    from .cache import simulation_hash
+    from .ledger import SUBMITTED, COMPLETED, FAILED
+
+    sim_hash = simulation_hash(sim_job["sim"]) if ledger is not None else None
+    if resume and ledger is not None:
+        data = _reattach(backend, sim_job, path, poll_interval, ledger, sim_hash)
+        if data is not None:
+            return data
+
+    for attempt in range(retries + 1):
+        sim_job["task_id"] = backend.submit(sim_job["sim"], sim_job["name"])
+        if ledger is not None:
+            ledger.record(sim_job["name"], sim_hash, sim_job["task_id"], SUBMITTED)
+        status = wait_for(backend, sim_job["task_id"], poll_interval)
+        if status == "success":
+            backend.download(sim_job["task_id"], path)
+            if ledger is not None:
+                ledger.record(
+                    sim_job["name"], sim_hash, sim_job["task_id"], COMPLETED, path
+                )
+            return backend.load(path)
+        if ledger is not None:
+            ledger.record(sim_job["name"], sim_hash, sim_job["task_id"], FAILED)
+        logging.warning(
+            f"Job '{sim_job['name']}' finished with status '{status}' "
+            f"(attempt {attempt + 1}/{retries + 1})."
+        )
+    raise RuntimeError(f"Job '{sim_job['name']}' finished with status '{status}'.")
+
+
+def run_jobs(
+    sim_jobs: list,
+    backend,
+    out_dir: str,
+    on_result=None,
+    max_workers: int = 4,
+    poll_interval: float = 5.0,
+    retries: int = 0,
+    ledger=None,
+    resume: bool = False,
+):
+    """Run simulation jobs concurrently.
+
+    Up to max_workers jobs are submitted, polled and downloaded at the same time.
+    on_result is called from the calling thread as each job finishes, so results
+    can be post-processed while the remaining jobs are still running.
+
+    Args:
+        sim_jobs (list): Simulation jobs (dicts with 'sim' and 'name' entries), see
+            make_sim.
+        backend (backends.backend): Backend to run the jobs on.
+        out_dir (str): Directory to download the results into.
+        on_result (callable, optional): Called as on_result(job_index, data) when a job
+            finishes. Defaults to None.
+        max_workers (int, optional): Maximum number of concurrently running jobs.
+            Defaults to 4.
+        poll_interval (float, optional): Time between status checks, in seconds.
+            Defaults to 5.
+        retries (int, optional): Number of resubmissions of a failed job. Defaults to 0.
+        ledger (ledger.job_ledger, optional): Ledger to record task ids and states in.
+            Defaults to None.
+        resume (bool, optional): Skip completed and reattach to running jobs recorded in
+            the ledger. Defaults to False.
+
+    Returns:
+        list: Simulation results, in the order of sim_jobs.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    results = [None] * len(sim_jobs)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(
+                run_job,
+                backend,
+                sim_job,
+                os.path.join(out_dir, f"{sim_job['name']}.hdf5"),
+                poll_interval,
+                retries,
+                ledger,
+                resume,
+            ): idx
+            for idx, sim_job in enumerate(sim_jobs)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            logging.info(f"Job {sim_jobs[idx]['name']} finished.")
+            if on_result is not None:
+                on_result(idx, results[idx])
+    return results
@@ -0,0 +1,88 @@
+"""
+gds_fdtd integration toolbox.
+
+Persistent job ledger module.
+@author: Mustafa Hammood, 2024
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# job states recorded in the ledger
+SUBMITTED = "submitted"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class job_ledger:
+    """SQLite record of simulation jobs, used to resume interrupted runs.
+
+    Each job is recorded by name with its simulation hash, backend task id,
+    current state and result path. Every state change is also appended to a
+    transitions table.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._lock, closing(sqlite3.connect(self.path)) as con, con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (name TEXT PRIMARY KEY, "
+                "sim_hash TEXT, task_id TEXT, state TEXT, result_path TEXT, "
+                "updated REAL)"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS transitions (name TEXT, task_id TEXT, "
+                "state TEXT, time REAL)"
+            )
+
+    def record(
+        self,
+        name: str,
+        sim_hash: str,
+        task_id: str | None,
+        state: str,
+        result_path: str | None = None,
+    ):
+        """Record a job state transition.
+
+        Args:
+            name (str): Job name.
+            sim_hash (str): Content hash of the job's simulation.
+            task_id (str): Backend task id.
+            state (str): New state, one of 'submitted', 'completed' or 'failed'.
+            result_path (str, optional): Path of the downloaded results. Defaults to
+                None.
+        """
+        now = time.time()
+        with self._lock, closing(sqlite3.connect(self.path)) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)",
+                (name, sim_hash, task_id, state, result_path, now),
+            )
+            con.execute(
+                "INSERT INTO transitions VALUES (?, ?, ?, ?)",
+                (name, task_id, state, now),
+            )
+
+    def get(self, name: str) -> dict | None:
+        """Get the latest record of a job, None if the job was never recorded."""
+        jobs = self._query("SELECT * FROM jobs WHERE name = ?", (name,))
+        return jobs[0] if jobs else None
+
+    def jobs(self) -> list[dict]:
+        """List the latest record of every job."""
+        return self._query("SELECT * FROM jobs ORDER BY updated", ())
+
+    def history(self, name: str) -> list[dict]:
+        """List the state transitions of a job, oldest first."""
+        return self._query(
+            "SELECT * FROM transitions WHERE name = ? ORDER BY time", (name,)
+        )
+
+    def _query(self, sql, params):
+        with self._lock, closing(sqlite3.connect(self.path)) as con:
+            con.row_factory = sqlite3.Row
+            return [dict(row) for row in con.execute(sql, params)]
@@ -5,16 +5,154 @@ Lumerical tools module.
 @author: Mustafa Hammood, 2024
 """
 
-from gds_fdtd.core import structure, component
+from gds_fdtd.core import structure, component, port
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import lumapi
+import queue
+import threading
 import numpy as np
 
 m_to_um = 1e-6
+c_0 = 299792458.0  # speed of light, m/s
+
+
+def lum_session(kind: str = "FDTD", **kwargs):
+    """Open a live Lumerical session. lumapi is only imported here.
+
+    Args:
+        kind (str, optional): Session type, i.e. 'FDTD', 'MODE' or 'DEVICE'. Defaults to
+            'FDTD'.
+        kwargs (dict): Arguments of the lumapi session, i.e. hide=True.
+
+    Returns:
+        lumapi session.
+    """
+    import lumapi
+
+    return getattr(lumapi, kind)(**kwargs)
+
+
+def lsf_matrix(a) -> str:
+    """Format an array as an LSF matrix literal, i.e. [1,2;3,4]."""
+    a = np.atleast_2d(np.asarray(a, dtype=float))
+    return "[" + ";".join(",".join(row) for row in np.char.mod("%.12g", a)) + "]"
+
+
+def lsf_string(s: str) -> str:
+    """Format a string as an LSF string expression.
+
+    LSF string literals have no escapes, so quotes, backslashes and any other
+    character outside printable ASCII are concatenated with char(), i.e.
+    'a"b' -> "a"+char(34)+"b".
+    """
+    parts, literal = [], ""
+    for ch in str(s):
+        if " " <= ch <= "~" and ch not in '"\\':
+            literal += ch
+            continue
+        if literal:
+            parts.append(f'"{literal}"')
+            literal = ""
+        parts.append(f"char({ord(ch)})")
+    if literal or not parts:
+        parts.append(f'"{literal}"')
+    return "+".join(parts)
+
+
+def lsf_poly(
+    name: str,
+    vertices,
+    z_min: float,
+    z_max: float,
+    material: str | None = None,
+    alpha: float = 1.0,
+    group: str | None = None,
+    mesh_order: int | None = None,
+) -> str:
+    """LSF commands adding a polygon.
+
+    Args:
+        name (str): Polygon name.
+        vertices (list): Polygon vertices, in um.
+        z_min (float): Bottom of the polygon, in um.
+        z_max (float): Top of the polygon, in um.
+        material (str, optional): Lumerical material name. Defaults to None (Lumerical's
+            default).
+        alpha (float, optional): transperancy setting. Defaults to 1.
+        group (str, optional): Group to add the polygon to. Defaults to None (no group).
+        mesh_order (int, optional): Mesh order override. Defaults to None (from the
+            material database).
+
+    Returns:
+        str: LSF commands.
+    """
+    lines = [
+        "addpoly;",
+        f'set("name",{lsf_string(name)});',
+        'set("x",0);',
+        'set("y",0);',
+        f'set("z min",{m_to_um * z_min:.12g});',
+        f'set("z max",{m_to_um * z_max:.12g});',
+        f'set("vertices",{lsf_matrix(m_to_um * np.asarray(vertices, dtype=float))});',
+    ]
+    if material is not None:
+        lines.append(f'set("material",{lsf_string(material)});')
+    if mesh_order is not None:
+        lines.append('set("override mesh order from material database",1);')
+        lines.append(f'set("mesh order",{mesh_order});')
+    if alpha != 1:
+        lines.append(f'set("alpha",{alpha:.12g});')
+    if group is not None:
+        lines.append(f"addtogroup({lsf_string(group)});")
+    return "\n".join(lines)
+
+
+def structure_to_lsf(
+    s: structure,
+    alpha: float = 1.0,
+    group: str | None = None,
+    fill: str | None = None,
+) -> str:
+    """LSF commands adding a structure. Holes are filled at a higher mesh priority.
+
+    Args:
+        s (structure): structure to instantiate
+        alpha (float, optional): transperancy setting. Defaults to 1..
+        group (str, optional): Group to add the structure to. Defaults to None (no
+            group).
+        fill (str, optional): Lumerical material filling the holes, i.e. the
+            cladding around the structure. Defaults to None ('etch', the background).
+
+    Returns:
+        str: LSF commands.
+    """
+    if s.z_span < 0:
+        bounds = (s.z_base + s.z_span, s.z_base)
+    else:
+        bounds = (s.z_base, s.z_base + s.z_span)
+    material = s.material["lum"] if isinstance(s.material, dict) else s.material
+    commands = [
+        lsf_poly(
+            s.name, s.polygon, *bounds, material=material, alpha=alpha, group=group
+        )
+    ]
+    for idx, hole in enumerate(s.holes):
+        commands.append(
+            lsf_poly(
+                f"{s.name}_hole_{idx}",
+                hole,
+                *bounds,
+                material="etch" if fill is None else fill,
+                group=group,
+                mesh_order=1,
+            )
+        )
+    return "\n".join(commands)
+
 
 def structure_to_lum_poly(
-    s: structure, 
-    lum: lumapi.FDTD,
+    s: structure,
+    lum: 'lumapi.FDTD',
     alpha: float=1.,
     group: bool=False,
     group_name: str='group',
@@ -28,67 +166,434 @@ def structure_to_lum_poly(
         group (bool, optional): flag to add the structure to a given group. Defaults to False.
         group_name (str, optional): group name, if group is True. Defaults to 'group'.
     """
-    if s.z_span < 0:
-        bounds = (s.z_base + s.z_span, s.z_base)
-    else:
-        bounds = (s.z_base, s.z_base + s.z_span)
+    lum.eval(structure_to_lsf(s, alpha=alpha, group=group_name if group else None))
 
-    poly = lum.addpoly(
-        vertices=m_to_um*np.array(s.polygon),
-        x=0,
-        y=0,
-        z_min=m_to_um*bounds[0],
-        z_max=m_to_um*bounds[1],
-        name=s.name,
-        material=s.material["lum"] if isinstance(s.material, dict) else s.material,
-        alpha=alpha,
-    )
 
-    if group:
-        lum.addtogroup(group_name)
-    lum.eval(f"?'Polygons {s.name} added';")
+def _enclosing_material(c: component, s: structure) -> str | None:
+    """Lumerical material of the last region of c spanning the z center of s."""
+    z = s.z_base + s.z_span / 2
+    material = None
+    for r in c.structures:
+        if type(r) != list and min(r.z_base, r.z_base + r.z_span) <= z <= max(
+            r.z_base, r.z_base + r.z_span
+        ):
+            material = r.material["lum"] if isinstance(r.material, dict) else r.material
+    return material
 
-    return poly
 
-def to_lumerical(c: component, lum: lumapi.FDTD, buffer: float=2.):
-    """Add an input component with a given tech to a lumerical instance.
+def to_lsf(c: component, buffer: float = 2.0) -> str:
+    """LSF script adding a component's structures and port extensions.
 
     Args:
         c (component): input component.
-        lum (lumapi.FDTD): lumerical FDTD instance.
-    """
+        buffer (float, optional): Extension of ports beyond simulation region. Defaults
+            to 2 microns.
 
+    Returns:
+        str: LSF script.
+    """
     # TODO fix box tox handling here
-    structures = []
+    commands = []
     for s in c.structures:
         # if structure is a list then its a device (could have multiple polygons inside)
         if type(s) == list:
-            for i in s:
-                structures.append(structure_to_lum_poly(s=i, lum=lum, group=True, group_name='device'))
+            fill = _enclosing_material(c, s[0])
+            commands.extend(structure_to_lsf(i, group="device", fill=fill) for i in s)
 
         # if structure is not a list then its a region
         else:
-            structures.append(structure_to_lum_poly(s=s, lum=lum, alpha=0.5))
+            commands.append(structure_to_lsf(s, alpha=0.5))
 
     # extend ports beyond sim region
     for p in c.ports:
-        structures.append(lum.addpoly(
-            vertices=m_to_um*np.array(p.polygon_extension(buffer=buffer)),
-            x=0,
-            y=0,
-            z_min=m_to_um*(p.center[2] - p.height / 2),
-            z_max=m_to_um*(p.center[2] + p.height / 2),
-            name=p.name,
-            material=p.material["lum"] if isinstance(p.material, dict) else p.material,
-        ))
+        commands.append(
+            lsf_poly(
+                p.name,
+                p.polygon_extension(buffer=buffer),
+                p.center[2] - p.height / 2,
+                p.center[2] + p.height / 2,
+                material=(
+                    p.material["lum"] if isinstance(p.material, dict) else p.material
+                ),
+                group="ports",
+            )
+        )
+    num_polygons = sum(len(s) if type(s) == list else 1 for s in c.structures)
+    message = f"{c.name}: {num_polygons} polygons and {len(c.ports)} ports added"
+    commands.append(f"?{lsf_string(message)};")
+    return "\n".join(commands) + "\n"
+
+
+def to_lumerical(
+    c: component,
+    lum: 'lumapi.FDTD | None' = None,
+    buffer: float = 2.0,
+    fname: str | None = None,
+) -> str:
+    """Add an input component with a given tech to a lumerical instance.
+
+    The component is sent as one LSF script in a single eval call, instead of
+    one call per polygon.
+
+    Args:
+        c (component): input component.
+        lum (lumapi.FDTD, optional): lumerical FDTD instance. Defaults to None (script
+            is not run).
+        buffer (float, optional): Extension of ports beyond simulation region. Defaults
+            to 2 microns.
+        fname (str, optional): Path of an .lsf file to write the script to. Defaults to
+            None.
+
+    Returns:
+        str: LSF script.
+    """
+    script = to_lsf(c, buffer=buffer)
+    if fname is not None:
+        with open(fname, "w") as f:
+            f.write(script)
+        logging.info(f"LSF script of {c.name} written to {fname}.")
+    if lum is not None:
+        lum.eval(script)
+    return script
+
+
+def fdtd_lsf(
+    c: component,
+    wavl_min: float = 1.45,
+    wavl_max: float = 1.65,
+    wavl_pts: int = 101,
+    width_ports: float = 3.0,
+    depth_ports: float = 2.0,
+    num_modes: int = 1,
+    in_port: port | str | None = None,
+    mode_index: int = 0,
+    mesh_accuracy: int = 2,
+    mesh_override: float | None = None,
+    run_time_factor: float = 50,
+    z_span: float | None = None,
+    field_monitor: bool = False,
+    buffer: float = 2.0,
+    fsp: str | None = None,
+) -> str:
+    """Self-contained LSF script setting up an s-parameter FDTD simulation.
+
+    Mirrors simprocessor.make_sim. in_port='all' adds an s-parameter sweep named
+    'sparams'. No Lumerical session is needed to generate it.
+
+    Args:
+        c (component): Component to simulate.
+        wavl_min (float, optional): Start wavelength. Defaults to 1.45 microns.
+        wavl_max (float, optional): End wavelength. Defaults to 1.65 microns.
+        wavl_pts (int, optional): Number of wavelength evaluation pts. Defaults to 101.
+        width_ports (float, optional): Width of the ports. Defaults to 3 microns.
+        depth_ports (float, optional): Depth of the ports. Defaults to 2 microns.
+        num_modes (int, optional): Number of port modes. Defaults to 1.
+        in_port (port or str, optional): Input port, or 'all' for an s-parameter sweep.
+            Defaults to None (first port).
+        mode_index (int, optional): Mode index to inject from a single input port.
+            Defaults to 0.
+        mesh_accuracy (int, optional): FDTD auto mesh accuracy, 1 to 8. Defaults to 2.
+        mesh_override (float, optional): Mesh step over the device layers (um). Defaults
+            to None (no override).
+        run_time_factor (float, optional): Simulation time multiplier, see
+            simprocessor.make_sim. Defaults to 50.
+        z_span (float, optional): Simulation's depth. Defaults to None (the bounds' z
+            span).
+        field_monitor (bool, optional): Add a z-normal field profile monitor at the
+            bounds' z center. Defaults to False.
+        buffer (float, optional): Extension of ports beyond simulation region. Defaults
+            to 2 microns.
+        fsp (str, optional): Project file the script saves to. Defaults to None (not
+            saved).
+
+    Returns:
+        str: LSF script.
+    """
+    b = c.bounds
+    if z_span is None:
+        z_span = b.z_span
+    if in_port is None:
+        in_port = c.ports[0]
+    if isinstance(in_port, list):
+        if len(in_port) != 1:
+            raise ValueError(
+                "Lumerical s-parameter sweeps excite every port, "
+                "use in_port='all' or a single port."
+            )
+        in_port = in_port[0]
+    size = m_to_um * np.array([b.x_span, b.y_span, z_span])
+
+    commands = ["newproject;", to_lsf(c, buffer=buffer).rstrip("\n")]
+    commands.append(
+        "\n".join(
+            [
+                "addfdtd;",
+                f'set("x min",{m_to_um * b.x_min:.12g});',
+                f'set("x max",{m_to_um * b.x_max:.12g});',
+                f'set("y min",{m_to_um * b.y_min:.12g});',
+                f'set("y max",{m_to_um * b.y_max:.12g});',
+                f'set("z",{m_to_um * b.z_center:.12g});',
+                f'set("z span",{size[2]:.12g});',
+                f'set("mesh accuracy",{mesh_accuracy});',
+                f'set("simulation time",{run_time_factor * size.max() / c_0:.12g});',
+            ]
+        )
+    )
+
+    # lumerical ports inject into the device, opposite to the direction the port faces
+    injection = {
+        0: ("x-axis", "Backward"),
+        180: ("x-axis", "Forward"),
+        90: ("y-axis", "Backward"),
+        270: ("y-axis", "Forward"),
+    }
+    for p in c.ports:
+        axis, direction = injection[p.direction]
+        span = "y span" if axis == "x-axis" else "x span"
+        lines = [
+            "addport;",
+            f'set("name",{lsf_string(p.name)});',
+            f'set("injection axis",{lsf_string(axis)});',
+            f'set("direction",{lsf_string(direction)});',
+            f'set("x",{m_to_um * p.x:.12g});',
+            f'set("y",{m_to_um * p.y:.12g});',
+            f'set("z",{m_to_um * p.z:.12g});',
+            f'set("{span}",{m_to_um * width_ports:.12g});',
+            f'set("z span",{m_to_um * depth_ports:.12g});',
+        ]
+        if num_modes > 1:
+            lines.append('set("mode selection","user select");')
+            modes = lsf_matrix(np.arange(1, num_modes + 1))
+            lines.append(f'set("selected mode numbers",{modes});')
+        commands.append("\n".join(lines))
 
-        lum.addtogroup('ports')
-        lum.eval(f"?'port {p.name} added';")
+    if mesh_override is not None:
+        z = [
+            z
+            for s in c.structures
+            if type(s) == list
+            for z in (s[0].z_base, s[0].z_base + s[0].z_span)
+        ]
+        commands.append(
+            "\n".join(
+                [
+                    "addmesh;",
+                    'set("name","device mesh");',
+                    f'set("x min",{m_to_um * b.x_min:.12g});',
+                    f'set("x max",{m_to_um * b.x_max:.12g});',
+                    f'set("y min",{m_to_um * b.y_min:.12g});',
+                    f'set("y max",{m_to_um * b.y_max:.12g});',
+                    f'set("z min",{m_to_um * min(z):.12g});',
+                    f'set("z max",{m_to_um * max(z):.12g});',
+                    f'set("dx",{m_to_um * mesh_override:.12g});',
+                    f'set("dy",{m_to_um * mesh_override:.12g});',
+                    f'set("dz",{m_to_um * mesh_override:.12g});',
+                ]
+            )
+        )
+
+    if isinstance(in_port, str) and in_port == "all":
+        commands.append(
+            "\n".join(
+                [
+                    "addsweep(3);",
+                    'setsweep("s-parameter sweep","name","sparams");',
+                    'setsweep("sparams","Excite all ports",1);',
+                ]
+            )
+        )
+    else:
+        commands.append(
+            "\n".join(
+                [
+                    'select("FDTD::ports");',
+                    f'set("source port",{lsf_string(in_port.name)});',
+                    f'set("source mode","mode {mode_index + 1}");',
+                ]
+            )
+        )
+
+    if field_monitor:
+        commands.append(
+            "\n".join(
+                [
+                    "addprofile;",
+                    'set("name","field");',
+                    'set("monitor type","2D Z-normal");',
+                    f'set("x",{m_to_um * b.x_center:.12g});',
+                    f'set("x span",{size[0]:.12g});',
+                    f'set("y",{m_to_um * b.y_center:.12g});',
+                    f'set("y span",{size[1]:.12g});',
+                    f'set("z",{m_to_um * b.z_center:.12g});',
+                ]
+            )
+        )
+
+    commands.append(
+        "\n".join(
+            [
+                f'setglobalsource("wavelength start",{m_to_um * wavl_min:.12g});',
+                f'setglobalsource("wavelength stop",{m_to_um * wavl_max:.12g});',
+                f'setglobalmonitor("frequency points",{wavl_pts});',
+            ]
+        )
+    )
+    if fsp is not None:
+        commands.append(f"save({lsf_string(fsp)});")
+    return "\n".join(commands) + "\n"
+
+
+def export_lsf(c: component, fname: str, **kwargs) -> str:
+    """Write the FDTD setup script of a component to an .lsf file, see fdtd_lsf.
+
+    Args:
+        c (component): Component to simulate.
+        fname (str): Path of the .lsf file.
+        kwargs (dict): Arguments of fdtd_lsf.
+
+    Returns:
+        str: LSF script.
+    """
+    script = fdtd_lsf(c, **kwargs)
+    with open(fname, "w") as f:
+        f.write(script)
+    logging.info(f"Lumerical FDTD setup of {c.name} written to {fname}.")
+    return script
 
-    return structures
 
 def setup_lum_fdtd(
     c: component,
-    lum: lumapi.FDTD,
-):
-    pass
\ No newline at end of file
+    lum: 'lumapi.FDTD',
+    run: bool = False,
+    sparams_file: str | None = None,
+    **kwargs,
+) -> str:
+    """Set up an s-parameter FDTD simulation of a component in a Lumerical session.
+
+    The setup is sent as one script, see fdtd_lsf.
+
+    Args:
+        c (component): Component to simulate.
+        lum (lumapi.FDTD): Lumerical FDTD session.
+        run (bool, optional): Run the simulation, or the s-parameter sweep with
+            in_port='all'. Defaults to False.
+        sparams_file (str, optional): File the s-parameter sweep result is exported to
+            after running. Defaults to None.
+        kwargs (dict): Arguments of fdtd_lsf.
+
+    Returns:
+        str: LSF script sent to the session.
+    """
+    script = fdtd_lsf(c, **kwargs)
+    sweep = kwargs.get("in_port") == "all"
+    if run:
+        script += 'runsweep("sparams");\n' if sweep else "run;\n"
+        if sweep and sparams_file is not None:
+            script += f'exportsweep("sparams",{lsf_string(sparams_file)});\n'
+    lum.eval(script)
+    return script
+
+
+class lum_pool:
+    """Pool of warm Lumerical sessions.
+
+    Sessions are opened on first use, up to size of them, and reused for every
+    following task, so session startup is paid once per session. Each task
+    borrows a session for its duration.
+
+    Example:
+        with lum_pool(size=2, hide=True) as pool:
+            pool.setup(components, in_port="all", run=True)
+    """
+
+    def __init__(self, size: int = 2, factory=None, **session_args):
+        """
+        Args:
+            size (int, optional): Maximum number of sessions. Defaults to 2.
+            factory (callable, optional): Opens a session. Defaults to None (lum_session
+                with session_args).
+            session_args (dict): Arguments of lum_session, i.e. kind='FDTD', hide=True.
+        """
+        self.size = size
+        self.factory = (
+            factory if factory is not None else lambda: lum_session(**session_args)
+        )
+        self.sessions = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._reserved = 0  # sessions opened or being opened
+
+    def _acquire(self):
+        # reserve a slot under the lock, sessions start concurrently outside of it
+        with self._lock:
+            reserve = self._idle.empty() and self._reserved < self.size
+            if reserve:
+                self._reserved += 1
+        if not reserve:
+            return self._idle.get()
+        try:
+            lum = self.factory()
+        except BaseException:
+            with self._lock:
+                self._reserved -= 1
+            raise
+        with self._lock:
+            self.sessions.append(lum)
+            logging.info(f"Opened Lumerical session {len(self.sessions)}/{self.size}.")
+        return lum
+
+    def _call(self, func, item):
+        lum = self._acquire()
+        try:
+            return func(lum, item)
+        finally:
+            self._idle.put(lum)
+
+    def map(self, func, items) -> list:
+        """Call func(session, item) for each item, concurrently on the pool's sessions.
+
+        Args:
+            func (callable): Task, called with a session and an item.
+            items (list): Items to process.
+
+        Returns:
+            list: Results of each item, in order.
+        """
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda item: self._call(func, item), items))
+
+    def setup(self, components: list, **kwargs) -> list:
+        """Set up (and optionally run) components on the pool, see setup_lum_fdtd.
+
+        Args:
+            components (list): Components to simulate.
+            kwargs (dict): Arguments of setup_lum_fdtd. sparams_file may contain a
+                {name} field for the component name.
+
+        Returns:
+            list: LSF script of each component.
+        """
+        sparams_file = kwargs.pop("sparams_file", None)
+
+        def task(lum, c):
+            fname = (
+                sparams_file.format(name=c.name) if sparams_file is not None else None
+            )
+            return setup_lum_fdtd(c, lum, sparams_file=fname, **kwargs)
+
+        return self.map(task, components)
+
+    def close(self):
+        """Close all sessions."""
+        for lum in self.sessions:
+            if hasattr(lum, "close"):
+                lum.close()
+        self.sessions = []
+        self._idle = queue.Queue()
+        self._reserved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -168,10 +168,7 @@ def load_region(layout: layout, layer: list[int, int] = [68, 0], z_center: float
             iter1.itrans()
         )  # Save the component outline polygon
         DevRec_polygon = iter1.shape().polygon
-    polygons_vertices = [
-        [[vertex.x * dbu, vertex.y * dbu] for vertex in p.each_point()]
-        for p in [p.to_simple_polygon() for p in [DevRec_polygon]]
-    ][0]
+    polygons_vertices = polygon_vertices(DevRec_polygon, dbu)[0]
 
     if extension != 0:
         polygons_vertices = dilate(polygons_vertices, extension)
@@ -215,27 +212,110 @@ def load_structure(layout, name, layer, z_base, z_span, material, sidewall_angle
         s.next()
 
     r.merge()
-    polygons = [p for p in r.each_merged()]
-    polygons_vertices = [
-        [[vertex.x * dbu, vertex.y * dbu] for vertex in p.each_point()]
-        for p in [p.to_simple_polygon() for p in polygons]
-    ]
     structures = []
-    for idx, s in enumerate(polygons_vertices):
+    for idx, (hull, holes) in enumerate(region_to_polygons(r, dbu)):
         name = f"{name}_{idx}"
         structures.append(
             structure(
                 name=name,
-                polygon=s,
+                polygon=hull,
                 z_base=z_base,
                 z_span=z_span,
                 material=material,
                 sidewall_angle=sidewall_angle,
+                holes=holes,
             )
         )
     return structures
 
 
+def polygon_vertices(p: pya.Polygon, dbu: float = 1e-3) -> tuple[list, list]:
+    """Vertices of a klayout polygon, without the cut lines of to_simple_polygon.
+
+    Args:
+        p (pya.Polygon): Polygon to convert.
+        dbu (float, optional): Database unit of the polygon (um). Defaults to 1 nm.
+
+    Returns:
+        tuple: (hull, holes). The hull is a list of [x, y] vertices (um), holes a list
+            of such lists.
+    """
+    hull = [[pt.x * dbu, pt.y * dbu] for pt in p.each_point_hull()]
+    holes = [
+        [[pt.x * dbu, pt.y * dbu] for pt in p.each_point_hole(h)]
+        for h in range(p.holes())
+    ]
+    return hull, holes
+
+
+def polygons_to_region(
+    polygons: list, dbu: float = 1e-3, holes: list | None = None
+) -> pya.Region:
+    """Convert polygons to a klayout region.
+
+    Args:
+        polygons (list): Polygons, each a list of [x, y] vertices (um).
+        dbu (float, optional): Database unit of the region (um). Defaults to 1 nm.
+        holes (list, optional): Holes of each polygon, see polygon_vertices. Defaults to
+            None (no holes).
+
+    Returns:
+        pya.Region: Region of the polygons, unmerged.
+    """
+
+    def points(vertices):
+        return [
+            pya.Point(int(round(x / dbu)), int(round(y / dbu))) for x, y in vertices
+        ]
+
+    r = pya.Region()
+    for idx, polygon in enumerate(polygons):
+        p = pya.Polygon(points(polygon))
+        for hole in holes[idx] if holes else []:
+            p.insert_hole(points(hole))
+        r.insert(p)
+    return r
+
+
+def region_to_polygons(r: pya.Region, dbu: float = 1e-3) -> list:
+    """Convert a klayout region to polygons.
+
+    Args:
+        r (pya.Region): Region to convert.
+        dbu (float, optional): Database unit of the region (um). Defaults to 1 nm.
+
+    Returns:
+        list: (hull, holes) of each polygon, see polygon_vertices.
+    """
+    return [polygon_vertices(p, dbu) for p in r.each()]
+
+
+def heal_region(
+    r: pya.Region, min_feature: float = 0.01, grid: float = 0.001, dbu: float = 1e-3
+) -> pya.Region:
+    """Remove slivers, notches and gaps smaller than a minimum feature size.
+
+    The region is snapped to the grid, gaps and notches narrower than
+    min_feature are closed (size up, then down) and slivers narrower than
+    min_feature are opened away (size down, then up).
+
+    Args:
+        r (pya.Region): Region to heal.
+        min_feature (float, optional): Smallest feature kept (um). Defaults to 10 nm.
+        grid (float, optional): Snapping grid (um). Defaults to 1 nm.
+        dbu (float, optional): Database unit of the region (um). Defaults to 1 nm.
+
+    Returns:
+        pya.Region: Healed, merged region.
+    """
+    g = max(int(round(grid / dbu)), 1)
+    d = int(round(min_feature / 2 / dbu))
+    r = r.merged().snapped(g, g)
+    if d > 0:
+        r = r.sized(d).sized(-d).sized(-d).sized(d)
+    return r.merged()
+
+
 def load_structure_from_bounds(bounds, name, z_base, z_span, material, extension=2.0):
     """Load a structure from a region definition
 
@@ -0,0 +1,572 @@
+"""
+gds_fdtd integration toolbox.
+
+Periodic structure segmentation module.
+@author: Mustafa Hammood, 2024
+"""
+
+import logging
+import numpy as np
+import klayout.db as pya
+from .core import layout, port, structure, region, component, s_parameters
+
+# axis -> (coordinate index, port directions at the start and stop of a segment)
+_AXES = {"x": (0, (180, 0)), "y": (1, (270, 90))}
+
+
+class periodic_section:
+    """A run of identical unit cells along an axis.
+
+    Coordinates are in microns.
+    """
+
+    def __init__(
+        self,
+        axis: str,
+        pitch: float,
+        start: float,
+        count: int,
+        source: str = "geometry",
+    ):
+        self.axis = axis
+        self.pitch = pitch
+        self.start = start
+        self.count = count
+        # 'hierarchy' (instance array/repeated instances) or 'geometry'
+        self.source = source
+
+    @property
+    def stop(self):
+        return self.start + self.count * self.pitch
+
+    def __repr__(self):
+        return (
+            f"periodic_section(axis={self.axis!r}, pitch={self.pitch}, "
+            f"start={self.start}, count={self.count}, source={self.source!r})"
+        )
+
+
+def _detect_from_hierarchy(layout: layout, layers: list, min_periods: int):
+    """Periodic sections: instance arrays or equally spaced instances of one cell.
+
+    Only instances with shapes on the given layers are considered.
+    """
+    dbu = layout.dbu
+    indices = [layout.ly.find_layer(l[0], l[1]) for l in layers]
+    indices = [i for i in indices if i is not None]
+
+    def bbox(inst):
+        box = pya.Box()
+        for i in indices:
+            box += inst.bbox(i)
+        return box
+
+    sections = []
+    placements = {}
+    for inst in layout.cell.each_inst():
+        if bbox(inst).empty():
+            continue
+        if inst.is_regular_array():
+            for n, v in ((inst.na, inst.a), (inst.nb, inst.b)):
+                if n < min_periods or (v.x != 0) == (v.y != 0):
+                    continue
+                axis = "x" if v.y == 0 else "y"
+                box = bbox(inst)
+                start = box.left if axis == "x" else box.bottom
+                sections.append(
+                    periodic_section(
+                        axis, abs(v.x + v.y) * dbu, start * dbu, n, "hierarchy"
+                    )
+                )
+        else:
+            placements.setdefault(inst.cell_index, []).append(inst)
+
+    for insts in placements.values():
+        if len(insts) < min_periods:
+            continue
+        disp = np.array([[i.trans.disp.x, i.trans.disp.y] for i in insts])
+        for axis, (dim, _) in _AXES.items():
+            if np.ptp(disp[:, 1 - dim]) != 0:
+                continue
+            pos = np.sort(disp[:, dim])
+            steps = np.diff(pos)
+            if steps[0] > 0 and np.all(np.abs(steps - steps[0]) <= 1):
+                box = pya.Box()
+                for i in insts:
+                    box += bbox(i)
+                start = box.left if axis == "x" else box.bottom
+                sections.append(
+                    periodic_section(
+                        axis, steps.mean() * dbu, start * dbu, len(insts), "hierarchy"
+                    )
+                )
+    return sections
+
+
+def _detect_from_geometry(
+    regions: list, dbu: float, min_periods: int, tol: int, max_candidates: int
+):
+    """Smallest shift along each axis repeating the geometry over min_periods."""
+    sections = []
+    for axis, (dim, _) in _AXES.items():
+        coords = np.unique(
+            [
+                pt.x if dim == 0 else pt.y
+                for r in regions
+                for poly in r.each()
+                for pt in poly.each_point_hull()
+            ]
+        )
+        if len(coords) < 2:
+            continue
+        lo, hi = coords[0], coords[-1]
+        candidates = [c for c in coords[1:] - lo if c <= (hi - lo) / 2][:max_candidates]
+        for pitch in candidates:
+            dx, dy = (int(pitch), 0) if dim == 0 else (0, int(pitch))
+            mismatch = pya.Region()
+            for r in regions:
+                mismatch += r ^ r.moved(dx, dy)
+            # opening removes slivers left by grid rounding of the pitch
+            mismatch = mismatch.sized(-tol).sized(tol)
+            covered = sorted(
+                (b.left, b.right) if dim == 0 else (b.bottom, b.top)
+                for b in (p.bbox() for p in mismatch.each())
+            )
+            # largest stretch where the geometry equals itself shifted by one pitch
+            gap, edge = (0, 0), lo
+            for a, b in covered + [(hi + pitch, hi + pitch)]:
+                if a - edge > gap[1] - gap[0]:
+                    gap = (edge, a)
+                edge = max(edge, b)
+            count = int((gap[1] - gap[0] + pitch + tol) // pitch)
+            if count >= min_periods:
+                sections.append(
+                    periodic_section(axis, pitch * dbu, (gap[0] - pitch) * dbu, count)
+                )
+                break
+    return sections
+
+
+def detect_periodic(
+    layout: layout,
+    layers: list,
+    min_periods: int = 3,
+    tol: int = 2,
+    max_candidates: int = 200,
+):
+    """Detect the longest periodic section of a layout.
+
+    Instance arrays and equally spaced instances of a cell in the top cell are
+    used first. Otherwise, the flattened geometry is searched for the smallest
+    pitch along x or y under which it repeats.
+
+    Args:
+        layout (layout): Layout to search.
+        layers (list): Layers to consider, i.e. [d["layer"] for d in tech["device"]].
+        min_periods (int, optional): Minimum number of periods of a section. Defaults to
+            3.
+        tol (int, optional): Geometry mismatch tolerance, in database units. Defaults to
+            2.
+        max_candidates (int, optional): Maximum number of candidate pitches tested per
+            axis. Defaults to 200.
+
+    Returns:
+        periodic_section: Longest periodic section, None if none is found.
+    """
+    sections = _detect_from_hierarchy(layout, layers, min_periods)
+    if not sections:
+        regions = [
+            pya.Region(
+                layout.cell.begin_shapes_rec(layout.ly.layer(l[0], l[1]))
+            ).merged()
+            for l in layers
+        ]
+        sections = _detect_from_geometry(
+            regions, layout.dbu, min_periods, tol, max_candidates
+        )
+    if not sections:
+        return None
+    return max(sections, key=lambda s: s.count * s.pitch)
+
+
+def segment_component(
+    device: component,
+    start: float,
+    stop: float,
+    axis: str = "x",
+    name: str | None = None,
+    lead: float = 1.0,
+):
+    """Cut a 2-port in-line component to the span [start, stop] along an axis.
+
+    Device polygons are clipped to the span and extended on both sides by lead
+    um of straight waveguide, as wide as and on the layer of the device's ports.
+    The segment gets ports 'opt1' and 'opt2' halfway along the leads, so the
+    sources and monitors placed beyond the ports fall inside the segment. The
+    reference planes are moved back onto start and stop with deembed.
+
+    Args:
+        device (component): Component to cut.
+        start (float): Segment start coordinate (um).
+        stop (float): Segment stop coordinate (um).
+        axis (str, optional): Axis along which to cut, 'x' or 'y'. Defaults to 'x'.
+        name (str, optional): Segment name. Defaults to '<device name>_<start>_<stop>'.
+        lead (float, optional): Waveguide length added beyond start and stop (um).
+            Defaults to 1 um.
+
+    Returns:
+        component: Segment component.
+    """
+    from .lyprocessor import (
+        load_structure_from_bounds,
+        polygons_to_region,
+        region_to_polygons,
+    )
+
+    if axis not in _AXES:
+        raise ValueError(f"axis must be 'x' or 'y', got {axis!r}.")
+    dim, directions = _AXES[axis]
+    dbu = 1e-3
+    b = device.bounds
+    center = np.mean([p.center[1 - dim] for p in device.ports])
+    width = np.mean([p.width for p in device.ports])
+
+    def box(a, z, lo, hi):
+        """Box spanning [a, z] along the axis and [lo, hi] across it (um)."""
+        corners = [a, lo, z, hi] if dim == 0 else [lo, a, hi, z]
+        return pya.Box(*[int(round(v / dbu)) for v in corners])
+
+    lo, hi = (b.y_min, b.y_max) if dim == 0 else (b.x_min, b.x_max)
+    window = box(start, stop, lo, hi)
+    leads = pya.Region()
+    if lead > 0:
+        leads.insert(box(start - lead, start, center - width / 2, center + width / 2))
+        leads.insert(box(stop, stop + lead, center - width / 2, center + width / 2))
+    outline = box(start - lead, stop + lead, lo, hi)
+    vertices = [
+        [outline.left * dbu, outline.bottom * dbu],
+        [outline.right * dbu, outline.bottom * dbu],
+        [outline.right * dbu, outline.top * dbu],
+        [outline.left * dbu, outline.top * dbu],
+    ]
+    bounds = region(vertices=vertices, z_center=b.z_center, z_span=b.z_span)
+
+    # the leads continue the layer the device's ports sit on
+    p = device.ports[0]
+
+    def is_port_layer(s):
+        return s[0].material == p.material and np.isclose(
+            s[0].z_base + s[0].z_span / 2, p.center[2]
+        )
+
+    structures = []
+    for s in device.structures:
+        if isinstance(s, list):
+            r = polygons_to_region(
+                [i.polygon for i in s], dbu=dbu, holes=[i.holes for i in s]
+            )
+            r = r & pya.Region(window)
+            if is_port_layer(s):
+                r += leads
+            clipped = [
+                structure(
+                    name=f"{s[0].name}_{idx}",
+                    polygon=hull,
+                    z_base=s[0].z_base,
+                    z_span=s[0].z_span,
+                    material=s[0].material,
+                    sidewall_angle=s[0].sidewall_angle,
+                    holes=holes,
+                )
+                for idx, (hull, holes) in enumerate(
+                    region_to_polygons(r.merged(), dbu=dbu)
+                )
+            ]
+            if clipped:
+                structures.append(clipped)
+        else:
+            structures.append(
+                load_structure_from_bounds(
+                    bounds,
+                    name=s.name,
+                    z_base=s.z_base,
+                    z_span=s.z_span,
+                    material=s.material,
+                )
+            )
+
+    ports = []
+    for idx, (pos, direction) in enumerate(
+        zip((start - lead / 2, stop + lead / 2), directions)
+    ):
+        c = [pos, center] if dim == 0 else [center, pos]
+        ports.append(
+            port(
+                name=f"opt{idx + 1}",
+                center=c + [None],
+                width=width,
+                direction=direction,
+            )
+        )
+
+    if name is None:
+        name = f"{device.name}_{start:g}_{stop:g}"
+    return component(name=name, structures=structures, ports=ports, bounds=bounds)
+
+
+def segment_periodic(
+    device: component,
+    section: periodic_section,
+    min_length: float = 1.0,
+    lead: float = 1.0,
+) -> dict:
+    """Split a component into a lead-in, a repeated unit cell and a lead-out.
+
+    The unit cell spans the fewest whole periods that are at least min_length
+    long. Periods that do not fill a whole unit cell are left in the lead-out.
+    Each segment is padded with lead waveguide, see segment_component.
+
+    Args:
+        device (component): 2-port in-line component containing the section.
+        section (periodic_section): Periodic section, see detect_periodic.
+        min_length (float, optional): Minimum unit cell length (um). Defaults to 1 um.
+        lead (float, optional): Waveguide length added on both sides of each segment
+            (um). Defaults to 1 um.
+
+    Returns:
+        dict: 'lead_in' and 'lead_out' components (None when empty), 'cell' component
+            and 'num_cells'.
+    """
+    dim, _ = _AXES[section.axis]
+    b = device.bounds
+    lo, hi = (b.x_min, b.x_max) if dim == 0 else (b.y_min, b.y_max)
+    lo, hi = max(lo, min(p.center[dim] for p in device.ports)), min(
+        hi, max(p.center[dim] for p in device.ports)
+    )
+
+    periods = max(1, int(np.ceil(min_length / section.pitch - 1e-9)))
+    num_cells = section.count // periods
+    if num_cells == 0:
+        raise ValueError(
+            f"Section of {section.count} periods is shorter than "
+            f"min_length={min_length}."
+        )
+    cell_stop = section.start + periods * section.pitch
+    stop = section.start + num_cells * periods * section.pitch
+    if section.count % periods:
+        logging.info(f"{section.count % periods} period(s) left in the lead-out.")
+
+    def segment(a, b, name):
+        if b - a < 1e-3:
+            return None
+        return segment_component(
+            device, a, b, axis=section.axis, name=f"{device.name}_{name}", lead=lead
+        )
+
+    return {
+        "lead_in": segment(lo, section.start, "lead_in"),
+        "cell": segment(section.start, cell_stop, "cell"),
+        "lead_out": segment(stop, hi, "lead_out"),
+        "num_cells": num_cells,
+    }
+
+
+def _blocks(sparams: s_parameters):
+    """2-port s-parameters as (S11, S12, S21, S22) blocks of [f, mode_out, mode_in]."""
+    if len(sparams.ports) != 2:
+        raise ValueError(f"Expected 2-port s-parameters, got ports {sparams.ports}.")
+    if not sparams._filled.all():
+        raise ValueError(
+            "s-parameters must be complete, simulate all ports (in_port='all')."
+        )
+    p1, p2 = (sparams.port_index(idx) for idx in sorted(sparams.ports))
+    # [port_out, port_in, f, mode_out, mode_in]
+    data = sparams.data.transpose(0, 1, 4, 2, 3)
+    return data[p1, p1], data[p1, p2], data[p2, p1], data[p2, p2]
+
+
+def star(a, b):
+    """Redheffer star product of two 2-port block s-matrices, a followed by b.
+
+    Args:
+        a (tuple): (S11, S12, S21, S22) blocks of the first section, each [f, modes,
+            modes].
+        b (tuple): Blocks of the second section.
+
+    Returns:
+        tuple: Blocks of the cascade.
+    """
+    a11, a12, a21, a22 = a
+    b11, b12, b21, b22 = b
+    eye = np.eye(a11.shape[-1])
+    # waves bouncing between the sections
+    fwd = np.linalg.solve(eye - a22 @ b11, a21)  # right-going, launched from port 1
+    bwd = np.linalg.solve(eye - b11 @ a22, b12)  # left-going, launched from port 2
+    return (
+        a11 + a12 @ b11 @ fwd,
+        a12 @ bwd,
+        b21 @ fwd,
+        b22 + b21 @ a22 @ bwd,
+    )
+
+
+def cascade_periodic(
+    cell: s_parameters, count: int, lead_in=None, lead_out=None
+) -> s_parameters:
+    """Response of count unit cells in series, optionally between two leads.
+
+    The cell is cascaded by repeated squaring with the star product, which,
+    unlike transfer matrix powers, does not overflow in stop bands.
+
+    Args:
+        cell (s_parameters): Complete 2-port s-parameters of the unit cell, lower port
+            index at the start.
+        count (int): Number of unit cells.
+        lead_in (s_parameters, optional): Section before the cells. Defaults to None.
+        lead_out (s_parameters, optional): Section after the cells. Defaults to None.
+
+    Returns:
+        s_parameters: 2-port s-parameters of the cascade, ports 1 and 2.
+    """
+    from .circuit import resample
+
+    if count < 1:
+        raise ValueError(f"count must be at least 1, got {count}.")
+    freq = cell.freq
+
+    def blocks(sparams):
+        if sparams.freq.shape != freq.shape or not np.allclose(sparams.freq, freq):
+            sparams = resample(sparams, freq)
+        return _blocks(sparams)
+
+    base, result = blocks(cell), None
+    while count:
+        if count & 1:
+            result = base if result is None else star(result, base)
+        count >>= 1
+        if count:
+            base = star(base, base)
+    if lead_in is not None:
+        result = star(blocks(lead_in), result)
+    if lead_out is not None:
+        result = star(result, blocks(lead_out))
+
+    # [mode_out, mode_in, f]
+    s11, s12, s21, s22 = (s.transpose(1, 2, 0) for s in result)
+    data = np.array([[s11, s12], [s21, s22]])
+    return s_parameters.from_array(data, ports=[1, 2], freq=freq)
+
+
+def deembed(sparams: s_parameters, n_eff, length: float) -> s_parameters:
+    """Move the reference planes of s-parameters inward along their port waveguides.
+
+    Args:
+        sparams (s_parameters): s-parameters referenced at the ports.
+        n_eff (np.ndarray): Complex effective index of each port's modes, indexed as
+            [port, mode, f] in sparams port order.
+        length (float): Distance from each port to its new reference plane (um).
+
+    Returns:
+        s_parameters: s-parameters referenced at the new planes.
+    """
+    import tidy3d as td
+
+    # exp(-1j * w * t) waves gain a phase of exp(1j * beta * length) along a lead
+    phase = np.exp(-2j * np.pi * sparams.freq / td.C_0 * np.asarray(n_eff) * length)
+    data = sparams.data * phase[:, None, :, None, :] * phase[None, :, None, :, :]
+    return s_parameters.from_array(
+        data, ports=sparams.ports, freq=sparams.freq, filled=sparams._filled
+    )
+
+
+def _port_n_eff(simulation, freq):
+    """Effective index [port, mode, f] of a simulation's port modes, at freq."""
+    results = simulation.results
+    if isinstance(results, list):
+        results = results[0]
+    ports = sorted(
+        simulation.device.ports,
+        key=lambda p: simulation.s_parameters.port_index(p.idx),
+    )
+    n_eff = []
+    for p in ports:
+        n = results[p.name].n_complex.sortby("f").transpose("mode_index", "f")
+        f = np.asarray(n.f)
+        n_eff.append(
+            [
+                np.interp(freq, f, v.real) + 1j * np.interp(freq, f, v.imag)
+                for v in np.asarray(n)
+            ]
+        )
+    return np.array(n_eff)
+
+
+def run_periodic(
+    layout,
+    tech: dict,
+    section: periodic_section | None = None,
+    min_length: float = 1.0,
+    lead: float = 1.0,
+    backend=None,
+    max_workers: int = 4,
+    poll_interval: float = 5.0,
+    cache=None,
+    **fixed,
+) -> s_parameters:
+    """Simulate a periodic device from its lead-in, one unit cell and its lead-out.
+
+    Each segment (see segment_periodic) is simulated from all of its ports, its
+    s-parameters are de-embedded onto the cut planes, and the unit cell is
+    cascaded between the leads (see cascade_periodic).
+
+    Args:
+        layout (layout): Layout of the 2-port in-line device.
+        tech (dict): Technology stack.
+        section (periodic_section, optional): Periodic section. Defaults to None
+            (see detect_periodic).
+        min_length (float, optional): Minimum unit cell length (um). Defaults to 1 um.
+        lead (float, optional): Waveguide length added on both sides of each segment
+            (um). Defaults to 1 um.
+        backend (backends.backend, optional): Backend to run the jobs on. Defaults to
+            None (tidy3d cloud).
+        max_workers (int, optional): Maximum number of concurrently running jobs.
+            Defaults to 4.
+        poll_interval (float, optional): Time between job status checks, in seconds.
+            Defaults to 5.
+        cache (result_cache or bool, optional): Result cache, see Simulation.execute.
+            Defaults to None.
+        fixed (dict): make_sim parameters shared by all segments, and z_span.
+
+    Returns:
+        s_parameters: 2-port s-parameters of the device, ports 1 and 2.
+    """
+    from .simprocessor import load_component_from_tech, make_sim
+
+    if section is None:
+        section = detect_periodic(layout, [d["layer"] for d in tech["device"]])
+        if section is None:
+            raise ValueError(f"No periodic section found in {layout.name}.")
+    z_span = fixed.pop("z_span", 4)
+    device = load_component_from_tech(layout, tech, z_span=z_span)
+    segments = segment_periodic(device, section, min_length=min_length, lead=lead)
+
+    fixed.setdefault("visualize", False)
+    sparams = {}
+    for key in ("lead_in", "cell", "lead_out"):
+        if segments[key] is None:
+            continue
+        simulation = make_sim(segments[key], in_port="all", z_span=z_span, **fixed)
+        simulation.backend = backend
+        simulation.execute(
+            max_workers=max_workers, poll_interval=poll_interval, cache=cache
+        )
+        freq = simulation.s_parameters.freq
+        sparams[key] = deembed(
+            simulation.s_parameters, _port_n_eff(simulation, freq), lead / 2
+        )
+    return cascade_periodic(
+        sparams["cell"],
+        segments["num_cells"],
+        lead_in=sparams.get("lead_in"),
+        lead_out=sparams.get("lead_out"),
+    )
@@ -0,0 +1,276 @@
+"""
+gds_fdtd integration toolbox.
+
+Incremental build pipeline module.
+@author: Mustafa Hammood, 2024
+"""
+
+import hashlib
+import inspect
+import numpy as np
+import klayout.db as pya
+from .core import layout
+
+
+def _token(value) -> str:
+    """Content token of a parameter value.
+
+    Layouts are keyed on the GDS stream of their cell, arrays on their bytes and
+    other values on their repr.
+    """
+    if isinstance(value, layout):
+        options = pya.SaveLayoutOptions()
+        options.format = "GDS2"
+        options.gds2_write_timestamps = False
+        options.select_cell(value.cell.cell_index())
+        data = value.cell.name.encode() + value.ly.write_bytes(options)
+    elif isinstance(value, np.ndarray):
+        data = value.dtype.str.encode() + str(value.shape).encode() + value.tobytes()
+    else:
+        data = repr(value).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class stage:
+    """A memoized build step.
+
+    Inputs are names of upstream stages or of parameters. The function is
+    called with each input as a keyword argument.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        inputs: list[str] | None = None,
+        defaults: dict | None = None,
+        by_value: bool = False,
+    ):
+        """
+        Args:
+            name (str): Stage name.
+            func (callable): Stage function.
+            inputs (list, optional): Input names. Defaults to None (the function's
+                arguments).
+            defaults (dict, optional): Default parameter values. Defaults to None (the
+                function's defaults).
+            by_value (bool, optional): Key downstream stages on the result's value
+                rather than on the inputs, for cheap stages with small results. Defaults
+                to False.
+        """
+        signature = inspect.signature(func).parameters
+        self.name = name
+        self.func = func
+        self.inputs = list(signature) if inputs is None else list(inputs)
+        self.defaults = {
+            k: p.default
+            for k, p in signature.items()
+            if p.default is not inspect.Parameter.empty
+        }
+        self.defaults.update(defaults or {})
+        self.by_value = by_value
+
+
+class pipeline:
+    """Graph of memoized stages.
+
+    Changing a parameter only recomputes the stages downstream of it. A stage's
+    result can also be passed as a parameter, i.e. an already loaded layout.
+    Each stage keeps its max_entries most recently used results.
+    """
+
+    def __init__(self, stages: list | None = None, max_entries: int | None = 64):
+        self.stages = {}
+        self.memo = {}  # stage name -> {key: result}, least recently used first
+        self.calls = {}  # stage name -> number of times it was computed
+        self.max_entries = max_entries
+        # stage name -> {key: inputs}, values keyed on their repr stay alive, so
+        # an object id in a key is not reused while its result is memoized
+        self._inputs = {}
+        for s in stages or []:
+            self.add(s)
+
+    def add(self, s: stage):
+        """Add a stage, its upstream stages must already be added."""
+        self.stages[s.name] = s
+        self.memo[s.name] = {}
+        self._inputs[s.name] = {}
+        self.calls[s.name] = 0
+
+    @property
+    def params(self) -> set:
+        """Names of all parameters of the pipeline."""
+        return {
+            i for s in self.stages.values() for i in s.inputs if i not in self.stages
+        }
+
+    def downstream(self, name: str) -> set:
+        """Stages that depend on a stage or parameter, directly or indirectly."""
+        found = set()
+        for s in self.stages.values():
+            if name in s.inputs and s.name not in found:
+                found |= {s.name} | self.downstream(s.name)
+        return found
+
+    def _resolve(self, name: str, params: dict):
+        if name in params:
+            return _token(params[name]), params[name]
+        s = self.stages[name]
+        args, keys = {}, []
+        for i in s.inputs:
+            if i in self.stages:
+                key, args[i] = self._resolve(i, params)
+            elif i in params:
+                args[i] = params[i]
+                key = _token(args[i])
+            elif i in s.defaults:
+                args[i] = s.defaults[i]
+                key = _token(args[i])
+            else:
+                raise ValueError(f"Stage '{name}' is missing input '{i}'.")
+            keys.append(f"{i}={key}")
+        key = hashlib.sha256(";".join(keys).encode()).hexdigest()
+        memo, inputs = self.memo[name], self._inputs[name]
+        if key in memo:
+            # most recently used last
+            memo[key] = memo.pop(key)
+            inputs[key] = inputs.pop(key)
+        else:
+            memo[key], inputs[key] = s.func(**args), args
+            self.calls[name] += 1
+            while self.max_entries is not None and len(memo) > self.max_entries:
+                oldest = next(iter(memo))
+                del memo[oldest], inputs[oldest]
+        if s.by_value:
+            return _token(memo[key]), memo[key]
+        return key, memo[key]
+
+    def get(self, name: str, **params):
+        """Compute a stage's result, reusing memoized intermediate results.
+
+        Args:
+            name (str): Stage to compute.
+            params (dict): Parameter values. Missing parameters take the stages'
+                defaults.
+
+        Returns:
+            Result of the stage.
+        """
+        unknown = set(params) - self.params - set(self.stages)
+        if unknown:
+            raise ValueError(f"Unknown pipeline parameters {sorted(unknown)}.")
+        return self._resolve(name, params)[1]
+
+    def clear(self, name: str | None = None):
+        """Drop memoized results.
+
+        Args:
+            name (str, optional): Stage whose results to drop. Defaults to None (all
+                stages).
+        """
+        for n in self.memo if name is None else [name]:
+            self.memo[n] = {}
+            self._inputs[n] = {}
+
+
+def _simulation(**kwargs):
+    from .simprocessor import make_sim
+
+    device = kwargs.pop("component")
+    in_port = kwargs.get("in_port")
+    if isinstance(in_port, int):
+        kwargs["in_port"] = device.ports[in_port]
+    return make_sim(
+        device=device,
+        structures=kwargs.pop("structures"),
+        port_monitors=kwargs.pop("monitors"),
+        **kwargs,
+    )
+
+
+def simulation_pipeline() -> pipeline:
+    """Pipeline building a simulation from a layout and a technology stack.
+
+    Stages: layout, layers, ports, region, component, pml, structures, monitors
+    and simulation. Parameters are those of load_layout,
+    load_component_from_tech, make_structures (min_feature) and make_sim.
+    """
+    from .lyprocessor import load_layout, load_ports, load_region
+    from .core import initialize_ports_z
+    from .simprocessor import (
+        load_layers,
+        layers_z_center,
+        make_component,
+        make_structures,
+        pml_thickness,
+        make_port_monitors,
+        monitor_freqs,
+        make_sim,
+    )
+
+    def ports(layout, tech, layers):
+        p = load_ports(layout, layer=tech["pinrec"][0]["layer"])
+        initialize_ports_z(p, layers)
+        return p
+
+    def region(layout, tech, layers, z_span=4, z_center=None):
+        if not z_center:
+            z_center = layers_z_center(layers)
+        return load_region(
+            layout, layer=tech["devrec"][0]["layer"], z_center=z_center, z_span=z_span
+        )
+
+    def component(layout, tech, layers, ports, region):
+        return make_component(
+            layout.name, tech, layers, ports, region, initialize_ports=False
+        )
+
+    def pml(clip, boundary, wavl_max, grid_cells_per_wvl):
+        return pml_thickness(boundary, wavl_max, grid_cells_per_wvl) if clip else None
+
+    def structures(component, pml, min_feature=None):
+        clip = pml is not None
+        return make_structures(
+            component, clip=clip, min_feature=min_feature, pml=pml or 0.0
+        )
+
+    def monitors(
+        component,
+        wavl_min,
+        wavl_max,
+        wavl_pts,
+        sparse_wavl,
+        width_ports,
+        depth_ports,
+        num_modes,
+    ):
+        freqs, _ = monitor_freqs(wavl_min, wavl_max, wavl_pts, sparse_wavl)
+        return make_port_monitors(component, freqs, width_ports, depth_ports, num_modes)
+
+    make_sim_params = inspect.signature(make_sim).parameters
+    make_sim_defaults = {
+        k: p.default
+        for k, p in make_sim_params.items()
+        if p.default is not inspect.Parameter.empty
+    }
+    sim_inputs = ["component", "structures", "monitors"] + [
+        k for k in make_sim_params if k not in ("device", "structures", "port_monitors")
+    ]
+    return pipeline(
+        [
+            stage("layout", load_layout, inputs=["fname", "top_cell"]),
+            stage("layers", lambda layout, tech: load_layers(layout, tech)),
+            stage("ports", ports),
+            stage("region", region),
+            stage("component", component),
+            stage("pml", pml, defaults=make_sim_defaults, by_value=True),
+            stage("structures", structures),
+            stage("monitors", monitors, defaults=make_sim_defaults),
+            stage(
+                "simulation",
+                _simulation,
+                inputs=sim_inputs,
+                defaults={**make_sim_defaults, "visualize": False},
+            ),
+        ]
+    )
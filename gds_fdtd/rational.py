@@ -0,0 +1,246 @@
+"""
+gds_fdtd integration toolbox.
+
+Rational (vector fitting) model module.
+@author: Mustafa Hammood, 2024
+"""
+
+import logging
+import numpy as np
+
+
+class rational_model:
+    """Pole-residue model of a sampled frequency response.
+
+    The response is modelled as
+        s(f) = exp(1j * delay * f) * (d + e * x + sum_k r_k / (x - a_k)),
+    where x = -1j * (f - f0) / df is the normalized frequency and the linear
+    phase term removes the propagation delay before fitting. The sign of x follows
+    tidy3d's exp(-1j * w * t) convention, so stable poles lie in Re(x) < 0.
+    """
+
+    def __init__(self, poles, residues, d, e, f0, df, delay=0.0):
+        self.poles = np.asarray(poles, dtype=complex)
+        self.residues = np.asarray(residues, dtype=complex)
+        self.d = d
+        self.e = e
+        self.f0 = f0
+        self.df = df
+        self.delay = delay
+        self.rms_error = None
+        self.max_error = None
+
+    @property
+    def n_poles(self):
+        return len(self.poles)
+
+    def __call__(self, freq):
+        freq = np.asarray(freq, dtype=float)
+        x = -1j * (freq - self.f0) / self.df
+        h = self.d + self.e * x
+        if self.n_poles:
+            h = h + np.sum(
+                self.residues[:, None] / (x[None, :] - self.poles[:, None]), axis=0
+            )
+        return h * np.exp(1j * self.delay * freq)
+
+    def error(self, freq, s):
+        """Evaluate the absolute fit error against sampled data.
+
+        Args:
+            freq (np.ndarray): Sampled frequencies.
+            s (np.ndarray): Sampled complex response.
+
+        Returns:
+            tuple: (rms error, max error).
+        """
+        err = np.abs(self(freq) - np.asarray(s))
+        return float(np.sqrt(np.mean(err**2))), float(np.max(err))
+
+
+def _initial_poles(n_poles):
+    beta = np.linspace(-1, 1, n_poles) if n_poles > 1 else np.zeros(1)
+    return -0.05 + 1j * beta
+
+
+def _pole_basis(x, poles):
+    return 1.0 / (x[:, None] - poles[None, :])
+
+
+def estimate_delay(freq, s) -> float:
+    """Estimate the linear phase slope (delay) of a sampled response.
+
+    The delay maximizing |sum s exp(-1j * delay * f)| is searched around the
+    unwrapped phase slope, so low amplitude samples weigh the least.
+
+    Args:
+        freq (np.ndarray): Sample frequencies (Hz), any order.
+        s (np.ndarray): Complex response at each frequency.
+
+    Returns:
+        float: Delay (rad/Hz). A warning is logged if the samples are too sparse to
+            resolve it.
+    """
+    order = np.argsort(freq)
+    f, s = np.asarray(freq, dtype=float)[order], np.asarray(s, dtype=complex)[order]
+    if len(f) < 3 or not np.any(np.abs(s) > 0):
+        return 0.0
+    step = np.max(np.diff(f))
+    delay = np.polyfit(f, np.unwrap(np.angle(s)), 1)[0]
+
+    def coherence(delays):
+        return np.abs(np.exp(-1j * np.outer(delays, f - f[0])) @ s)
+
+    # coarse search over one wrap per step, then around the best coarse point
+    width = np.pi / step
+    for _ in range(2):
+        grid = delay + np.linspace(-width, width, 64 * len(f) + 1)
+        delay = grid[np.argmax(coherence(grid))]
+        width = 2 * width / (64 * len(f))
+
+    # delays turning the phase by pi or more between samples alias to smaller ones
+    if abs(delay) * step > 0.75 * np.pi:
+        logging.warning(
+            f"Phase turns by {abs(delay) * step:.2f} rad between samples, the delay "
+            "estimate may be aliased, consider adding sample points."
+        )
+    return float(delay)
+
+
+def vector_fit(
+    freq,
+    s,
+    n_poles: int = 4,
+    n_iter: int = 10,
+    remove_delay: bool = True,
+    delay: float | None = None,
+):
+    """Fit a rational model to a sampled complex response using vector fitting.
+
+    Args:
+        freq (np.ndarray): Sample frequencies (Hz), any order.
+        s (np.ndarray): Complex response at each frequency.
+        n_poles (int, optional): Model order. Defaults to 4.
+        n_iter (int, optional): Pole relocation iterations. Defaults to 10.
+        remove_delay (bool, optional): Remove the linear phase before fitting. Defaults
+            to True.
+        delay (float, optional): Delay to remove (rad/Hz). Defaults to None (see
+            estimate_delay).
+
+    Returns:
+        rational_model: Fitted model with rms_error and max_error populated.
+    """
+    freq = np.asarray(freq, dtype=float)
+    s = np.asarray(s, dtype=complex)
+
+    f0 = (np.max(freq) + np.min(freq)) / 2
+    df = (np.max(freq) - np.min(freq)) / 2 or 1.0
+    x = -1j * (freq - f0) / df
+
+    if not remove_delay:
+        delay = 0.0
+    elif delay is None:
+        delay = estimate_delay(freq, s)
+    h = s * np.exp(-1j * delay * freq)
+
+    poles = _initial_poles(n_poles) if n_poles else np.zeros(0, dtype=complex)
+    ones = np.ones((len(x), 1))
+    for _ in range(n_iter if n_poles else 0):
+        basis = _pole_basis(x, poles)
+        # unknowns: residues of sigma*h, d, e, residues of sigma
+        A = np.hstack([basis, ones, x[:, None], -h[:, None] * basis])
+        sol = np.linalg.lstsq(A, h, rcond=None)[0]
+        c_sigma = sol[n_poles + 2 :]
+        poles = np.linalg.eigvals(np.diag(poles) - np.outer(np.ones(n_poles), c_sigma))
+        # flip unstable poles into the left half plane
+        poles = np.where(poles.real > 0, -np.conj(poles), poles)
+        # keep poles off the imaginary axis to avoid singular samples
+        poles = np.where(np.abs(poles.real) < 1e-6, poles - 1e-6, poles)
+
+    A = np.hstack([_pole_basis(x, poles), ones, x[:, None]])
+    sol = np.linalg.lstsq(A, h, rcond=None)[0]
+    model = rational_model(
+        poles=poles,
+        residues=sol[:n_poles],
+        d=sol[n_poles],
+        e=sol[n_poles + 1],
+        f0=f0,
+        df=df,
+        delay=delay,
+    )
+    model.rms_error, model.max_error = model.error(freq, s)
+    return model
+
+
+def fit_response(
+    freq, s, tol: float = 1e-3, max_poles: int | None = None, n_iter: int = 10
+):
+    """Fit a rational model, raising the order until the fit error is within tol.
+
+    Args:
+        freq (np.ndarray): Sample frequencies (Hz).
+        s (np.ndarray): Complex response at each frequency.
+        tol (float, optional): Target rms error (linear amplitude). Defaults to 1e-3.
+        max_poles (int, optional): Maximum model order. Defaults to half the number of
+            samples.
+        n_iter (int, optional): Pole relocation iterations per order. Defaults to 10.
+
+    Returns:
+        rational_model: Lowest-order model meeting tol, or the best model found.
+    """
+    n_samples = np.size(freq)
+    # keep at least two samples per unknown to avoid interpolating noise
+    limit = max((n_samples - 2) // 2, 0)
+    max_poles = limit if max_poles is None else min(max_poles, limit)
+
+    best = None
+    delay = estimate_delay(freq, s)
+    for n_poles in range(0, max_poles + 1, 2):
+        model = vector_fit(freq, s, n_poles=n_poles, n_iter=n_iter, delay=delay)
+        if best is None or model.rms_error < best.rms_error:
+            best = model
+        if model.rms_error <= tol:
+            break
+    if best.rms_error > tol:
+        logging.warning(
+            f"Rational fit did not reach tolerance {tol:.1e} "
+            f"(rms error {best.rms_error:.1e}), consider adding sample points."
+        )
+    return best
+
+
+def refine_freqs(models, freq, n_pts: int = 10, n_eval: int = 20):
+    """Choose additional sample frequencies where the response has sharp features.
+
+    Each interval between existing samples is scored by how far the fitted models
+    deviate from a straight line through the interval's end points. New samples are
+    placed at the worst point of the highest scoring intervals.
+
+    Args:
+        models (list): Rational models fitted to the sampled responses.
+        freq (np.ndarray): Existing sample frequencies (Hz).
+        n_pts (int, optional): Number of frequencies to add. Defaults to 10.
+        n_eval (int, optional): Evaluation points per interval. Defaults to 20.
+
+    Returns:
+        np.ndarray: Sorted union of existing and new sample frequencies.
+    """
+    if isinstance(models, rational_model):
+        models = [models]
+    freq = np.sort(np.asarray(freq, dtype=float))
+
+    # (interval, eval point) grid spanning each interval, end points excluded
+    t = np.linspace(0, 1, n_eval + 2)[1:-1]
+    f_eval = freq[:-1, None] + t[None, :] * np.diff(freq)[:, None]
+
+    deviation = np.zeros_like(f_eval)
+    for m in models:
+        s_nodes = m(freq)
+        s_line = s_nodes[:-1, None] + t[None, :] * np.diff(s_nodes)[:, None]
+        s_model = m(f_eval.ravel()).reshape(f_eval.shape)
+        deviation = np.maximum(deviation, np.abs(s_model - s_line))
+
+    score = np.max(deviation, axis=1)
+    worst = np.argsort(score)[::-1][: min(n_pts, len(score))]
+    new = f_eval[worst, np.argmax(deviation[worst], axis=1)]
+    return np.union1d(freq, new)
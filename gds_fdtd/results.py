@@ -0,0 +1,138 @@
+"""
+gds_fdtd integration toolbox.
+
+Lazy simulation results module.
+@author: Mustafa Hammood, 2024
+"""
+
+import json
+import h5py
+import numpy as np
+import tidy3d as td
+
+
+class lazy_sim_data:
+    """Handle to a simulation results file that loads monitor data on demand.
+
+    Mode amplitudes are read per monitor from the .hdf5 datasets. The full
+    SimulationData is kept from load() until release(). Other accesses to it read
+    the file without keeping it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = None
+        self._simulation = None
+        self._data = None
+
+    def _read_header(self):
+        model = json.loads(td.SimulationData._json_string_from_hdf5(self.path))
+        self._index = {d["monitor"]["name"]: idx for idx, d in enumerate(model["data"])}
+        self._simulation = td.Simulation.parse_obj(model["simulation"])
+
+    @property
+    def simulation(self) -> td.Simulation:
+        if self._simulation is None:
+            self._read_header()
+        return self._simulation
+
+    @property
+    def monitor_names(self) -> list[str]:
+        """Names of the monitors with data in the file."""
+        if self._index is None:
+            self._read_header()
+        return list(self._index)
+
+    def _group(self, monitor_name: str) -> str:
+        if self._index is None:
+            self._read_header()
+        if monitor_name not in self._index:
+            raise KeyError(f"No data for monitor '{monitor_name}' in {self.path}.")
+        return f"data/{self._index[monitor_name]}"
+
+    def amps(self, monitor_name: str) -> td.ModeAmpsDataArray:
+        """Read the mode amplitudes of a mode monitor.
+
+        Args:
+            monitor_name (str): Mode monitor name.
+
+        Returns:
+            td.ModeAmpsDataArray: Amplitudes with (direction, f, mode_index)
+            coordinates.
+        """
+        with h5py.File(self.path, "r") as f:
+            group = f[f"{self._group(monitor_name)}/amps"]
+            coords = {}
+            for dim in td.ModeAmpsDataArray._dims:
+                values = group[dim][()]
+                if values.dtype.kind in "OS":
+                    values = [v.decode() if isinstance(v, bytes) else v for v in values]
+                coords[dim] = values
+            values = np.array(group["__xarray_dataarray_variable__"])
+        return td.ModeAmpsDataArray(values, coords=coords)
+
+    def mode_amps(self, monitor_names: list[str]) -> np.ndarray:
+        """Read and stack the mode amplitudes of several mode monitors.
+
+        Args:
+            monitor_names (list): Mode monitor names, with the same frequencies and
+                number of modes.
+
+        Returns:
+            np.ndarray: Amplitudes indexed as (monitor, direction, mode, freq),
+            directions ordered ('+', '-').
+        """
+        dims = td.ModeAmpsDataArray._dims
+        amps = []
+        with h5py.File(self.path, "r") as f:
+            for name in monitor_names:
+                group = f[f"{self._group(name)}/amps"]
+                values = np.array(group["__xarray_dataarray_variable__"])
+                directions = [
+                    d.decode() if isinstance(d, bytes) else d
+                    for d in group["direction"][()]
+                ]
+                values = np.take(
+                    values,
+                    [directions.index("+"), directions.index("-")],
+                    axis=dims.index("direction"),
+                )
+                amps.append(values)
+        # (monitor, direction, f, mode_index) -> (monitor, direction, mode, freq)
+        order = [dims.index("direction"), dims.index("mode_index"), dims.index("f")]
+        return np.stack(amps).transpose(0, *[i + 1 for i in order])
+
+    def load(self) -> td.SimulationData:
+        """Load the full simulation data, including field monitors, once."""
+        if self._data is None:
+            self._data = td.SimulationData.from_file(self.path)
+        return self._data
+
+    def release(self):
+        """Drop the loaded full simulation data."""
+        self._data = None
+
+    def _full(self) -> td.SimulationData:
+        """The loaded full simulation data, else a copy read from the file."""
+        if self._data is not None:
+            return self._data
+        return td.SimulationData.from_file(self.path)
+
+    def __getitem__(self, monitor_name: str):
+        """Load the data of a single monitor."""
+        group = self._group(monitor_name)
+        monitor_type = type(self.simulation.get_monitor_by_name(monitor_name))
+        data_type = {
+            td.ModeMonitor: td.ModeData,
+            td.FieldMonitor: td.FieldData,
+            td.FluxMonitor: td.FluxData,
+        }.get(monitor_type)
+        if data_type is None:
+            return self._full()[monitor_name]
+        return data_type.from_file(self.path, group_path=group)
+
+    def __getattr__(self, name):
+        # fall back to the full simulation data, i.e. for plot_field
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._full(), name)
@@ -5,6 +5,7 @@ Tidy3D simulation processing module.
 @author: Mustafa Hammood, 2024
 """
 
+import logging
 import tidy3d as td
 import numpy as np
 import matplotlib.pyplot as plt
@@ -16,6 +17,7 @@ from .lyprocessor import (
     load_structure_from_bounds,
     dilate,
     dilate_1d,
+    polygon_vertices,
 )
 
 
@@ -81,12 +83,277 @@ def make_source(
     return msource
 
 
-def make_structures(device, buffer: float=4.):
+def pml_thickness(
+    boundary: td.BoundarySpec, wavl_max: float, grid_cells_per_wvl: int = 15
+) -> float:
+    """Largest in-plane thickness of a boundary's absorbing layers (um).
+
+    Absorbing layers are num_layers grid cells thick, and cells of the auto grid
+    are at most wavl_max / grid_cells_per_wvl (in vacuum).
+    """
+    num_layers = [
+        getattr(b, "num_layers", 0)
+        for axis in (boundary.x, boundary.y)
+        for b in (axis.minus, axis.plus)
+    ]
+    return max(num_layers) * wavl_max / grid_cells_per_wvl
+
+
+def cladding_extension(device) -> float:
+    """How far the component's cladding structures reach beyond its bounds (um)."""
+    x, y = np.asarray(device.bounds.vertices, dtype=float).T
+    extension = 0.0
+    for s in device.structures:
+        if type(s) != list:
+            px, py = np.asarray(s.polygon, dtype=float).T
+            reach = [
+                x.min() - px.min(),
+                px.max() - x.max(),
+                y.min() - py.min(),
+                py.max() - y.max(),
+            ]
+            extension = max(extension, *reach)
+    return extension
+
+
+def clip_component(device, margin: float, dbu: float = 1e-3) -> tuple[component, dict]:
+    """Clip the device polygons of a component to its simulation region.
+
+    Polygons are clipped to the bounding box of the bounds grown by margin.
+    Polygons inside the box are kept as is and polygons outside it are dropped.
+
+    Args:
+        device (component): Component to clip.
+        margin (float): Growth of the bounds (um), see make_structures.
+        dbu (float, optional): Database unit polygons are clipped on (um). Defaults to 1
+            nm.
+
+    Returns:
+        tuple: (clipped component, report). The report holds the (before, after) number
+            of 'polygons' and 'vertices'.
+    """
+    import klayout.db as pya
+    from .lyprocessor import polygons_to_region, region_to_polygons
+
+    x, y = np.asarray(device.bounds.vertices, dtype=float).T
+    xmin, xmax, ymin, ymax = (
+        x.min() - margin,
+        x.max() + margin,
+        y.min() - margin,
+        y.max() + margin,
+    )
+    box = pya.Region(
+        pya.Box(
+            int(np.floor(xmin / dbu)),
+            int(np.floor(ymin / dbu)),
+            int(np.ceil(xmax / dbu)),
+            int(np.ceil(ymax / dbu)),
+        )
+    )
+
+    report = {"polygons": [0, 0], "vertices": [0, 0]}
+    structures = []
+    for s in device.structures:
+        if type(s) != list:
+            structures.append(s)
+            continue
+        clipped = []
+        for i in s:
+            report["polygons"][0] += 1
+            report["vertices"][0] += len(i.polygon) + sum(len(h) for h in i.holes)
+            px, py = np.asarray(i.polygon, dtype=float).T
+            if (
+                px.min() >= xmin
+                and px.max() <= xmax
+                and py.min() >= ymin
+                and py.max() <= ymax
+            ):
+                pieces = [i]
+            elif (
+                px.max() <= xmin
+                or px.min() >= xmax
+                or py.max() <= ymin
+                or py.min() >= ymax
+            ):
+                pieces = []
+            else:
+                polygons = region_to_polygons(
+                    polygons_to_region([i.polygon], dbu=dbu, holes=[i.holes]) & box,
+                    dbu=dbu,
+                )
+                pieces = [
+                    structure(
+                        name=i.name if idx == 0 else f"{i.name}_{idx}",
+                        polygon=hull,
+                        z_base=i.z_base,
+                        z_span=i.z_span,
+                        material=i.material,
+                        sidewall_angle=i.sidewall_angle,
+                        holes=holes,
+                    )
+                    for idx, (hull, holes) in enumerate(polygons)
+                ]
+            report["polygons"][1] += len(pieces)
+            report["vertices"][1] += sum(
+                len(p.polygon) + sum(len(h) for h in p.holes) for p in pieces
+            )
+            clipped.extend(pieces)
+        if clipped:
+            structures.append(clipped)
+
+    report = {k: tuple(v) for k, v in report.items()}
+    device = component(
+        name=device.name,
+        structures=structures,
+        ports=device.ports,
+        bounds=device.bounds,
+        initialize_ports=False,
+    )
+    return device, report
+
+
+def estimate_cells(
+    device,
+    wavl: float = 1.55,
+    grid_cells_per_wvl: int = 15,
+    z_span: float | None = None,
+) -> int:
+    """Estimate the number of grid cells of a component's simulation.
+
+    The auto grid is built as make_sim would, without sources or monitors.
+
+    Args:
+        device (component): Component to simulate.
+        wavl (float, optional): Wavelength the grid is built for (um). Defaults to 1.55
+            um.
+        grid_cells_per_wvl (int, optional): Grid cells per wavelength. Defaults to 15.
+        z_span (float, optional): Simulation's depth. Defaults to None (the bounds' z
+            span).
+
+    Returns:
+        int: Number of grid cells.
+    """
+    size = [
+        device.bounds.x_span,
+        device.bounds.y_span,
+        device.bounds.z_span if z_span is None else z_span,
+    ]
+    center = (device.bounds.x_center, device.bounds.y_center, device.bounds.z_center)
+    structures, medium = consolidate_structures(make_structures(device), center, size)
+    sim = td.Simulation(
+        size=size,
+        center=center,
+        grid_spec=td.GridSpec.auto(
+            min_steps_per_wvl=grid_cells_per_wvl, wavelength=wavl
+        ),
+        structures=structures,
+        medium=medium,
+        run_time=1e-12,
+        boundary_spec=td.BoundarySpec.all_sides(boundary=td.PML()),
+    )
+    return int(sim.num_cells)
+
+
+def heal_component(
+    device,
+    min_feature: float = 0.01,
+    grid: float = 0.001,
+    dbu: float = 1e-3,
+    cells: bool = True,
+    **cells_args,
+) -> tuple[component, dict]:
+    """Heal the device polygons of a component, see lyprocessor.heal_region.
+
+    Args:
+        device (component): Component to heal.
+        min_feature (float, optional): Smallest feature kept (um). Defaults to 10 nm.
+        grid (float, optional): Snapping grid (um). Defaults to 1 nm.
+        dbu (float, optional): Database unit polygons are healed on (um). Defaults to 1
+            nm.
+        cells (bool, optional): Report the estimated grid cell count, see
+            estimate_cells. Defaults to True.
+        cells_args (dict): Arguments of estimate_cells.
+
+    Returns:
+        tuple: (healed component, report). The report holds the (before, after) number
+            of 'polygons' and 'vertices', the changed 'area' (um^2) and, with cells, the
+            estimated number of grid 'cells'.
+    """
+    from .lyprocessor import polygons_to_region, region_to_polygons, heal_region
+
+    def count(structures):
+        polygons = [i for s in structures if type(s) == list for i in s]
+        return len(polygons), sum(
+            len(i.polygon) + sum(len(h) for h in i.holes) for i in polygons
+        )
+
+    area = 0.0
+    structures = []
+    for s in device.structures:
+        if type(s) != list:
+            structures.append(s)
+            continue
+        r = polygons_to_region(
+            [i.polygon for i in s], dbu=dbu, holes=[i.holes for i in s]
+        )
+        healed = heal_region(r, min_feature=min_feature, grid=grid, dbu=dbu)
+        area += (r.merged() ^ healed).area() * dbu**2
+        healed = [
+            structure(
+                name=f"{s[0].name}_{idx}",
+                polygon=hull,
+                z_base=s[0].z_base,
+                z_span=s[0].z_span,
+                material=s[0].material,
+                sidewall_angle=s[0].sidewall_angle,
+                holes=holes,
+            )
+            for idx, (hull, holes) in enumerate(region_to_polygons(healed, dbu=dbu))
+        ]
+        if healed:
+            structures.append(healed)
+
+    healed = component(
+        name=device.name,
+        structures=structures,
+        ports=device.ports,
+        bounds=device.bounds,
+        initialize_ports=False,
+    )
+    before, after = count(device.structures), count(structures)
+    report = {
+        "polygons": (before[0], after[0]),
+        "vertices": (before[1], after[1]),
+        "area": area,
+    }
+    if cells:
+        report["cells"] = (
+            estimate_cells(device, **cells_args),
+            estimate_cells(healed, **cells_args),
+        )
+    return healed, report
+
+
+def make_structures(
+    device,
+    buffer: float = 4.0,
+    clip: bool = False,
+    min_feature: float | None = None,
+    pml: float = 0.0,
+):
     """Create a tidy3d structure object from a device objcet.
 
     Args:
         device (device object): Device to create the structure from.
         buffer (int, optional): Extension of ports beyond simulation region . Defaults to 2 microns.
+        clip (bool, optional): Clip the device polygons to the simulation region first,
+            see clip_component. The margin covers the cladding, the port extensions and
+            the PML. Defaults to False.
+        min_feature (float, optional): Heal the device polygons, removing features
+            smaller than min_feature (um), see heal_component. Defaults to None (no
+            healing).
+        pml (float, optional): PML thickness beyond the simulation region (um), see
+            pml_thickness. Defaults to 0.
 
     Returns:
         list: list of structures generated from the device.
@@ -94,50 +361,82 @@ def make_structures(device, buffer: float=4.):
     import tidy3d as td
     import numpy as np
 
+    if clip:
+        margin = max(cladding_extension(device), buffer, pml)
+        device, report = clip_component(device, margin=margin)
+        if (
+            report["polygons"][0] != report["polygons"][1]
+            or report["vertices"][0] != report["vertices"][1]
+        ):
+            logging.info(
+                f"Clipped {device.name} to its simulation region: "
+                f"{report['polygons'][0]} -> {report['polygons'][1]} polygons, "
+                f"{report['vertices'][0]} -> {report['vertices'][1]} vertices."
+            )
+    if min_feature is not None:
+        device, report = heal_component(device, min_feature=min_feature, cells=False)
+        logging.info(
+            f"Healed {device.name}: "
+            f"{report['polygons'][0]} -> {report['polygons'][1]} polygons, "
+            f"{report['vertices'][0]} -> {report['vertices'][1]} vertices, "
+            f"{report['area']:.3g} um^2 changed."
+        )
+
     # TODO find a better way to handle material..
-    
+
+    def slab(s, name):
+        if s.z_span < 0:
+            bounds = (s.z_base + s.z_span, s.z_base)
+        else:
+            bounds = (s.z_base, s.z_base + s.z_span)
+        sidewall_angle = (90 - s.sidewall_angle) * (np.pi / 180)
+        geometry = td.PolySlab(
+            vertices=s.polygon,
+            slab_bounds=bounds,
+            axis=2,
+            sidewall_angle=sidewall_angle,
+        )
+        if s.holes:
+            # hole walls slope the opposite way of the hull's
+            geometry = td.ClipOperation(
+                operation="difference",
+                geometry_a=geometry,
+                geometry_b=td.GeometryGroup(
+                    geometries=[
+                        td.PolySlab(
+                            vertices=h,
+                            slab_bounds=bounds,
+                            axis=2,
+                            sidewall_angle=-sidewall_angle,
+                        )
+                        for h in s.holes
+                    ]
+                ),
+            )
+        return td.Structure(
+            geometry=geometry,
+            medium=s.material["tidy3d"] if isinstance(s.material, dict) else s.material,
+            name=name,
+        )
+
     # TODO fix box tox handling here
     structures = []
     for s in device.structures:
         if type(s) == list:
-            for i in s:
-                if i.z_span < 0:
-                    bounds = (i.z_base + i.z_span, i.z_base)
-                else:
-                    bounds = (i.z_base, i.z_base + i.z_span)
-                structures.append(
-                    td.Structure(
-                        geometry=td.PolySlab(
-                            vertices=i.polygon,
-                            slab_bounds=bounds,
-                            axis=2,
-                            sidewall_angle=(90 - i.sidewall_angle) * (np.pi / 180),
-                        ),
-                        medium=i.material["tidy3d"] if isinstance(i.material, dict) else i.material,
-                        name=i.name,
-                    )
-                )
+            structures.extend(slab(i, i.name) for i in s)
         else:
-            if s.z_span < 0:
-                bounds = (s.z_base + s.z_span, s.z_base)
-            else:
-                bounds = (s.z_base, s.z_base + s.z_span)
-            print(s.material["tidy3d"] if isinstance(s.material, dict) else s.material)
-            structures.append(
-                td.Structure(
-                    geometry=td.PolySlab(
-                        vertices=s.polygon,
-                        slab_bounds=bounds,
-                        axis=2,
-                        sidewall_angle=(90 - s.sidewall_angle) * (np.pi / 180),
-                    ),
-                    medium=s.material["tidy3d"] if isinstance(s.material, dict) else s.material,
-                    name=s.name,
-                )
-            )
+            structures.append(slab(s, s.name))
 
-    # extend ports beyond sim region
+    # extend ports beyond sim region, with the sidewall of the layer each port sits on
     for p in device.ports:
+        sidewall_angle = device.structures[0].sidewall_angle
+        for s in device.structures:
+            if (
+                type(s) == list
+                and np.isclose(s[0].z_base + s[0].z_span / 2, p.center[2])
+                and s[0].material == p.material
+            ):
+                sidewall_angle = s[0].sidewall_angle
         structures.append(
             td.Structure(
                 geometry=td.PolySlab(
@@ -147,8 +446,7 @@ def make_structures(device, buffer: float=4.):
                         p.center[2] + p.height / 2,
                     ),
                     axis=2,
-                    sidewall_angle=(90 - device.structures[0].sidewall_angle)
-                    * (np.pi / 180),
+                    sidewall_angle=(90 - sidewall_angle) * (np.pi / 180),
                 ),
                 medium=p.material["tidy3d"] if isinstance(p.material, dict) else p.material,
                 name=f"port_{p.name}",
@@ -157,6 +455,124 @@ def make_structures(device, buffer: float=4.):
     return structures
 
 
+def _overlap(a, b) -> bool:
+    """Whether two bounding boxes ((xmin, ymin, zmin), (xmax, ymax, zmax)) overlap."""
+    return all(a[0][i] < b[1][i] and b[0][i] < a[1][i] for i in range(3))
+
+
+def _is_box(geometry) -> bool:
+    """Whether a geometry is a vertical rectangular slab filling its bounding box."""
+    if (
+        not isinstance(geometry, td.PolySlab)
+        or geometry.sidewall_angle != 0
+        or geometry.axis != 2
+    ):
+        return False
+    x, y = np.asarray(geometry.vertices).T
+    area = 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+    (xmin, ymin, _), (xmax, ymax, _) = geometry.bounds
+    return np.isclose(area, (xmax - xmin) * (ymax - ymin))
+
+
+def consolidate_structures(
+    structures: list, center, size, medium=None
+) -> tuple[list, td.Medium]:
+    """Shrink a simulation's structure list without changing its permittivity.
+
+    A cladding covering the domain becomes the background medium, and slabs of
+    the same medium, bounds and sidewall are merged into geometry groups.
+
+    Args:
+        structures (list): Simulation structures, in priority order, see
+            make_structures.
+        center (tuple): Simulation domain center.
+        size (tuple): Simulation domain size.
+        medium (td.Medium, optional): Background medium. Defaults to None (vacuum).
+
+    Returns:
+        tuple: (consolidated structures, background medium).
+    """
+    if medium is None:
+        medium = td.Medium()
+    lo = np.asarray(center) - np.asarray(size) / 2
+    hi = np.asarray(center) + np.asarray(size) / 2
+    boxes = [s.geometry.bounds for s in structures]
+
+    # structures not overridden by another medium's structure can become background
+    free = [
+        not any(
+            _overlap(boxes[i], boxes[j]) and structures[j].medium != s.medium
+            for j in range(i)
+        )
+        for i, s in enumerate(structures)
+    ]
+    if structures and structures[0].medium != medium:
+        candidate = structures[0].medium
+        spans = sorted(
+            (boxes[i][0][2], boxes[i][1][2])
+            for i, s in enumerate(structures)
+            if free[i]
+            and s.medium == candidate
+            and _is_box(s.geometry)
+            and np.all(np.asarray(boxes[i][0][:2]) <= lo[:2])
+            and np.all(np.asarray(boxes[i][1][:2]) >= hi[:2])
+        )
+        z = lo[2]
+        for zmin, zmax in spans:
+            if zmin <= z:
+                z = max(z, zmax)
+        if z >= hi[2]:
+            medium = candidate
+    structures = [
+        s for i, s in enumerate(structures) if not (free[i] and s.medium == medium)
+    ]
+
+    groups = []  # [key, members, bounding box]
+    for s in structures:
+        g = s.geometry
+        if isinstance(g, td.ClipOperation):
+            g = g.geometry_a  # polygons with holes group with the slabs of their hull
+        key = None
+        if isinstance(g, td.PolySlab):
+            key = (
+                s.medium,
+                g.axis,
+                tuple(np.round(g.slab_bounds, 6)),
+                round(g.sidewall_angle, 9),
+                g.reference_plane,
+            )
+        box = s.geometry.bounds
+        target = None
+        for group in reversed(groups):
+            if key is not None and group[0] == key:
+                target = group
+                break
+            if _overlap(group[2], box):
+                break
+        if target is None:
+            groups.append([key, [s], box])
+        else:
+            target[1].append(s)
+            target[2] = (
+                np.minimum(target[2][0], box[0]),
+                np.maximum(target[2][1], box[1]),
+            )
+
+    consolidated = []
+    for _, members, _ in groups:
+        if len(members) == 1:
+            consolidated.append(members[0])
+        else:
+            consolidated.append(
+                td.Structure(
+                    geometry=td.GeometryGroup(geometries=[m.geometry for m in members]),
+                    medium=members[0].medium,
+                    name=members[0].name,
+                )
+            )
+    return consolidated, medium
+
+
 def make_port_monitor(port, freqs=2e14, num_modes=1, buffer=-0.1, depth=2, width=3):
     """
     Create mode monitor object for a given port.
@@ -201,7 +617,15 @@ def make_port_monitor(port, freqs=2e14, num_modes=1, buffer=-0.1, depth=2, width
     return monitor
 
 
-def make_field_monitor(device, freqs=2e14, axis="z", z_center=None):
+def make_field_monitor(
+    device,
+    freqs=2e14,
+    axis="z",
+    z_center=None,
+    fields: list[str] | None = None,
+    interval_space: int | tuple[int, int, int] = 1,
+    crop: bool = False,
+):
     """Make a field monitor for an input device
 
     Args:
@@ -209,6 +633,12 @@ def make_field_monitor(device, freqs=2e14, axis="z", z_center=None):
         freqs (float, optional): _description_. Defaults to 2e14.
         z_center (float, optional): Z center for field monitor. Defaults to None.
         axis (string, optional): Field monitor's axis. Valid options are 'x', 'y', 'z' Defaults to 'z'.
+        fields (list, optional): Field components to record, i.e. ['Ey']. Defaults to
+            None (all components).
+        interval_space (int or tuple, optional): Spatial downsampling, record every n-th
+            grid point along each axis. Defaults to 1.
+        crop (bool, optional): Crop the monitor plane to the device bounds instead of
+            spanning the simulation. Defaults to False.
 
     Returns:
         FieldMonitor: Generated Tidy3D field monitor object
@@ -223,24 +653,113 @@ def make_field_monitor(device, freqs=2e14, axis="z", z_center=None):
                 s = s[0]
                 z_center.append(s.z_base + s.z_span / 2)
         z_center = np.average(z_center)
-    if axis == "z":
+    if crop:
+        center = [device.bounds.x_center, device.bounds.y_center, z_center]
+        span = [device.bounds.x_span, device.bounds.y_span, device.bounds.z_span]
+    else:
         center = [0, 0, z_center]
-        size = [td.inf, td.inf, 0]
+        span = [td.inf, td.inf, td.inf]
+    if axis == "z":
+        size = [span[0], span[1], 0]
     elif axis == "y":
-        center = [0, 0, z_center]
-        size = [td.inf, 0, td.inf]
+        size = [span[0], 0, span[2]]
     elif axis == "x":
-        center = [0, 0, z_center]
-        size = [0, td.inf, td.inf]
+        size = [0, span[1], span[2]]
     else:
-        Exception("Invalid axis for field monitor. Valid selections are 'x', 'y', 'z'.")
+        raise ValueError(
+            "Invalid axis for field monitor. Valid selections are 'x', 'y', 'z'."
+        )
+    if isinstance(interval_space, int):
+        interval_space = (interval_space,) * 3
+    monitor_kwargs = {} if fields is None else {"fields": fields}
     return td.FieldMonitor(
         center=center,
         size=size,
         freqs=freqs,
+        interval_space=interval_space,
         name=f"{axis}_field",
+        **monitor_kwargs,
     )
 
+
+def field_monitor_freqs(selection, wavl_min: float, wavl_max: float, freqs):
+    """Select the field monitor frequencies.
+
+    Args:
+        selection (str, int or list): 'all' for every simulation frequency, 'center' for
+            the center wavelength, 'edges' for center plus band edges, an int for a
+            number of evenly spaced wavelengths, or a list of wavelengths.
+        wavl_min (float): Start wavelength.
+        wavl_max (float): End wavelength.
+        freqs (np.ndarray): Simulation frequencies, used for 'all'.
+
+    Returns:
+        np.ndarray: Field monitor frequencies.
+    """
+    lda0 = (wavl_max + wavl_min) / 2
+    if isinstance(selection, str):
+        if selection == "all":
+            return freqs
+        elif selection == "center":
+            wavl = [lda0]
+        elif selection == "edges":
+            wavl = [wavl_min, lda0, wavl_max]
+        else:
+            raise ValueError(
+                "Invalid field monitor frequency selection. "
+                "Valid options are 'all', 'center', 'edges', int, or list."
+            )
+    elif np.ndim(selection) == 0:
+        wavl = np.linspace(wavl_min, wavl_max, int(selection))
+    else:
+        wavl = np.asarray(selection, dtype=float)
+    return td.C_0 / np.asarray(wavl)
+
+
+def monitor_freqs(
+    wavl_min: float,
+    wavl_max: float,
+    wavl_pts: int,
+    sparse_wavl: int | list | None = None,
+):
+    """Frequencies recorded by the port monitors.
+
+    Args:
+        wavl_min (float): Start wavelength (microns).
+        wavl_max (float): End wavelength (microns).
+        wavl_pts (int): Number of wavelength evaluation pts.
+        sparse_wavl (int or list, optional): Sparse sampling, number of wavelength pts
+            or explicit wavelengths. Defaults to None (dense sampling).
+
+    Returns:
+        tuple: (monitor frequencies, sparse sample wavelengths or None).
+    """
+    if sparse_wavl is None:
+        return td.C_0 / np.linspace(wavl_min, wavl_max, wavl_pts), None
+    # sparse sampling: monitors only record the sample wavelengths
+    if np.ndim(sparse_wavl) == 0:
+        wavl_sample = np.linspace(wavl_min, wavl_max, int(sparse_wavl))
+    else:
+        wavl_sample = np.sort(np.asarray(sparse_wavl, dtype=float))
+    return td.C_0 / wavl_sample, wavl_sample
+
+
+def make_port_monitors(
+    device,
+    freqs,
+    width_ports: float = 3.0,
+    depth_ports: float = 2.0,
+    num_modes: int = 1,
+):
+    """Create a mode monitor on each port of a device, see make_port_monitor."""
+    return [
+        make_port_monitor(
+            p, freqs=freqs, depth=depth_ports, width=width_ports, num_modes=num_modes
+        )
+        for p in device.ports
+    ]
+
+
 def make_sim(
     device,
     wavl_min: float = 1.45,
@@ -258,6 +777,15 @@ def make_sim(
     run_time_factor: float = 50,
     z_span: float | None = None,
     field_monitor_axis: str | None = None,
+    sparse_wavl: int | list | None = None,
+    field_monitor_wavl: str | int | list = "all",
+    field_monitor_fields: list[str] | None = None,
+    field_monitor_interval: int | tuple[int, int, int] = 1,
+    field_monitor_crop: bool = False,
+    structures: list | None = None,
+    port_monitors: list | None = None,
+    consolidate: bool = True,
+    clip: bool = False,
     visualize: bool = True,
 ):
     """Generate a single port excitation simulation.
@@ -279,6 +807,26 @@ def make_sim(
         run_time_factor (int, optional): Runtime multiplier factor. Set larger if runtime is insufficient. Defaults to 50.
         z_span (float, optional): Simulation's depth. Defaults to None.
         field_monitor_axis (str, optional): Flag to create a field monitor. Options are 'x', 'y', 'z', or none. Defaults to None.
+        sparse_wavl (int or list, optional): Sparse monitor sampling, number of
+            wavelength pts or explicit wavelengths. S-parameters are reconstructed on
+            the wavl_pts grid from a rational fit. Defaults to None (dense sampling).
+        field_monitor_wavl (str, int or list, optional): Field monitor wavelengths.
+            Options are 'all', 'center', 'edges' (center and band edges), number of pts,
+            or list of wavelengths. Defaults to 'all'.
+        field_monitor_fields (list, optional): Field components recorded by the field
+            monitor. Defaults to None (all components).
+        field_monitor_interval (int or tuple, optional): Field monitor spatial
+            downsampling (interval_space). Defaults to 1.
+        field_monitor_crop (bool, optional): Crop the field monitor to the device
+            bounds. Defaults to False.
+        structures (list, optional): Prebuilt simulation structures of the device, see
+            make_structures. Defaults to None (built from device).
+        port_monitors (list, optional): Prebuilt port mode monitors, see
+            make_port_monitors. Defaults to None (built from device).
+        consolidate (bool, optional): Merge structures and fold the cladding into the
+            background medium, see consolidate_structures. Defaults to True.
+        clip (bool, optional): Clip the device polygons to the simulation region and its
+            PML, see make_structures. Defaults to False.
         visualize (bool, optional): Simulation visualization flag. Defaults to True.
 
     Returns:
@@ -288,40 +836,49 @@ def make_sim(
     # if no input port defined, use first as default
     if in_port is None:
         in_port = [device.ports[0]]
+    if isinstance(in_port, str) and in_port == "all":
+        in_port = device.ports[:]
     if not isinstance(in_port, list):
         in_port = [in_port]
-    if in_port == "all":
-        in_port = device.ports[0]
 
     if not isinstance(mode_index, list):
         mode_index = [mode_index]
 
     lda0 = (wavl_max + wavl_min) / 2
     freq0 = td.C_0 / lda0
-    freqs = td.C_0 / np.linspace(wavl_min, wavl_max, wavl_pts)
-    fwidth = 0.5 * (np.max(freqs) - np.min(freqs))
+    fwidth = 0.5 * td.C_0 * (1 / wavl_min - 1 / wavl_max)
+    freqs, wavl_sample = monitor_freqs(wavl_min, wavl_max, wavl_pts, sparse_wavl)
 
     # define structures from device
-    structures = make_structures(device)
+    if structures is None:
+        pml = pml_thickness(boundary, wavl_max, grid_cells_per_wvl) if clip else 0.0
+        structures = make_structures(device, clip=clip, pml=pml)
 
     # define monitors
-    monitors = []
-    for p in device.ports:
-        monitors.append(
-            make_port_monitor(
-                p,
-                freqs=freqs,
-                depth=depth_ports,
-                width=width_ports,
-                num_modes=num_modes,
-            )
+    if port_monitors is None:
+        port_monitors = make_port_monitors(
+            device,
+            freqs,
+            width_ports=width_ports,
+            depth_ports=depth_ports,
+            num_modes=num_modes,
         )
+    monitors = list(port_monitors)
 
     # make field monitor
     # TODO: handle mode index cases in making field monitor
     if field_monitor_axis is not None:
         monitors.append(
-            make_field_monitor(device, freqs=freqs, axis=field_monitor_axis)
+            make_field_monitor(
+                device,
+                freqs=field_monitor_freqs(
+                    field_monitor_wavl, wavl_min, wavl_max, freqs
+                ),
+                axis=field_monitor_axis,
+                fields=field_monitor_fields,
+                interval_space=field_monitor_interval,
+                crop=field_monitor_crop,
+            )
         )
     # simulation domain size (in microns)
     if z_span == None:
@@ -331,6 +888,14 @@ def make_sim(
     run_time = (
         run_time_factor * max(sim_size) / td.C_0
     )  # 85/fwidth  # sim. time in secs
+    sim_center = (
+        device.bounds.x_center,
+        device.bounds.y_center,
+        device.bounds.z_center,
+    )
+    medium = td.Medium()
+    if consolidate:
+        structures, medium = consolidate_structures(structures, sim_center, sim_size)
 
     """
     define sim jobs: create source on a given port, for each mode index
@@ -368,11 +933,8 @@ def make_sim(
                 monitors=monitors,
                 run_time=run_time,
                 boundary_spec=boundary,
-                center=(
-                    device.bounds.x_center,
-                    device.bounds.y_center,
-                    device.bounds.z_center,
-                ),
+                center=sim_center,
+                medium=medium,
                 symmetry=symmetry,
             )
             sim_jobs.append(sim)
@@ -385,6 +947,7 @@ def make_sim(
         wavl_pts=wavl_pts,
         device=device,
         sim_jobs=sim_jobs,
+        wavl_sample=wavl_sample,
     )
 
     if visualize:
@@ -437,8 +1000,16 @@ def get_material(device: dict):
     return material
 
 
-def load_component_from_tech(ly, tech, z_span=4, z_center=None):
-    # load the structures in the device
+def load_layers(ly, tech):
+    """Extract the device layers' structures of a layout.
+
+    Args:
+        ly (layout): Layout to extract the structures from.
+        tech (dict): Technology stack.
+
+    Returns:
+        list: List of structures of each non-empty device layer.
+    """
     device_wg = []
     for idx, d in enumerate(tech["device"]):
         device_wg.append(
@@ -452,21 +1023,32 @@ def load_component_from_tech(ly, tech, z_span=4, z_center=None):
             )
         )
     # Removing empty lists due to no structures existing in an input layer
-    device_wg = [dev for dev in device_wg if dev]
+    return [dev for dev in device_wg if dev]
 
-    # get z_center based on structures center (minimize symmetry failures)
-    if not z_center:
-        z_center = np.average([d[0].z_base + d[0].z_span / 2 for d in device_wg])
 
-    # load all the ports in the device and (optional) initialize each to have a center
-    ports = load_ports(ly, layer=tech["pinrec"][0]["layer"])
-    # load the device simulation region
-    bounds = load_region(
-        ly, layer=tech["devrec"][0]["layer"], z_center=z_center, z_span=z_span
-    )
+def layers_z_center(device_wg):
+    """z center of the device layers' structures (minimizes symmetry failures)."""
+    return np.average([d[0].z_base + d[0].z_span / 2 for d in device_wg])
+
+
+def make_component(name, tech, device_wg, ports, bounds, initialize_ports=True):
+    """Assemble a component from its layers' structures, ports and bounds.
 
-    # make the superstrate and substrate based on device bounds
-    # this information isn't typically captured in a 2D layer stack
+    The superstrate and substrate are made from the bounds, this information
+    isn't typically captured in a 2D layer stack.
+
+    Args:
+        name (str): Component name.
+        tech (dict): Technology stack.
+        device_wg (list): Device layers' structures, see load_layers.
+        ports (list): Component ports.
+        bounds (region): Simulation region.
+        initialize_ports (bool, optional): Initialize the ports' z center and height.
+            Set to False for ports already initialized on device_wg. Defaults to True.
+
+    Returns:
+        component: Assembled component.
+    """
     device_super = load_structure_from_bounds(
         bounds,
         name="Superstrate",
@@ -481,15 +1063,34 @@ def load_component_from_tech(ly, tech, z_span=4, z_center=None):
         z_span=tech["substrate"][0]["z_span"],
         material=get_material(tech["substrate"][0]),
     )
-
-    # create the device by loading the structures
     return component(
-        name=ly.name,
+        name=name,
         structures=[device_sub, device_super] + device_wg,
         ports=ports,
         bounds=bounds,
+        initialize_ports=initialize_ports,
     )
 
+
+def load_component_from_tech(ly, tech, z_span=4, z_center=None):
+    # load the structures in the device
+    device_wg = load_layers(ly, tech)
+
+    # get z_center based on structures center (minimize symmetry failures)
+    if not z_center:
+        z_center = layers_z_center(device_wg)
+
+    # load all the ports in the device and (optional) initialize each to have a center
+    ports = load_ports(ly, layer=tech["pinrec"][0]["layer"])
+    # load the device simulation region
+    bounds = load_region(
+        ly, layer=tech["devrec"][0]["layer"], z_center=z_center, z_span=z_span
+    )
+
+    # create the device by loading the structures
+    return make_component(ly.name, tech, device_wg, ports, bounds)
+
+
 def build_sim_from_tech(tech: dict, layout, in_port=0, **kwargs):
 
     z_span = kwargs.pop("z_span", 4)  # Default value 4 if z_span is not provided
@@ -515,6 +1116,9 @@ def build_sim_from_tech(tech: dict, layout, in_port=0, **kwargs):
 def from_gdsfactory(c: 'gf.Component', tech: dict, z_span: float = 4.) -> 'component':
     """Convert gdsfactory Component to a component.
 
+    Polygons are fetched for all layers in one call and matched to the tech's
+    device layers by layer number, as are the ports. Other layers are skipped.
+
     Args:
         c (gf.Component): gdsfactory component.
         tech (dict): dictionary technology stack (can be parsed from yaml) 
@@ -523,48 +1127,59 @@ def from_gdsfactory(c: 'gf.Component', tech: dict, z_span: float = 4.) -> 'compo
     Returns:
         component: parsed gdsfactory component.
     """
-    try:
-        import gdsfactory as gf
-    except ImportError:
-        raise ImportError("gdsfactory is not installed. Please install it using 'pip install .[gdsfactory]'")
-
-    device_wg = []
-    ports = []
+    dbu = c.kcl.dbu
 
-    # for each layer in the device
-    for idx, layer in enumerate(c.get_layers()):
-        l = c.extract(layers={layer})       
+    # device layer (layer, datatype) -> (index in tech, tech entry, material)
+    layers = {
+        tuple(d["layer"]): (idx, d, get_material(d))
+        for idx, d in enumerate(tech["device"])
+    }
 
-        for i, s in enumerate(l.get_polygons()):
-            name = f"poly_{idx}_{i}"
-            device_wg.append(
+    # klayout polygons (database units) of all layers, keyed by (layer, datatype)
+    device_wg = []
+    for layer, polygons in c.get_polygons(by="tuple").items():
+        if tuple(layer) not in layers:
+            logging.info(f"Layer {tuple(layer)} of {c.name} is not in the tech.")
+            continue
+        idx, d, material = layers[tuple(layer)]
+        layer_structures = []
+        for i, p in enumerate(polygons):
+            hull, holes = polygon_vertices(p, dbu)
+            layer_structures.append(
                 structure(
-                    name=name,
-                    polygon=s,
-                    z_base=tech["device"][idx]["z_base"],
-                    z_span=tech["device"][idx]["z_span"],
-                    material=get_material(tech["device"][idx]),
-                    sidewall_angle=tech["device"][idx]["sidewall_angle"],
+                    name=f"poly_{idx}_{i}",
+                    polygon=hull,
+                    z_base=d["z_base"],
+                    z_span=d["z_span"],
+                    material=material,
+                    sidewall_angle=d.get("sidewall_angle", 90),
+                    holes=holes,
                 )
             )
+        device_wg.append(layer_structures)
 
-        # get device ports
-        for name, p in c.ports.items():
-            if p.layer == layer:
-                z_pos = (
-                    tech["device"][idx]["z_base"] + tech["device"][idx]["z_span"] / 2
-                )
-                ports.append(
-                    port(
-                        name=name,
-                        center=p.center.tolist() + [z_pos],
-                        width=p.width,
-                        direction=p.orientation,
-                    )
-                )
+    # ports take their z center, height and material from their layer (um accessors)
+    ports = []
+    for p in c.ports:
+        info = c.kcl.get_info(p.layer)
+        if (info.layer, info.datatype) not in layers:
+            logging.warning(f"Port {p.name} of {c.name} is not on a device layer.")
+            continue
+        _, d, material = layers[(info.layer, info.datatype)]
+        x, y = p.dcenter
+        ports.append(
+            port(
+                name=p.name,
+                center=[x, y, d["z_base"] + d["z_span"] / 2],
+                width=p.dwidth,
+                direction=p.orientation,
+            )
+        )
+        ports[-1].height = d["z_span"]
+        ports[-1].material = material
 
     # get z_center based on structures center (minimize symmetry failures)
-    z_center = np.average([d.z_base + d.z_span / 2 for d in device_wg])
+    z_center = layers_z_center(device_wg)
 
     # expand bbox region to account for evanescent field
     def min_dim(square):
@@ -578,31 +1193,13 @@ def from_gdsfactory(c: 'gf.Component', tech: dict, z_span: float = 4.) -> 'compo
             return "xy"
 
     # expand the bbox region by 1.3 um (on each side) on the smallest dimension
-    bbox = dilate_1d(c.bbox.tolist(), extension=0, dim=min_dim(c.bbox.tolist()))
+    box = c.dbbox()
+    box = [[box.left, box.bottom], [box.right, box.top]]
+    bbox = dilate_1d(box, extension=0, dim=min_dim(box))
     bbox_dilated = dilate(bbox, extension=1.9)
     bounds = region(vertices=bbox_dilated, z_center=z_center, z_span=z_span)
 
-    # make the superstrate and substrate based on device bounds
-    # this information isn't typically captured in a 2D layer stack
-    device_super = load_structure_from_bounds(
-        bounds,
-        name="Superstrate",
-        z_base=tech["superstrate"][0]["z_base"],
-        z_span=tech["superstrate"][0]["z_span"],
-        material=get_material(tech["superstrate"][0]),
-    )
-    device_sub = load_structure_from_bounds(
-        bounds,
-        name="Subtrate",
-        z_base=tech["substrate"][0]["z_base"],
-        z_span=tech["substrate"][0]["z_span"],
-        material=get_material(tech["substrate"][0]),
-    )
-
-    # create the device by loading the structures
-    return component(
-        name=c.name,
-        structures=[device_sub, device_super] + [device_wg],
-        ports=ports,
-        bounds=bounds,
+    # the superstrate and substrate are made from the device bounds
+    return make_component(
+        c.name, tech, device_wg, ports, bounds, initialize_ports=False
     )
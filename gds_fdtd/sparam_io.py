@@ -0,0 +1,184 @@
+"""
+gds_fdtd integration toolbox.
+
+S-parameter import/export module.
+@author: Mustafa Hammood, 2024
+"""
+
+import os
+import numpy as np
+from .core import s_parameters
+
+# INTERCONNECT port side from a port's direction
+LUM_PORT_SIDES = {0: "RIGHT", 90: "TOP", 180: "LEFT", 270: "BOTTOM"}
+
+
+def _sorted_freq(sparams: s_parameters):
+    """Frequency axis sorted ascending and the matching index order."""
+    order = np.argsort(sparams.freq)
+    return sparams.freq[order], order
+
+
+def write_touchstone(sparams: s_parameters, path: str, precision: int = 9) -> str:
+    """Write s-parameters to a Touchstone (v1) .sNp file.
+
+    Each (port, mode) pair is exported as its own Touchstone port, port-major,
+    and the mapping is written to the file header as comments.
+
+    Args:
+        sparams (s_parameters): s-parameters to export.
+        path (str): Output file path. The .sNp extension is added if missing.
+        precision (int, optional): Number of significant decimals. Defaults to 9.
+
+    Returns:
+        str: Path of the written file.
+    """
+    freq, order = _sorted_freq(sparams)
+    matrices = sparams.matrix()[order]  # [f, out, in]
+    n = matrices.shape[1]
+    if not path.lower().endswith(f".s{n}p"):
+        path = f"{path}.s{n}p"
+
+    # 2-port files are column-major (S11 S21 S12 S22), larger files row-major
+    if n <= 2:
+        matrices = matrices.transpose(0, 2, 1)
+    values = np.stack([matrices.real, matrices.imag], axis=-1).reshape(len(freq), -1)
+    values = np.hstack([freq[:, None], values])
+
+    # one format string per frequency block: each matrix row starts a new line,
+    # with at most 4 complex pairs per line
+    pair = f"%.{precision}e %.{precision}e"
+    if n <= 2:
+        rows = [" ".join([pair] * n * n)]
+    else:
+        chunks = [" ".join([pair] * min(4, n - i)) for i in range(0, n, 4)]
+        rows = ["\n ".join(chunks)] * n
+    block = f"%.{precision}e " + "\n ".join(rows) + "\n"
+
+    num_modes = sparams.num_modes
+    header = [f"! gds_fdtd s-parameters, {n} ports ((port, mode) pairs)"]
+    for i in range(n):
+        header.append(
+            f"! port {i + 1}: port {sparams.ports[i // num_modes]} mode {i % num_modes}"
+        )
+    header.append("# Hz S RI R 50")
+
+    with open(path, "w") as f:
+        f.write("\n".join(header) + "\n")
+        f.write("".join(block % tuple(v) for v in values))
+    return path
+
+
+def write_interconnect(
+    sparams: s_parameters, path: str, ports: list | None = None, precision: int = 9
+) -> str:
+    """Write s-parameters to a Lumerical INTERCONNECT S-parameter text file.
+
+    Args:
+        sparams (s_parameters): s-parameters to export.
+        path (str): Output file path (i.e. .dat).
+        ports (list, optional): core.port objects, used for port names and sides.
+            Defaults to None (port i named 'port i' on the left side).
+        precision (int, optional): Number of significant decimals. Defaults to 9.
+
+    Returns:
+        str: Path of the written file.
+    """
+    names = {idx: f"port {idx}" for idx in sparams.ports}
+    sides = {idx: "LEFT" for idx in sparams.ports}
+    for p in ports or []:
+        if p.idx in names:
+            names[p.idx] = p.name
+            sides[p.idx] = LUM_PORT_SIDES.get(p.direction, "LEFT")
+
+    freq, order = _sorted_freq(sparams)
+    data = sparams.data[..., order]
+    mag = np.abs(data)
+    phase = np.unwrap(np.angle(data), axis=-1)
+    row = f"%.{precision}e %.{precision}e %.{precision}e\n" * len(freq)
+
+    lines = [f'["{names[idx]}","{sides[idx]}"]\n' for idx in sparams.ports]
+    for label, key in sparams._labels.items():
+        po, pi, mo, mi = key
+        lines.append(
+            f'("{names[sparams.ports[po]]}","mode {mo + 1}",{mo + 1},'
+            f'"{names[sparams.ports[pi]]}",{mi + 1},"transmission")\n'
+        )
+        lines.append(f"({len(freq)},3)\n")
+        lines.append(row % tuple(np.column_stack([freq, mag[key], phase[key]]).ravel()))
+
+    with open(path, "w") as f:
+        f.write("".join(lines))
+    return path
+
+
+def write_hdf5(
+    path: str, sparams, sweep: dict | None = None, compression: str = "gzip"
+) -> str:
+    """Write one or more s-parameters (i.e. a sweep) to a compressed HDF5 file.
+
+    All sweep points must share ports, modes and frequencies. Each sweep point is
+    stored as its own chunk so it can be read back without loading the others.
+
+    Args:
+        path (str): Output file path.
+        sparams (s_parameters or list): s-parameters, or one per sweep point.
+        sweep (dict, optional): Sweep coordinates, name -> values with one value per
+            sweep point. Defaults to None.
+        compression (str, optional): HDF5 compression filter. Defaults to 'gzip'.
+
+    Returns:
+        str: Path of the written file.
+    """
+    import h5py
+
+    if isinstance(sparams, s_parameters):
+        sparams = [sparams]
+    data = np.stack([s.data for s in sparams])
+    with h5py.File(path, "w") as f:
+        f.create_dataset(
+            "s", data=data, chunks=(1,) + data.shape[1:], compression=compression
+        )
+        f.create_dataset("filled", data=np.stack([s._filled for s in sparams]))
+        f.create_dataset("freq", data=sparams[0].freq)
+        f.create_dataset("ports", data=np.array(sparams[0].ports))
+        for name, values in (sweep or {}).items():
+            f.create_dataset(f"sweep/{name}", data=np.asarray(values))
+    return path
+
+
+class sparam_file:
+    """Lazy reader of an s-parameter HDF5 file written by write_hdf5.
+
+    Indexing loads a single sweep point as s_parameters.
+    """
+
+    def __init__(self, path: str):
+        import h5py
+
+        self.path = path
+        with h5py.File(path, "r") as f:
+            self.freq = f["freq"][()]
+            self.ports = [int(p) for p in f["ports"][()]]
+            self.shape = f["s"].shape
+            self.sweep = {name: d[()] for name, d in f.get("sweep", {}).items()}
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx: int) -> s_parameters:
+        import h5py
+
+        with h5py.File(self.path, "r") as f:
+            data = f["s"][idx]
+            filled = f["filled"][idx]
+        return s_parameters.from_array(
+            data, ports=self.ports, freq=self.freq, filled=filled
+        )
+
+
+def read_hdf5(path: str) -> sparam_file:
+    """Open an s-parameter HDF5 file for lazy reading."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return sparam_file(path)
@@ -0,0 +1,270 @@
+"""
+gds_fdtd integration toolbox.
+
+Parameter sweep module.
+@author: Mustafa Hammood, 2024
+"""
+
+import inspect
+import itertools
+import logging
+import os
+import numpy as np
+import xarray as xr
+from .core import layout, component
+
+
+class sweep:
+    """Grid sweep of make_sim parameters over a component.
+
+    All variants are built up front, simulations that are identical between
+    sweep points are run once, and the unique jobs are run concurrently. The
+    s-parameters of all points are collected into one labeled array.
+
+    Example:
+        params = {"width_ports": [1, 2, 3], "grid_cells_per_wvl": [10, 20]}
+        s = sweep(layout, tech, params, wavl_pts=51)
+        data = s.run()
+        data.sel(width_ports=2, port_out=2, port_in=1, mode_out=0, mode_in=0)
+    """
+
+    def __init__(self, source, tech: dict | None, params: dict, **fixed):
+        """
+        Args:
+            source (layout, component or callable): Component source. A layout is built
+                with pipeline.simulation_pipeline, and a callable is called with the
+                swept and fixed parameters in its signature.
+            tech (dict): Technology stack, used when source is a layout.
+            params (dict): Swept parameters, name -> list of values. The grid is their
+                outer product.
+            fixed (dict): Parameters shared by all sweep points.
+        """
+        self.source = source
+        self.tech = tech
+        self.params = {name: list(values) for name, values in params.items()}
+        self.fixed = fixed
+        self.simulations = None
+        self.data = None
+        self.pipeline = None  # build pipeline of layout sources, reused across builds
+        self.components = {}  # components of other sources, reused across builds
+
+    @property
+    def points(self) -> list[dict]:
+        """Parameters of each sweep point, in grid order."""
+        names = list(self.params)
+        return [
+            dict(zip(names, values))
+            for values in itertools.product(*self.params.values())
+        ]
+
+    def _component_args(self) -> set:
+        """Names of the parameters that change the component of a callable source."""
+        if callable(self.source) and not isinstance(self.source, component):
+            return set(inspect.signature(self.source).parameters)
+        return set()
+
+    def build(self) -> list:
+        """Build the simulation of each sweep point.
+
+        Only the build stages or components affected by the swept parameters
+        are recomputed.
+
+        Returns:
+            list: core.Simulation of each sweep point.
+        """
+        from .simprocessor import make_sim
+        from .pipeline import simulation_pipeline
+
+        if isinstance(self.source, layout):
+            if self.pipeline is None:
+                self.pipeline = simulation_pipeline()
+            self.simulations = [
+                self.pipeline.get(
+                    "simulation",
+                    layout=self.source,
+                    tech=self.tech,
+                    **self.fixed,
+                    **point,
+                )
+                for point in self.points
+            ]
+            return self.simulations
+
+        component_args = self._component_args()
+        make_sim_args = set(inspect.signature(make_sim).parameters) - {"device"}
+        components = self.components
+        self.simulations = []
+        for point in self.points:
+            kwargs = {**self.fixed, **point}
+            unknown = set(kwargs) - make_sim_args - component_args
+            if unknown:
+                raise ValueError(f"Unknown sweep parameters {sorted(unknown)}.")
+
+            key = tuple(
+                sorted((k, repr(v)) for k, v in kwargs.items() if k in component_args)
+            )
+            if key not in components:
+                if isinstance(self.source, component):
+                    components[key] = self.source
+                else:
+                    components[key] = self.source(
+                        **{k: v for k, v in kwargs.items() if k in component_args}
+                    )
+            device = components[key]
+
+            sim_kwargs = {k: v for k, v in kwargs.items() if k in make_sim_args}
+            in_port = sim_kwargs.get("in_port")
+            if isinstance(in_port, int):
+                sim_kwargs["in_port"] = device.ports[in_port]
+            sim_kwargs.setdefault("visualize", False)
+            self.simulations.append(make_sim(device=device, **sim_kwargs))
+        return self.simulations
+
+    def run(
+        self,
+        backend=None,
+        out_dir: str | None = None,
+        max_workers: int = 4,
+        poll_interval: float = 5.0,
+        retries: int = 0,
+        cache=None,
+        fit_tol: float = 1e-3,
+    ) -> xr.DataArray:
+        """Run the sweep and collect its s-parameters.
+
+        Args:
+            backend (backends.backend, optional): Backend to run the jobs on. Defaults
+                to None (tidy3d cloud).
+            out_dir (str, optional): Directory to download the results into. Defaults to
+                '<component name>_sweep'.
+            max_workers (int, optional): Maximum number of concurrently running jobs.
+                Defaults to 4.
+            poll_interval (float, optional): Time between job status checks, in seconds.
+                Defaults to 5.
+            retries (int, optional): Number of resubmissions of a failed job. Defaults
+                to 0.
+            cache (result_cache or bool, optional): Result cache, see
+                Simulation.execute. Defaults to None.
+            fit_tol (float, optional): Rational fit rms tolerance, used for sparse
+                sampling. Defaults to 1e-3.
+
+        Returns:
+            xr.DataArray: s-parameters, see collect.
+        """
+        from .backends import tidy3d_backend
+        from .cache import result_cache, simulation_hash
+        from .execution import run_jobs
+
+        if self.simulations is None:
+            self.build()
+        if backend is None:
+            backend = tidy3d_backend()
+        if cache is True:
+            cache = result_cache()
+        if out_dir is None:
+            out_dir = f"{self.simulations[0].device.name}_sweep"
+
+        # identical simulations across sweep points are run once
+        users = {}  # simulation hash -> [(sweep point, job index)]
+        unique = {}
+        for i, simulation in enumerate(self.simulations):
+            simulation.results = [None] * len(simulation.sim_jobs)
+            for j, sim_job in enumerate(simulation.sim_jobs):
+                key = simulation_hash(sim_job["sim"])
+                users.setdefault(key, []).append((i, j))
+                unique.setdefault(
+                    key, {**sim_job, "name": f"{sim_job['name']}_{key[:10]}"}
+                )
+        num_jobs = sum(len(s.sim_jobs) for s in self.simulations)
+        logging.info(
+            f"Sweep of {len(self.simulations)} points, "
+            f"{len(unique)} unique of {num_jobs} jobs."
+        )
+
+        job_entries = [[None] * len(s.sim_jobs) for s in self.simulations]
+
+        def on_result(key, data):
+            for i, j in users[key]:
+                self.simulations[i].results[j] = data
+                job_entries[i][j] = self.simulations[i].extract_sparams(j, data)
+
+        pending = []
+        for key, sim_job in unique.items():
+            data = cache.get(sim_job["sim"]) if cache is not None else None
+            if data is None:
+                pending.append(key)
+            else:
+                on_result(key, data)
+
+        def on_job_result(idx, data):
+            key = pending[idx]
+            if cache is not None:
+                cache.put(
+                    unique[key]["sim"],
+                    os.path.join(out_dir, f"{unique[key]['name']}.hdf5"),
+                )
+            on_result(key, data)
+
+        if pending:
+            run_jobs(
+                [unique[key] for key in pending],
+                backend=backend,
+                out_dir=out_dir,
+                on_result=on_job_result,
+                max_workers=max_workers,
+                poll_interval=poll_interval,
+                retries=retries,
+            )
+        for simulation, entries in zip(self.simulations, job_entries):
+            simulation.assemble_sparams(entries, fit_tol=fit_tol)
+        return self.collect()
+
+    def collect(self) -> xr.DataArray:
+        """Collect the s-parameters of all sweep points into one array.
+
+        Dimensions are the swept parameters, then port_out, port_in, mode_out,
+        mode_in and f (f_index if the frequencies differ), padded with NaN.
+
+        Returns:
+            xr.DataArray: Complex s-parameters.
+        """
+        sparams = [s.s_parameters for s in self.simulations]
+        ports = sparams[0].ports
+        num_modes = max(s.num_modes for s in sparams)
+        num_freqs = max(len(s.freq) for s in sparams)
+        grid = tuple(len(v) for v in self.params.values())
+
+        data = np.full(
+            (len(sparams), len(ports), len(ports), num_modes, num_modes, num_freqs),
+            np.nan,
+            dtype=complex,
+        )
+        freq = np.full((len(sparams), num_freqs), np.nan)
+        for i, s in enumerate(sparams):
+            order = [s.port_index(idx) for idx in ports]
+            values = s.data[np.ix_(order, order)]
+            values = np.where(
+                s._filled[np.ix_(order, order)][..., None], values, np.nan
+            )
+            data[i, :, :, : s.num_modes, : s.num_modes, : len(s.freq)] = values
+            freq[i, : len(s.freq)] = s.freq
+
+        dims = list(self.params) + ["port_out", "port_in", "mode_out", "mode_in"]
+        coords = {name: values for name, values in self.params.items()}
+        coords.update(
+            port_out=ports,
+            port_in=ports,
+            mode_out=range(num_modes),
+            mode_in=range(num_modes),
+        )
+        freq = freq.reshape(grid + (num_freqs,))
+        if np.allclose(freq, freq.reshape(-1, num_freqs)[0], equal_nan=True):
+            dims.append("f")
+            coords["f"] = freq.reshape(-1, num_freqs)[0]
+        else:
+            dims.append("f_index")
+            coords["f"] = (list(self.params) + ["f_index"], freq)
+        self.data = xr.DataArray(
+            data.reshape(grid + data.shape[1:]), dims=dims, coords=coords
+        )
+        return self.data
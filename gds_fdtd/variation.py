@@ -0,0 +1,291 @@
+"""
+gds_fdtd integration toolbox.
+
+Fabrication variation module.
+@author: Mustafa Hammood, 2024
+"""
+
+import copy
+import itertools
+import warnings
+import numpy as np
+import xarray as xr
+from .core import component, structure
+from .lyprocessor import polygons_to_region, region_to_polygons
+
+# perturbation -> rounding resolution of generated variants (um, um, degrees)
+RESOLUTION = {"bias": 1e-3, "dz": 1e-4, "sidewall": 1e-2}
+
+
+def perturb_component(
+    device: component, dz: float = 0.0, sidewall: float = 0.0
+) -> component:
+    """Perturb the thickness and sidewall angle of a component's device layers.
+
+    Ports on a perturbed layer follow its thickness and center.
+
+    Args:
+        device (component): Component to perturb.
+        dz (float, optional): Thickness (z_span) change of each device layer (um).
+            Defaults to 0.
+        sidewall (float, optional): Sidewall angle change of each device layer
+            (degrees). Defaults to 0.
+
+    Returns:
+        component: Perturbed copy of the component.
+    """
+    structures, ports = [], [copy.copy(p) for p in device.ports]
+    for s in device.structures:
+        if not isinstance(s, list):
+            structures.append(s)
+            continue
+        layer = [copy.copy(i) for i in s]
+        for i in layer:
+            i.z_span = i.z_span + np.sign(i.z_span) * dz
+            i.sidewall_angle = i.sidewall_angle + sidewall
+        z_center = s[0].z_base + s[0].z_span / 2
+        for p in ports:
+            if np.isclose(z_center, p.center[2]) and s[0].material == p.material:
+                p.center = list(p.center[:2]) + [layer[0].z_base + layer[0].z_span / 2]
+                p.height = abs(layer[0].z_span)
+        structures.append(layer)
+    return component(
+        name=device.name,
+        structures=structures,
+        ports=ports,
+        bounds=device.bounds,
+        initialize_ports=False,
+    )
+
+
+def bias_component(device: component, bias: float, dbu: float = 1e-3) -> component:
+    """Grow or shrink the device polygons of a component laterally.
+
+    Each layer's merged polygons are sized with klayout, every edge moves by
+    bias / 2 so that waveguide widths change by bias. Port widths change by
+    bias as well.
+
+    Args:
+        device (component): Component to bias.
+        bias (float): Width change (um), negative to shrink.
+        dbu (float, optional): Database unit the polygons are sized on (um). Defaults to
+            1 nm.
+
+    Returns:
+        component: Biased copy of the component.
+    """
+    d = int(round(bias / 2 / dbu))
+    structures = []
+    for s in device.structures:
+        if not isinstance(s, list) or d == 0:
+            structures.append(s)
+            continue
+        r = polygons_to_region(
+            [i.polygon for i in s], dbu=dbu, holes=[i.holes for i in s]
+        )
+        structures.append(
+            [
+                structure(
+                    name=f"{s[0].name}_{idx}",
+                    polygon=hull,
+                    z_base=s[0].z_base,
+                    z_span=s[0].z_span,
+                    material=s[0].material,
+                    sidewall_angle=s[0].sidewall_angle,
+                    holes=holes,
+                )
+                for idx, (hull, holes) in enumerate(
+                    region_to_polygons(r.merged().sized(d), dbu=dbu)
+                )
+            ]
+        )
+    ports = []
+    for p in device.ports:
+        p = copy.copy(p)
+        p.center = list(p.center)
+        p.width = p.width + 2 * d * dbu
+        ports.append(p)
+    return component(
+        name=device.name,
+        structures=structures,
+        ports=ports,
+        bounds=device.bounds,
+        initialize_ports=False,
+    )
+
+
+def variant_component(
+    layout,
+    tech: dict,
+    variant: dict,
+    z_span: float = 4,
+    z_center: float | None = None,
+    build=None,
+) -> component:
+    """Build the component of a process variant.
+
+    The nominal component comes from a simulation_pipeline, so the layout,
+    layers, ports and region are only computed once for all variants. The
+    perturbations are then applied to a copy of it.
+
+    Args:
+        layout (layout): Layout to load.
+        tech (dict): Nominal technology stack.
+        variant (dict): Perturbations, 'bias' (um), 'dz' (um) and 'sidewall' (degrees).
+            Missing entries are 0.
+        z_span (float, optional): Simulation z span (um). Defaults to 4.
+        z_center (float, optional): Simulation z center (um). Defaults to None (device
+            layers' center).
+        build (pipeline, optional): Pipeline shared between variants. Defaults to None
+            (a new simulation_pipeline).
+
+    Returns:
+        component: Perturbed component.
+    """
+    from .pipeline import simulation_pipeline
+
+    if build is None:
+        build = simulation_pipeline()
+    nominal = build.get(
+        "component", layout=layout, tech=tech, z_span=z_span, z_center=z_center
+    )
+    dz, sidewall = variant.get("dz", 0.0), variant.get("sidewall", 0.0)
+    device = perturb_component(nominal, dz=dz, sidewall=sidewall)
+    return bias_component(device, variant.get("bias", 0.0))
+
+
+def _unique(variants: list[dict]) -> list[dict]:
+    """Round variants to RESOLUTION and drop duplicates, keeping the first."""
+    unique = {}
+    for v in variants:
+        v = {
+            k: float(np.round(x / RESOLUTION[k]) * RESOLUTION[k]) for k, x in v.items()
+        }
+        unique.setdefault(tuple(sorted(v.items())), v)
+    return list(unique.values())
+
+
+def corners(include_nominal: bool = True, **ranges) -> list[dict]:
+    """Process corners: every combination of the extremes of each perturbation.
+
+    Args:
+        include_nominal (bool, optional): Also include the unperturbed variant first.
+            Defaults to True.
+        ranges (dict): Perturbation name ('bias', 'dz' or 'sidewall') -> (low, high).
+
+    Returns:
+        list: Variants, as dicts of perturbations.
+    """
+    names = list(ranges)
+    variants = [
+        dict(zip(names, values)) for values in itertools.product(*ranges.values())
+    ]
+    if include_nominal:
+        variants.insert(0, {name: 0.0 for name in names})
+    return _unique(variants)
+
+
+def monte_carlo(n: int, seed: int | None = None, **sigmas) -> list[dict]:
+    """Normally distributed process variants.
+
+    Args:
+        n (int): Number of samples. Fewer variants are returned if samples round to the
+            same variant.
+        seed (int, optional): Random seed. Defaults to None.
+        sigmas (dict): Perturbation name ('bias', 'dz' or 'sidewall') -> standard
+            deviation.
+
+    Returns:
+        list: Variants, as dicts of perturbations.
+    """
+    names = list(sigmas)
+    samples = np.random.default_rng(seed).normal(size=(n, len(names))) * np.array(
+        list(sigmas.values())
+    )
+    return _unique([dict(zip(names, sample)) for sample in samples])
+
+
+def run_variants(
+    layout,
+    tech: dict,
+    variants: list[dict],
+    backend=None,
+    max_workers: int = 4,
+    poll_interval: float = 5.0,
+    cache=None,
+    **fixed,
+) -> xr.DataArray:
+    """Simulate process variants through the sweep machinery.
+
+    Args:
+        layout (layout): Layout of the nominal device.
+        tech (dict): Nominal technology stack.
+        variants (list): Variants, see corners and monte_carlo.
+        backend (backends.backend, optional): Backend to run the jobs on. Defaults to
+            None (tidy3d cloud).
+        max_workers (int, optional): Maximum number of concurrently running jobs.
+            Defaults to 4.
+        poll_interval (float, optional): Time between job status checks, in seconds.
+            Defaults to 5.
+        cache (result_cache or bool, optional): Result cache, see Simulation.execute.
+            Defaults to None.
+        fixed (dict): make_sim parameters shared by all variants, and z_span / z_center.
+
+    Returns:
+        xr.DataArray: s-parameters with a leading 'variant' dimension, and each
+        perturbation as a coordinate along it.
+    """
+    from .sweep import sweep
+
+    from .pipeline import simulation_pipeline
+
+    variants = _unique(variants)
+    z_args = {k: fixed[k] for k in ("z_span", "z_center") if k in fixed}
+    build = simulation_pipeline()
+
+    def source(variant: int):
+        return variant_component(layout, tech, variants[variant], build=build, **z_args)
+
+    fixed = {k: v for k, v in fixed.items() if k != "z_center"}
+    s = sweep(source, tech, {"variant": list(range(len(variants)))}, **fixed)
+    data = s.run(
+        backend=backend,
+        max_workers=max_workers,
+        poll_interval=poll_interval,
+        cache=cache,
+    )
+    names = sorted({k for v in variants for k in v})
+    return data.assign_coords(
+        {k: ("variant", [v.get(k, 0.0) for v in variants]) for k in names}
+    )
+
+
+def statistics(
+    data: xr.DataArray, dim: str = "variant", percentiles: tuple = (5, 50, 95)
+) -> xr.Dataset:
+    """Statistics of |S|^2 across variants.
+
+    Args:
+        data (xr.DataArray): s-parameters, see run_variants.
+        dim (str, optional): Dimension to reduce. Defaults to 'variant'.
+        percentiles (tuple, optional): Percentiles to compute. Defaults to (5, 50, 95).
+
+    Returns:
+        xr.Dataset: 'mean', 'std', 'min', 'max' and 'percentile' of |S|^2.
+    """
+    power = np.abs(data) ** 2
+    with warnings.catch_warnings():
+        # entries that were not simulated are NaN in every variant
+        warnings.simplefilter("ignore", RuntimeWarning)
+        percentile = power.quantile(np.array(percentiles) / 100, dim=dim)
+    return xr.Dataset(
+        {
+            "mean": power.mean(dim),
+            "std": power.std(dim),
+            "min": power.min(dim),
+            "max": power.max(dim),
+            "percentile": percentile.rename(quantile="percentile").assign_coords(
+                percentile=list(percentiles)
+            ),
+        }
+    )
@@ -4,9 +4,27 @@
 
 import pytest
 import klayout.db as pya
+import copy
 import os
 import numpy as np
-from gds_fdtd import core, lyprocessor, simprocessor
+from gds_fdtd import (
+    core,
+    lyprocessor,
+    simprocessor,
+    rational,
+    cache,
+    backends,
+    execution,
+    ledger,
+    results,
+    sparam_io,
+    circuit,
+    periodic,
+    sweep,
+    convergence,
+    pipeline,
+    variation,
+)
 import tidy3d as td
 
 
@@ -534,5 +552,1290 @@ def test_build_sim_from_tech():
     )
 
 
+def test_rational_fit_reconstruction():
+    wavl_dense = np.linspace(1.5, 1.6, 201)
+    wavl_sparse = np.linspace(1.5, 1.6, 21)
+
+    # tidy3d convention: delays advance the phase, resonances have Im(pole) < 0
+    def response(freq):
+        notch = 1 - 0.9 / (1 - 1j * (freq - 1.93e14) / 2e12)
+        return 0.8 * np.exp(2j * np.pi * freq * 1e-13) * notch
+
+    model = rational.fit_response(td.C_0 / wavl_sparse, response(td.C_0 / wavl_sparse))
+    assert model.rms_error < 1e-3
+    assert (
+        np.max(np.abs(model(td.C_0 / wavl_dense) - response(td.C_0 / wavl_dense)))
+        < 1e-2
+    )
+
+    refined = rational.refine_freqs(model, td.C_0 / wavl_sparse, n_pts=5)
+    assert len(refined) == len(wavl_sparse) + 5
+
+
+def test_estimate_delay(caplog):
+    rng = np.random.default_rng(0)
+    freq = td.C_0 / np.linspace(1.5, 1.6, 11)
+    delay = -2 * np.pi * 2e-13
+
+    # dips and noise make the unwrapped phase jump, low amplitude samples weigh less
+    amplitude = np.abs(1 + 0.95 * np.exp(1j * np.linspace(0, 6, 11)))
+    noise = 0.1 * (rng.normal(size=11) + 1j * rng.normal(size=11))
+    s = amplitude * np.exp(1j * delay * freq) + noise
+    assert np.isclose(rational.estimate_delay(freq, s), delay, rtol=1e-2)
+    assert not caplog.records
+
+    # the phase turns by almost pi between samples
+    assert np.isclose(
+        rational.estimate_delay(freq, np.exp(1.7j * delay * freq)), 1.7 * delay
+    )
+    assert "aliased" in caplog.text
+
+
+def test_s_parameters_reconstruct():
+    freq = td.C_0 / np.linspace(1.5, 1.6, 15)
+    sparams = core.s_parameters()
+    sparams.add_param(
+        core.sparam(
+            idx_in=1,
+            idx_out=2,
+            mode_in=0,
+            mode_out=0,
+            freq=freq,
+            s=0.9 * np.exp(-1j * freq * 1e-13),
+        )
+    )
+    freq_dense = td.C_0 / np.linspace(1.5, 1.6, 101)
+    dense = sparams.reconstruct(freq_dense)
+    assert np.size(dense.S["S21_idx00"].s) == 101
+    assert np.allclose(
+        dense.S["S21_idx00"].s, 0.9 * np.exp(-1j * freq_dense * 1e-13), atol=1e-3
+    )
+
+
+def test_s_parameters_tensor():
+    freq = td.C_0 / np.linspace(1.5, 1.6, 5)
+    sparams = core.s_parameters()
+    for idx_in in [1, 2]:
+        for idx_out in [1, 2]:
+            for mode_in in [0, 1]:
+                for mode_out in [0, 1]:
+                    sparams.add_param(
+                        core.sparam(
+                            idx_in=idx_in,
+                            idx_out=idx_out,
+                            mode_in=mode_in,
+                            mode_out=mode_out,
+                            freq=freq,
+                            s=np.full(
+                                5,
+                                10 * idx_out + idx_in + 0.1 * mode_out + 0.01 * mode_in,
+                            ),
+                        )
+                    )
+    assert sparams.data.shape == (2, 2, 2, 2, 5)
+    assert len(sparams.S) == 16
+    assert np.allclose(sparams.S["S21_idx10"].s, 21.1)
+
+    # entries are views into the tensor
+    sparams.S["S21_idx10"].s[:] = 0
+    assert np.allclose(
+        sparams.data[sparams.port_index(2), sparams.port_index(1), 1, 0], 0
+    )
+
+    assert len(sparams.entries_in_mode(mode_in=0, mode_out=1)) == 4
+    assert [s.label for s in sparams.entries_in_ports(idx_in=1, idx_out=2)] == [
+        "S21_idx00",
+        "S21_idx01",
+        "S21_idx10",
+        "S21_idx11",
+    ]
+    matrix = sparams.matrix(freq_index=0)
+    assert matrix.shape == (4, 4)
+    # (port 1, mode 1) <- (port 2, mode 0)
+    assert matrix[1, 2] == sparams.S["S12_idx10"].s[0]
+    assert sparams.db().shape == sparams.phase().shape == (2, 2, 2, 2, 5)
+
+    with pytest.raises(ValueError):
+        sparams.add_param(
+            core.sparam(
+                idx_in=1, idx_out=1, mode_in=0, mode_out=0, freq=freq[:3], s=np.ones(3)
+            )
+        )
+
+
+def test_sparam_export(tmp_path):
+    freq = td.C_0 / np.linspace(1.5e-6, 1.6e-6, 6)
+    data = np.random.default_rng(0).normal(size=(3, 3, 2, 2, 6)) * (1 + 1j)
+    sparams = core.s_parameters.from_array(data, ports=[1, 2, 3], freq=freq)
+
+    # 3 ports x 2 modes -> 6 touchstone ports, 2 lines per matrix row
+    path = sparams.to_touchstone(str(tmp_path / "device"))
+    assert path.endswith(".s6p")
+    with open(path) as f:
+        lines = [line for line in f if not line.startswith(("!", "#"))]
+    assert len(lines) == 6 * 6 * 2
+    first = np.array(lines[0].split(), dtype=float)
+    assert np.isclose(first[0], freq.min())
+    S = sparams.matrix(freq_index=int(np.argmin(freq)))
+    assert np.allclose(first[1:3], [S[0, 0].real, S[0, 0].imag])
+
+    path = sparams.to_interconnect(str(tmp_path / "device.dat"))
+    with open(path) as f:
+        text = f.read()
+    assert text.count('"transmission")') == 36
+    assert '("port 2","mode 2",2,"port 1",1,"transmission")' in text
+
+    # sweep of two points, read back one at a time
+    zeros = core.s_parameters.from_array(
+        np.zeros_like(data), ports=[1, 2, 3], freq=freq
+    )
+    path = sparam_io.write_hdf5(
+        str(tmp_path / "sweep.h5"), [sparams, zeros], sweep={"width": [0.5, 0.6]}
+    )
+    sweep = sparam_io.read_hdf5(path)
+    assert len(sweep) == 2
+    assert np.allclose(sweep.sweep["width"], [0.5, 0.6])
+    assert np.allclose(sweep[0].data, data)
+    assert np.allclose(sweep[1].data, 0)
+
+
+def _two_port(freq, r, t, num_modes=1):
+    """Reciprocal, symmetric 2-port with reflection r and transmission t."""
+    data = np.zeros((2, 2, num_modes, num_modes, len(freq)), dtype=complex)
+    for m in range(num_modes):
+        data[0, 0, m, m] = data[1, 1, m, m] = r
+        data[0, 1, m, m] = data[1, 0, m, m] = t
+    return core.s_parameters.from_array(data, ports=[1, 2], freq=freq)
+
+
+def test_s_parameters_diagnostics():
+    freq = td.C_0 / np.linspace(1.5e-6, 1.6e-6, 4)
+    sparams = _two_port(freq, 0.6, 0.8j, num_modes=2)
+    check = sparams.check()
+    assert check["passive"] and check["reciprocal"]
+    assert np.allclose(sparams.singular_values(), 1)
+    assert np.allclose(sparams.energy_balance(), 1)
+
+    # gain in one entry: non-passive and non-reciprocal
+    data = sparams.data.copy()
+    data[1, 0, 0, 0] *= 1.2
+    gain = core.s_parameters.from_array(data, ports=[1, 2], freq=freq)
+    check = gain.check()
+    assert not check["passive"] and not check["reciprocal"]
+    assert np.all(gain.energy_balance()[:, 0] > 1)
+
+    passive = gain.enforce_passivity(reciprocal=True)
+    assert np.all(passive.singular_values() <= 1 + 1e-9)
+    assert np.allclose(passive.reciprocity_error(), 0)
+
+    # entries missing in one direction are not compared
+    partial = core.s_parameters(entries=gain.entries_in_ports(idx_in=1, idx_out=2))
+    assert np.allclose(partial.reciprocity_error(), 0)
+
+
+def test_circuit_cascade():
+    freq = td.C_0 / np.linspace(1.5e-6, 1.6e-6, 11)
+    t = np.exp(-2j * np.pi * freq * 1e-13)
+    mirror = _two_port(freq, 0.6, 0.8j)
+    wg = _two_port(freq, 0, t, num_modes=2)
+
+    # two waveguides in series multiply their transmissions, in each mode
+    chain = circuit.circuit({"a": wg, "b": wg}, [(("a", 2), ("b", 1))])
+    sparams = chain.s_parameters()
+    assert sparams.ports == [1, 2] and sparams.num_modes == 2
+    assert np.allclose(sparams.S["S21_idx11"].s, t**2)
+    assert np.allclose(sparams.S["S11_idx00"].s, 0)
+
+    # fabry-perot cavity between two mirrors
+    cavity = circuit.circuit(
+        {"m1": mirror, "wg": _two_port(freq, 0, t), "m2": mirror},
+        [(("m1", 2), ("wg", 1)), (("wg", 2), ("m2", 1))],
+    )
+    s21 = cavity.s_parameters().S["S21_idx00"].s
+    assert np.allclose(s21, 0.8j * t * 0.8j / (1 - 0.36 * t**2))
+
+    with pytest.raises(ValueError):
+        circuit.circuit({"a": wg, "b": wg}, [(("a", 2), ("b", 3))])
+
+
+def test_circuit_resample():
+    freq = np.linspace(190e12, 200e12, 21)
+    t = np.exp(-2j * np.pi * freq * 1e-14)
+    coarse = _two_port(freq[::4], 0, t[::4])
+    sparams = circuit.resample(coarse, freq[2:-2])
+    assert sparams.data.shape[-1] == 17
+    assert np.allclose(sparams.S["S21_idx00"].s, t[2:-2], atol=5e-2)
+
+    chain = circuit.circuit(
+        {"a": coarse, "b": _two_port(freq, 0, t)}, [(("a", 2), ("b", 1))]
+    )
+    assert np.allclose(chain.s_parameters(freq=freq).S["S21_idx00"].s, t**2, atol=5e-2)
+
+
+def test_cascade_periodic():
+    freq = td.C_0 / np.linspace(1.5e-6, 1.6e-6, 11)
+    t = np.exp(-2j * np.pi * freq * 1e-14)
+    cell = circuit.circuit(
+        {"m": _two_port(freq, 0.3, 0.954j), "wg": _two_port(freq, 0, t)},
+        [(("m", 2), ("wg", 1))],
+    ).s_parameters()
+    lead = _two_port(freq, 0.1, 0.995)
+
+    # 13 cells by repeated squaring match 13 cells connected in a netlist
+    instances = {"in": lead, "out": lead, **{f"c{i}": cell for i in range(13)}}
+    names = ["in"] + [f"c{i}" for i in range(13)] + ["out"]
+    chain = circuit.circuit(
+        instances, [((a, 2), (b, 1)) for a, b in zip(names[:-1], names[1:])]
+    )
+    expected = chain.s_parameters()
+    sparams = periodic.cascade_periodic(cell, 13, lead_in=lead, lead_out=lead)
+    assert np.allclose(sparams.data, expected.data)
+
+    # long gratings stay finite in the stop band
+    assert np.isfinite(periodic.cascade_periodic(cell, 100000).data).all()
+
+
+def test_detect_periodic():
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    layers = [d["layer"] for d in technology["device"]]
+
+    # flat grating, periods alternate between 158 and 159 database units
+    file_gds = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "examples", "devices.gds"
+    )
+    layout = lyprocessor.load_layout(file_gds, top_cell="bragg_te1550")
+    section = periodic.detect_periodic(layout, layers)
+    assert (section.axis, section.source, section.count) == ("x", "geometry", 300)
+    assert np.isclose(section.pitch, 0.317) and np.isclose(section.stop, 95.1)
+
+    device = simprocessor.load_component_from_tech(layout, technology)
+    segments = periodic.segment_periodic(device, section, min_length=1.0)
+    assert segments["lead_in"] is None and segments["lead_out"] is None
+    assert segments["num_cells"] == 75
+    cell = segments["cell"]
+    # 4 periods padded with 1 um of lead waveguide on both sides
+    assert np.isclose(cell.bounds.x_span, 4 * 0.317 + 2)
+    assert [(p.name, p.direction, p.height) for p in cell.ports] == [
+        ("opt1", 180, 0.22),
+        ("opt2", 0, 0.22),
+    ]
+    assert np.allclose([p.x for p in cell.ports], [-0.5, 4 * 0.317 + 0.5])
+
+    # instance array
+    ly = pya.Layout()
+    top, tooth = ly.create_cell("grating"), ly.create_cell("tooth")
+    tooth.shapes(ly.layer(1, 0)).insert(pya.Box(0, -300, 150, 300))
+    top.insert(
+        pya.CellInstArray(
+            tooth.cell_index(),
+            pya.Trans(pya.Point(2000, 0)),
+            pya.Vector(300, 0),
+            pya.Vector(0, 0),
+            50,
+            1,
+        )
+    )
+    section = periodic.detect_periodic(core.layout("grating", ly, top), layers)
+    assert (section.axis, section.source, section.count) == ("x", "hierarchy", 50)
+    assert np.isclose(section.pitch, 0.3) and np.isclose(section.start, 2.0)
+
+    # instances without shapes on the given layers are ignored
+    assert periodic.detect_periodic(core.layout("grating", ly, top), [[99, 0]]) is None
+
+
+def test_run_periodic(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    file_gds = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "examples", "devices.gds"
+    )
+    layout = lyprocessor.load_layout(file_gds, top_cell="bragg_te1550")
+    device = simprocessor.load_component_from_tech(layout, technology)
+    section = periodic.detect_periodic(
+        layout, [d["layer"] for d in technology["device"]]
+    )
+
+    # the padded cell's sources and monitors lie inside of its simulation
+    cell = periodic.segment_periodic(device, section)["cell"]
+    simulation = simprocessor.make_sim(
+        cell, in_port="all", wavl_min=1.5, wavl_max=1.6, wavl_pts=11, visualize=False
+    )
+    assert len(simulation.sim_jobs) == 2
+
+    sparams = periodic.run_periodic(
+        layout,
+        technology,
+        section=section,
+        backend=backends.local_backend(),
+        poll_interval=0,
+        wavl_min=1.5,
+        wavl_max=1.6,
+        wavl_pts=11,
+    )
+    assert sparams.ports == [1, 2] and sparams.data.shape == (2, 2, 1, 1, 11)
+    assert sparams.check()["passive"]
+
+    # de-embedding a lead of index n removes a phase of 2 pi n f length / c
+    freq = sparams.freq
+    lead = periodic.deembed(sparams, np.full((2, 1, 11), 2.0), 0.5)
+    shift = np.exp(-2j * np.pi * freq / td.C_0 * 2.0 * 0.5)
+    assert np.allclose(lead.data[1, 0, 0, 0], sparams.data[1, 0, 0, 0] * shift**2)
+
+
+def test_build_sim_from_tech_sparse():
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+
+    simulation = simprocessor.build_sim_from_tech(
+        tech=technology,
+        layout=layout,
+        in_port=0,
+        wavl_min=1.5,
+        wavl_max=1.6,
+        wavl_pts=101,
+        sparse_wavl=11,
+        z_span=4,
+        visualize=False,
+    )
+    monitor = simulation.sim_jobs[0]["sim"].monitors[0]
+    assert len(monitor.freqs) == 11
+    assert len(simulation.wavl) == 101
+
+
+def test_sparse_refinement(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    layout = lyprocessor.load_layout(
+        os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    )
+    simulation = simprocessor.build_sim_from_tech(
+        tech=technology, layout=layout, sparse_wavl=11, z_span=4, visualize=False
+    )
+    simulation.backend = backends.local_backend()
+
+    # the synthetic response fits within tolerance, nothing to refine
+    simulation.execute(poll_interval=0, refine=2)
+    assert len(simulation.wavl_sample) == 11
+
+    # an unreachable tolerance stops at the refinement cap
+    simulation.execute(poll_interval=0, refine=2, refine_pts=5, fit_tol=0)
+    assert len(simulation.wavl_sample) == 21
+    freqs = [
+        m.freqs
+        for m in simulation.sim_jobs[0]["sim"].monitors
+        if isinstance(m, td.ModeMonitor)
+    ]
+    assert all(np.allclose(f, td.C_0 / simulation.wavl_sample) for f in freqs)
+    assert simulation.s_parameters.S["S21_idx00"].s.shape == (101,)
+
+
+def test_consolidate_structures():
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+    device = simprocessor.load_component_from_tech(layout, technology)
+    assert len(simprocessor.make_structures(device)) == 6
+
+    sim = simprocessor.make_sim(device, visualize=False).sim_jobs[0]["sim"]
+    reference = simprocessor.make_sim(
+        device, visualize=False, consolidate=False
+    ).sim_jobs[0]["sim"]
+
+    # cladding folded into the background, port extensions merged into their layers
+    assert [s.name for s in sim.structures] == ["dev_0_0", "dev_1_0"]
+    assert np.isclose(sim.medium.permittivity, 1.48**2)
+
+    # same permittivity everywhere in the simulation domain
+    grid = reference.grid
+    eps = sim.epsilon_on_grid(grid, freq=2e14).values
+    eps_ref = reference.epsilon_on_grid(grid, freq=2e14).values
+    (x0, y0, z0), (x1, y1, z1) = reference.bounds
+    inside = np.ix_(
+        (grid.centers.x >= x0) & (grid.centers.x <= x1),
+        (grid.centers.y >= y0) & (grid.centers.y <= y1),
+        (grid.centers.z >= z0) & (grid.centers.z <= z1),
+    )
+    assert np.allclose(eps[inside], eps_ref[inside])
+
+    # port extensions take their layer's sidewall from copied materials too
+    for p in device.ports:
+        p.material = copy.deepcopy(p.material)
+    for s in device.structures[2:]:
+        for i in s:
+            i.sidewall_angle = 85
+    structures = simprocessor.make_structures(device)
+    sidewalls = {s.name: s.geometry.sidewall_angle for s in structures}
+    assert sidewalls["port_opt1"] == sidewalls["port_opt2"] == sidewalls["dev_0_0"] != 0
+
+
+def test_clip_component():
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+    device = simprocessor.load_component_from_tech(layout, technology)
+    layer = device.structures[2]
+    x, y = np.asarray(device.bounds.vertices).T
+
+    # a neighboring device and a routing stub leaving the region
+    neighbor = [
+        [x.max() + 50, 0],
+        [x.max() + 60, 0],
+        [x.max() + 60, 1],
+        [x.max() + 50, 1],
+    ]
+    stub = [
+        [x.min(), -0.25],
+        [x.max() + 100, -0.25],
+        [x.max() + 100, 0.25],
+        [x.min(), 0.25],
+    ]
+    for name, polygon in [("neighbor", neighbor), ("stub", stub)]:
+        layer.append(
+            core.structure(
+                name=name,
+                polygon=polygon,
+                z_base=layer[0].z_base,
+                z_span=layer[0].z_span,
+                material=layer[0].material,
+                sidewall_angle=layer[0].sidewall_angle,
+            )
+        )
+    num_polygons = sum(len(s) for s in device.structures if isinstance(s, list))
+
+    clipped, report = simprocessor.clip_component(device, margin=3.0)
+    assert report["polygons"] == (num_polygons, num_polygons - 1)
+    assert report["vertices"][1] == report["vertices"][0] - 4
+    stub = [i for i in clipped.structures[2] if i.name == "stub"][0]
+    assert np.isclose(np.max(np.asarray(stub.polygon)[:, 0]), x.max() + 3.0)
+    assert clipped.structures[:2] == device.structures[:2]
+
+    # clipping is opt-in
+    names = [s.name for s in simprocessor.make_structures(device)]
+    assert "neighbor" in names
+    assert "neighbor" not in [
+        s.name for s in simprocessor.make_structures(device, clip=True)
+    ]
+
+    # the stub runs out through a port: clipped beyond the port extension and the PML
+    sim = simprocessor.make_sim(device, clip=True, consolidate=False, visualize=False)
+    sim = sim.sim_jobs[0]["sim"]
+    pml = simprocessor.pml_thickness(sim.boundary_spec, 1.65, 15)
+    stub = [s for s in sim.structures if s.name == "stub"][0]
+    (x0, y0, _), (x1, y1, _) = stub.geometry.bounds
+    assert (
+        x1 >= max(sim.simulation_bounds[1][0], x.max() + 4.0)
+        and x1 <= x.max() + max(4.0, pml) + 0.01
+    )
+    assert np.isclose(x0, x.min()) and np.isclose(y0, -0.25, atol=0.01)
+
+
+def test_polygon_holes():
+    import tidy3d as td
+
+    # ring, a polygon with a hole
+    ly = pya.Layout()
+    ly.dbu = 0.001
+    cell = ly.create_cell("ring")
+    outer = pya.Polygon.ellipse(pya.Box(-5000, -5000, 5000, 5000), 64)
+    inner = pya.Polygon.ellipse(pya.Box(-4500, -4500, 4500, 4500), 64)
+    cell.shapes(ly.layer(1, 0)).insert(pya.Region(outer) - pya.Region(inner))
+    ring = core.layout("ring", ly, cell)
+
+    structures = lyprocessor.load_structure(
+        ring,
+        name="ring",
+        layer=[1, 0],
+        z_base=0,
+        z_span=0.22,
+        material=td.Medium(permittivity=12),
+    )
+    assert len(structures) == 1
+    assert len(structures[0].polygon) == 64 and [
+        len(h) for h in structures[0].holes
+    ] == [64]
+
+    bounds = core.region(
+        vertices=[[-6, -6], [6, -6], [6, 6], [-6, 6]], z_center=0.11, z_span=2
+    )
+    device = core.component(
+        name="ring", structures=[structures], ports=[], bounds=bounds
+    )
+    geometry = simprocessor.make_structures(device)[0].geometry
+    assert isinstance(geometry, td.ClipOperation)
+    x, y, z = np.array([0.0, 4.75, 0.0]), np.array([0.0, 0.0, 4.75]), np.full(3, 0.11)
+    assert geometry.inside(x, y, z).tolist() == [False, True, True]
+
+    # holes survive biasing
+    biased = variation.bias_component(device, 0.1).structures[0][0]
+    assert len(biased.holes) == 1 and len(biased.polygon) == 64
+
+
+def test_heal_component():
+    import tidy3d as td
+
+    def wg(name, polygon):
+        return core.structure(
+            name=name,
+            polygon=polygon,
+            z_base=0,
+            z_span=0.22,
+            material=td.Medium(permittivity=12),
+        )
+
+    # waveguide halves abutting with a 2 nm gap, and a 4 nm wide sliver
+    layer = [
+        wg("a", [[-5, -0.25], [-0.001, -0.25], [-0.001, 0.25], [-5, 0.25]]),
+        wg("b", [[0.001, -0.25], [5, -0.25], [5, 0.25], [0.001, 0.25]]),
+        wg("c", [[2, 0.25], [2.004, 0.25], [2.004, 1.0], [2, 1.0]]),
+    ]
+    bounds = core.region(
+        vertices=[[-4, -2], [4, -2], [4, 2], [-4, 2]], z_center=0.11, z_span=2
+    )
+    device = core.component(name="wg", structures=[layer], ports=[], bounds=bounds)
+
+    healed, report = simprocessor.heal_component(device, min_feature=0.01)
+    assert report["polygons"] == (3, 1) and report["vertices"] == (12, 4)
+    assert np.isclose(report["area"], 0.001 + 0.003)
+    assert report["cells"][1] < report["cells"][0]
+    assert np.allclose(
+        np.sort(np.asarray(healed.structures[0][0].polygon), axis=0)[[0, -1]],
+        [[-5, -0.25], [5, 0.25]],
+    )
+
+    # features above the minimum are kept, abutting polygons are merged
+    _, report = simprocessor.heal_component(device, min_feature=0.001, cells=False)
+    assert (
+        report["polygons"] == (3, 2) and report["area"] == 0 and "cells" not in report
+    )
+
+
+class _lum_session:
+    """Stand-in Lumerical session recording the scripts it is sent."""
+
+    def __init__(self):
+        self.scripts = []
+
+    def eval(self, script):
+        self.scripts.append(script)
+
+
+def test_to_lumerical(tmp_path):
+    import re
+    from gds_fdtd import lum_tools
+
+    # LSF strings have no escapes, unsafe characters are concatenated with char()
+    assert lum_tools.lsf_string("opt1") == '"opt1"'
+    assert lum_tools.lsf_string('a"b\\c') == '"a"+char(34)+"b"+char(92)+"c"'
+    assert lum_tools.lsf_string("\n") == "char(10)" and lum_tools.lsf_string("") == '""'
+
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    device = simprocessor.load_component_from_tech(
+        lyprocessor.load_layout(fname_gds), technology
+    )
+
+    lum = _lum_session()
+    fname = str(tmp_path / "device.lsf")
+    script = lum_tools.to_lumerical(device, lum, fname=fname)
+    assert lum.scripts == [script]
+    with open(fname) as f:
+        assert f.read() == script
+
+    num_polygons = sum(len(s) if isinstance(s, list) else 1 for s in device.structures)
+    assert script.count("addpoly;") == num_polygons + len(device.ports)
+    assert script.count('addtogroup("ports");') == len(device.ports)
+
+    # vertex matrices in meters
+    vertices = re.findall(r'set\("vertices",\[(.*?)\]\);', script)[2]
+    vertices = np.array(
+        [[float(v) for v in row.split(",")] for row in vertices.split(";")]
+    )
+    assert np.allclose(vertices, np.array(device.structures[2][0].polygon) * 1e-6)
+
+
+def test_fdtd_lsf(tmp_path):
+    import sys
+    from gds_fdtd import lum_tools
+
+    # exported without lumapi
+    assert "lumapi" not in sys.modules
+
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    device = simprocessor.load_component_from_tech(
+        lyprocessor.load_layout(fname_gds), technology
+    )
+
+    fname = str(tmp_path / "device.lsf")
+    script = lum_tools.export_lsf(
+        device, fname, num_modes=2, field_monitor=True, fsp="device.fsp"
+    )
+    with open(fname) as f:
+        assert f.read() == script
+    lines = script.splitlines()
+    assert lines[0] == "newproject;" and lines[-1] == 'save("device.fsp");'
+    assert script.count("addfdtd;") == 1 and script.count("addprofile;") == 1
+    assert script.count("addport;") == len(device.ports)
+    assert 'set("selected mode numbers",[1,2]);' in script
+    assert f'set("x min",{device.bounds.x_min * 1e-6:.12g});' in script
+    for p in device.ports:
+        assert f'set("name","{p.name}");\nset("injection axis","x-axis");' in script
+    assert 'setglobalmonitor("frequency points",101);' in script
+
+
+def test_lsf_holes_filled_with_cladding():
+    from gds_fdtd import lum_tools
+
+    si, oxide = {"lum": "Si (Silicon) - Palik"}, {"lum": "SiO2 (Glass) - Palik"}
+    ring = core.structure(
+        name="ring",
+        polygon=[[0, 0], [4, 0], [4, 4], [0, 4]],
+        z_base=0,
+        z_span=0.22,
+        material=si,
+        holes=[[[1, 1], [3, 1], [3, 3], [1, 3]]],
+    )
+    bounds = core.region(
+        vertices=[[-1, -1], [5, -1], [5, 5], [-1, 5]], z_center=0, z_span=4
+    )
+    clad = lyprocessor.load_structure_from_bounds(
+        bounds, name="clad", z_base=0, z_span=3, material=oxide
+    )
+    device = core.component(
+        name="ring", structures=[clad, [ring]], ports=[], bounds=bounds
+    )
+
+    # holes take the cladding's material and override the ring
+    script = lum_tools.to_lsf(device)
+    hole = script[script.index('set("name","ring_hole_0");') :]
+    hole = hole[: hole.index("addpoly;")] if "addpoly;" in hole else hole
+    assert 'set("material","SiO2 (Glass) - Palik");' in hole
+    assert 'set("mesh order",1);' in hole
+    assert '"etch"' not in script
+
+
+def test_lum_pool():
+    import threading
+    import time
+    from gds_fdtd import lum_tools
+
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    device = simprocessor.load_component_from_tech(
+        lyprocessor.load_layout(fname_gds), technology
+    )
+
+    lum = _lum_session()
+    script = lum_tools.setup_lum_fdtd(
+        device, lum, in_port="all", run=True, sparams_file="s.dat", mesh_override=0.02
+    )
+    assert lum.scripts == [script]
+    assert (
+        'setsweep("sparams","Excite all ports",1);' in script
+        and 'set("dz",2e-08);' in script
+    )
+    assert script.endswith('runsweep("sparams");\nexportsweep("sparams","s.dat");\n')
+    script = lum_tools.setup_lum_fdtd(
+        device, lum, in_port=device.ports[1], mode_index=1
+    )
+    assert (
+        f'set("source port","{device.ports[1].name}");\nset("source mode","mode 2");'
+        in script
+    )
+    assert "addsweep" not in script and "run;" not in script
+
+    # sessions are opened once, concurrently, and reused
+    opened = []
+    busy, max_busy = [0], [0]
+    starting, max_starting = [0], [0]
+    lock = threading.Lock()
+
+    class session(_lum_session):
+        def eval(self, script):
+            with lock:
+                busy[0] += 1
+                max_busy[0] = max(max_busy[0], busy[0])
+            time.sleep(0.05)
+            super().eval(script)
+            with lock:
+                busy[0] -= 1
+
+    def factory():
+        with lock:
+            starting[0] += 1
+            max_starting[0] = max(max_starting[0], starting[0])
+        time.sleep(0.05)
+        with lock:
+            starting[0] -= 1
+            opened.append(session())
+            return opened[-1]
+
+    with lum_tools.lum_pool(size=2, factory=factory) as pool:
+        scripts = pool.setup(
+            [device] * 6, in_port="all", run=True, sparams_file="{name}.dat"
+        )
+        assert len(pool.sessions) == 2
+    assert len(opened) == 2 and max_busy[0] == 2 and max_starting[0] == 2
+    assert sum(len(s.scripts) for s in opened) == 6
+    assert all(f'exportsweep("sparams","{device.name}.dat");' in s for s in scripts)
+
+
+def test_from_gdsfactory():
+    gf = pytest.importorskip("gdsfactory")
+
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    device = simprocessor.from_gdsfactory(
+        gf.components.straight(length=10, width=0.5), technology
+    )
+
+    # one device layer, matched to the tech by layer number
+    layers = [s for s in device.structures if isinstance(s, list)]
+    assert len(layers) == 1 and layers[0][0].z_span == technology["device"][0]["z_span"]
+    x, y = np.asarray(layers[0][0].polygon).T
+    assert np.isclose(np.ptp(x), 10) and np.isclose(np.ptp(y), 0.5)
+    assert [(p.direction, p.height, p.center[2]) for p in device.ports] == [
+        (180, 0.22, 0.11),
+        (0, 0.22, 0.11),
+    ]
+    assert all(p.material is layers[0][0].material for p in device.ports)
+
+
+def test_from_gdsfactory_fake_component():
+    # the kfactory interface used by from_gdsfactory, without gdsfactory
+    from types import SimpleNamespace
+
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    dbu = 0.005  # not the 1 nm default, to catch unit mix-ups
+    wg = pya.Polygon(pya.Box(0, -50, 2000, 50))  # 10 x 0.5 um
+    ring = pya.Polygon(pya.Box(0, 200, 400, 600))
+    ring.insert_hole(pya.Box(100, 300, 300, 500))
+    infos = {0: pya.LayerInfo(1, 0), 1: pya.LayerInfo(2, 0)}
+    ports = [
+        SimpleNamespace(
+            name="o1", dcenter=(0.0, 0.0), dwidth=0.5, orientation=180, layer=0
+        ),
+        SimpleNamespace(
+            name="o2", dcenter=(10.0, 0.0), dwidth=0.5, orientation=0, layer=0
+        ),
+        SimpleNamespace(
+            name="x", dcenter=(0.0, 0.0), dwidth=0.5, orientation=0, layer=1
+        ),
+    ]
+    fake = SimpleNamespace(
+        name="fake",
+        kcl=SimpleNamespace(dbu=dbu, get_info=infos.__getitem__),
+        get_polygons=lambda by: {(1, 0): [wg, ring], (2, 0): [wg]},
+        ports=ports,
+        dbbox=lambda: pya.DBox(0, -0.25, 10, 3),
+    )
+    device = simprocessor.from_gdsfactory(fake, technology)
+
+    layers = [s for s in device.structures if isinstance(s, list)]
+    assert len(layers) == 1 and [s.name for s in layers[0]] == ["poly_0_0", "poly_0_1"]
+    x, y = np.asarray(layers[0][0].polygon).T
+    assert np.isclose(np.ptp(x), 10) and np.isclose(np.ptp(y), 0.5)
+    assert len(layers[0][1].holes) == 1 and np.isclose(
+        np.ptp(np.asarray(layers[0][1].holes[0])[:, 0]), 1
+    )
+    assert layers[0][0].sidewall_angle == 85
+
+    assert [p.name for p in device.ports] == ["o1", "o2"]
+    assert device.ports[1].center == [10.0, 0.0, 0.11] and device.ports[1].width == 0.5
+    assert all(
+        p.height == 0.22 and p.material is layers[0][0].material for p in device.ports
+    )
+
+
+def test_build_sim_from_tech_field_monitor_policy():
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+
+    simulation = simprocessor.build_sim_from_tech(
+        tech=technology,
+        layout=layout,
+        in_port=0,
+        wavl_min=1.5,
+        wavl_max=1.6,
+        wavl_pts=101,
+        z_span=4,
+        field_monitor_axis="z",
+        field_monitor_wavl="edges",
+        field_monitor_fields=["Ey"],
+        field_monitor_interval=2,
+        field_monitor_crop=True,
+        visualize=False,
+    )
+    monitor = simulation.sim_jobs[0]["sim"].monitors[-1]
+    assert isinstance(monitor, td.FieldMonitor)
+    assert np.allclose(sorted(td.C_0 / np.array(monitor.freqs)), [1.5, 1.55, 1.6])
+    assert monitor.fields == ("Ey",)
+    assert monitor.interval_space == (2, 2, 2)
+    assert monitor.size[0] == simulation.device.bounds.x_span
+
+
+def test_simulation_execute_concurrent(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+
+    simulation = simprocessor.build_sim_from_tech(
+        tech=technology,
+        layout=layout,
+        in_port="all",
+        wavl_pts=11,
+        z_span=4,
+        visualize=False,
+    )
+    simulation.backend = backends.local_backend()
+    simulation.execute(max_workers=2, poll_interval=0)
+
+    assert len(simulation.results) == 2
+    assert os.path.exists(
+        os.path.join(layout.name, f"{simulation.sim_jobs[1]['name']}.hdf5")
+    )
+    assert len(simulation.s_parameters._entries) == 4
+    assert (
+        simulation.s_parameters._entries[0].idx_in
+        == simulation.sim_jobs[0]["in_port"].idx
+    )
+    assert np.allclose(np.abs(simulation.s_parameters.S["S21_idx00"].s), np.sqrt(1 / 3))
+
+
+def test_sweep(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+
+    # width_ports 2.0 is listed twice, its duplicate jobs only run once
+    s = sweep.sweep(
+        layout,
+        technology,
+        {"z_span": [3, 4], "width_ports": [2.0, 2.0, 3.0]},
+        in_port="all",
+        wavl_pts=11,
+    )
+    sim_backend = backends.local_backend()
+    data = s.run(backend=sim_backend, poll_interval=0)
+    assert len(sim_backend.tasks) == 2 * 2 * 2
+    assert data.dims == (
+        "z_span",
+        "width_ports",
+        "port_out",
+        "port_in",
+        "mode_out",
+        "mode_in",
+        "f",
+    )
+    assert data.shape == (2, 3, 2, 2, 1, 1, 11)
+    s21 = data.sel(z_span=4, port_out=2, port_in=1, mode_out=0, mode_in=0).isel(
+        width_ports=0
+    )
+    assert np.allclose(np.abs(s21), np.sqrt(1 / 3))
+
+    # frequency grids that differ between points
+    s = sweep.sweep(layout, technology, {"wavl_pts": [5, 7]}, z_span=4)
+    data = s.run(backend=backends.local_backend(), poll_interval=0)
+    assert data.dims[-1] == "f_index" and data["f"].dims == ("wavl_pts", "f_index")
+    assert np.isnan(data.sel(wavl_pts=5).isel(f_index=6)).all()
+
+    with pytest.raises(ValueError):
+        sweep.sweep(layout, technology, {"mesh": [10]}).build()
+
+
+def test_simulation_pipeline():
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+
+    build = pipeline.simulation_pipeline()
+    assert build.downstream("z_span") == {
+        "region",
+        "component",
+        "structures",
+        "monitors",
+        "simulation",
+    }
+    assert "layers" not in build.downstream("width_ports")
+
+    for z_span in [3, 4, 3]:
+        for width_ports in [2.0, 3.0]:
+            simulation = build.get(
+                "simulation",
+                fname=fname_gds,
+                tech=technology,
+                z_span=z_span,
+                width_ports=width_ports,
+                wavl_pts=11,
+            )
+            assert simulation.sim_jobs[0]["sim"].size[2] == z_span
+    # only the stages downstream of a changed parameter are recomputed
+    assert build.calls["layout"] == build.calls["layers"] == build.calls["ports"] == 1
+    assert (
+        build.calls["region"]
+        == build.calls["component"]
+        == build.calls["structures"]
+        == 2
+    )
+    assert build.calls["monitors"] == build.calls["simulation"] == 4
+
+    # unclipped structures do not depend on the mesh
+    build.get(
+        "simulation", fname=fname_gds, tech=technology, z_span=3, grid_cells_per_wvl=10
+    )
+    assert build.calls["structures"] == 2 and build.calls["pml"] == 2
+
+    # same simulation as the direct route
+    layout = lyprocessor.load_layout(fname_gds)
+    direct = simprocessor.build_sim_from_tech(
+        tech=technology,
+        layout=layout,
+        z_span=4,
+        width_ports=3.0,
+        wavl_pts=11,
+        visualize=False,
+    )
+    staged = build.get(
+        "simulation",
+        layout=layout,
+        tech=technology,
+        z_span=4,
+        width_ports=3.0,
+        wavl_pts=11,
+        in_port=0,
+    )
+    assert cache.simulation_hash(staged.sim_jobs[0]["sim"]) == cache.simulation_hash(
+        direct.sim_jobs[0]["sim"]
+    )
+
+    with pytest.raises(ValueError):
+        build.get("simulation", fname=fname_gds, tech=technology, mesh=10)
+
+    # layouts are keyed on their content, not on their identity
+    component = build.get("component", layout=layout, tech=technology, z_span=4)
+    reloaded = lyprocessor.load_layout(fname_gds)
+    assert build.get("component", layout=reloaded, tech=technology) is component
+    reloaded.cell.shapes(reloaded.ly.layer(1, 0)).insert(pya.Box(0, 0, 100, 100))
+    assert build.get("component", layout=reloaded, tech=technology) is not component
+
+    # least recently used results are dropped
+    double = pipeline.stage("double", lambda x: 2 * x)
+    small = pipeline.pipeline([double], max_entries=2)
+    for x in [1, 2, 1, 3, 1]:
+        small.get("double", x=x)
+    assert small.calls["double"] == 3 and len(small.memo["double"]) == 2
+    small.get("double", x=2)
+    assert small.calls["double"] == 4
+    small.clear("double")
+    assert not small.memo["double"]
+
+
+def test_variation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    layout = lyprocessor.load_layout(
+        os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    )
+
+    variants = variation.corners(bias=(-0.01, 0.01), dz=(-0.005, 0.005))
+    assert len(variants) == 5 and variants[0] == {"bias": 0.0, "dz": 0.0}
+    # samples rounding to the same variant are dropped
+    assert len(variation.monte_carlo(100, seed=0, bias=1e-4)) < 100
+
+    nominal = simprocessor.load_component_from_tech(layout, technology)
+    build = pipeline.simulation_pipeline()
+    variant = {"bias": 0.02, "dz": 0.01, "sidewall": -2}
+    device = variation.variant_component(layout, technology, variant, build=build)
+    nominal_wg, wg = nominal.structures[2][0], device.structures[2][0]
+    assert np.isclose(wg.z_span, nominal_wg.z_span + 0.01)
+    assert wg.sidewall_angle == nominal_wg.sidewall_angle - 2
+    assert np.isclose(device.ports[0].height, nominal.ports[0].height + 0.01)
+    assert np.isclose(device.ports[0].z, nominal.ports[0].z + 0.005)
+    # the nominal component is built once and left untouched
+    again = variation.variant_component(layout, technology, variant, build=build)
+    assert again.structures[2][0].sidewall_angle == wg.sidewall_angle
+    assert (
+        build.calls["ports"] == build.calls["region"] == build.calls["component"] == 1
+    )
+    assert (
+        build.get("component", layout=layout, tech=technology).structures[2][0].z_span
+        == 0.22
+    )
+    # each edge moves out by half the bias
+    from shapely.geometry import Polygon
+
+    polygon = Polygon(nominal_wg.polygon)
+    assert np.isclose(
+        Polygon(wg.polygon).area, polygon.area + polygon.length * 0.01, rtol=1e-2
+    )
+    assert np.isclose(device.ports[0].width, nominal.ports[0].width + 0.02)
+    assert technology["device"][0]["z_span"] == 0.22  # the nominal tech is not modified
+
+    data = variation.run_variants(
+        layout,
+        technology,
+        variants[:3],
+        backend=backends.local_backend(),
+        poll_interval=0,
+        wavl_pts=5,
+        z_span=4,
+    )
+    assert data.dims[0] == "variant" and data.sizes["variant"] == 3
+    assert list(data["bias"].values) == [0.0, -0.01, -0.01]
+    stats = variation.statistics(data)
+    assert stats["mean"].dims == data.dims[1:]
+    assert stats["percentile"].sizes["percentile"] == 3
+    # synthetic data is geometry independent
+    assert np.allclose(stats["std"].sel(port_out=2, port_in=1), 0)
+
+
+def test_richardson():
+    h = 1 / np.array([6, 9, 13.5])
+    m = np.stack([1 + 0.5 * h**2, 2 - h**2], axis=1)  # two metric entries per sample
+    assert np.isclose(convergence.estimate_order(h, m), 2, atol=1e-6)
+    estimate, order = convergence.richardson(h, m)
+    assert np.allclose(estimate, [1, 2], atol=1e-9)
+    estimate, order = convergence.richardson(h[:2], m[:2], order=2)
+    assert np.allclose(estimate, [1, 2]) and order == 2
+
+
+def test_run_convergence(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+    layout = lyprocessor.load_layout(
+        os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    )
+
+    def mesh_error(simulation):
+        # second order discretization error of the mesh
+        steps = simulation.sim_jobs[0]["sim"].grid_spec.grid_x.min_steps_per_wvl
+        return 1 + 2 / steps**2
+
+    assert convergence.refinements(6, 1.5, 4) == [6, 9, 13.5, 20.25]
+    study = convergence.run_convergence(
+        layout,
+        technology,
+        "grid_cells_per_wvl",
+        start=6,
+        factor=1.5,
+        metric=mesh_error,
+        tol=1e-6,
+        extrapolate=True,
+        backend=backends.local_backend(),
+        poll_interval=0,
+        wavl_pts=5,
+        z_span=4,
+    )
+    # the fine meshes are never run
+    assert study["converged"] and study["values"] == [6, 9, 13.5, 20.25]
+    assert np.isclose(study["result"], 1) and np.isclose(study["order"], 2)
+    # all steps share one build pipeline
+    calls = study["sweep"].pipeline.calls
+    assert calls["layers"] == calls["structures"] == 1 and calls["simulation"] == 4
+
+    with pytest.raises(ValueError):
+        convergence.run_convergence(
+            layout, technology, "z_span", [1, 2], extrapolate=True
+        )
+    with pytest.raises(ValueError):
+        convergence.run_convergence(layout, technology, "z_span")
+
+
+def test_local_backend_retries(tmp_path):
+    sim_backend = backends.local_backend(latency=0.01, failure_rate=0.5, seed=1)
+    sim = td.Simulation(
+        size=(1, 1, 1), run_time=1e-12, grid_spec=td.GridSpec.auto(wavelength=1.55)
+    )
+    sim_jobs = [{"sim": sim, "name": f"job_{i}"} for i in range(20)]
+    finished = []
+    sim_results = execution.run_jobs(
+        sim_jobs,
+        backend=sim_backend,
+        out_dir=str(tmp_path),
+        on_result=lambda idx, data: finished.append(idx),
+        max_workers=8,
+        poll_interval=0.005,
+        retries=20,
+    )
+    assert sorted(finished) == list(range(20))
+    assert all(isinstance(r, results.lazy_sim_data) for r in sim_results)
+    assert len(sim_backend.tasks) > 20  # some jobs were resubmitted
+
+    with pytest.raises(RuntimeError):
+        execution.run_jobs(
+            sim_jobs[:1],
+            backend=backends.local_backend(failure_rate=1.0),
+            out_dir=str(tmp_path),
+            poll_interval=0,
+        )
+
+
+def test_lazy_sim_data(tmp_path):
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+
+    simulation = simprocessor.build_sim_from_tech(
+        tech=technology,
+        layout=layout,
+        in_port=0,
+        wavl_pts=11,
+        num_modes=2,
+        z_span=4,
+        visualize=False,
+    )
+    sim = simulation.sim_jobs[0]["sim"]
+    path = str(tmp_path / "data.hdf5")
+    full_data = backends.synthetic_sim_data(sim)
+    full_data.to_file(path)
+
+    lazy_data = results.lazy_sim_data(path)
+    assert lazy_data.monitor_names == ["opt1", "opt2"]
+    for name in lazy_data.monitor_names:
+        assert lazy_data.amps(name).equals(full_data[name].amps)
+    assert lazy_data["opt2"].amps.shape == (2, 11, 2)
+
+    stacked = lazy_data.mode_amps(["opt2", "opt1"])
+    assert stacked.shape == (2, 2, 2, 11)
+    expected = full_data["opt1"].amps.sel(direction="-", mode_index=1).values
+    assert np.array_equal(stacked[1, 1, 1], expected)
+    assert lazy_data.simulation == sim
+    assert isinstance(lazy_data.load(), td.SimulationData)
+
+    # the full data is read once and kept until released
+    data = lazy_data.load()
+    assert lazy_data.load() is data and lazy_data.data is data.data
+    lazy_data.release()
+    assert lazy_data.load() is not data
+
+    # attribute fallbacks read the file without keeping it
+    lazy_data.release()
+    assert lazy_data.data is not None and lazy_data._data is None
+
+
+def test_job_ledger_resume(tmp_path):
+    sim_backend = backends.local_backend()
+    sim = td.Simulation(
+        size=(1, 1, 1), run_time=1e-12, grid_spec=td.GridSpec.auto(wavelength=1.55)
+    )
+    sim_jobs = [{"sim": sim, "name": f"job_{i}"} for i in range(3)]
+    jobs_ledger = ledger.job_ledger(str(tmp_path / "jobs.sqlite"))
+
+    execution.run_jobs(
+        sim_jobs,
+        backend=sim_backend,
+        out_dir=str(tmp_path),
+        ledger=jobs_ledger,
+        poll_interval=0,
+    )
+    assert [j["state"] for j in jobs_ledger.jobs()] == [ledger.COMPLETED] * 3
+    assert [h["state"] for h in jobs_ledger.history("job_0")] == [
+        ledger.SUBMITTED,
+        ledger.COMPLETED,
+    ]
+
+    # interrupted run: job_1 still running on the backend, job_2 never finished
+    task_id = sim_backend.submit(sim, "job_1")
+    jobs_ledger.record("job_1", cache.simulation_hash(sim), task_id, ledger.SUBMITTED)
+    jobs_ledger.record("job_2", "stale_hash", "unknown", ledger.SUBMITTED)
+    num_tasks = len(sim_backend.tasks)
+
+    execution.run_jobs(
+        sim_jobs,
+        backend=sim_backend,
+        out_dir=str(tmp_path),
+        ledger=jobs_ledger,
+        resume=True,
+        poll_interval=0,
+    )
+    assert sim_jobs[1]["task_id"] == task_id
+    assert len(sim_backend.tasks) == num_tasks + 1  # only job_2 is resubmitted
+    assert all(j["state"] == ledger.COMPLETED for j in jobs_ledger.jobs())
+
+
+def test_result_cache_lru(tmp_path):
+    sims = [
+        td.Simulation(
+            size=(1, 1, 1), run_time=1e-12, grid_spec=td.GridSpec.auto(wavelength=w)
+        )
+        for w in [1.5, 1.55, 1.6]
+    ]
+    assert cache.simulation_hash(sims[0]) == cache.simulation_hash(sims[0].copy())
+    assert cache.simulation_hash(sims[0]) != cache.simulation_hash(sims[1])
+
+    results_cache = cache.result_cache(cache_dir=str(tmp_path / "cache"))
+    keys = []
+    for i, sim in enumerate(sims):
+        data_path = str(tmp_path / f"data_{i}.hdf5")
+        td.SimulationData(simulation=sim, data=()).to_file(data_path)
+        keys.append(results_cache.put(sim, data_path))
+        os.utime(results_cache.path(keys[-1]), (i, i))
+
+    assert sims[0] in results_cache
+    # refreshes entry 0
+    assert isinstance(results_cache.get(sims[0]), results.lazy_sim_data)
+
+    results_cache.prune(max_size=results_cache.size - 1)
+    assert [e["key"] for e in results_cache.entries()] == [keys[0], keys[2]]
+    results_cache.clear()
+    assert results_cache.entries() == []
+
+
+def test_simulation_execute_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech_path = os.path.join(os.path.dirname(__file__), "tech.yaml")
+    technology = core.parse_yaml_tech(tech_path)
+
+    fname_gds = os.path.join(os.path.dirname(__file__), "si_sin_escalator.gds")
+    layout = lyprocessor.load_layout(fname_gds)
+
+    results_cache = cache.result_cache(cache_dir=str(tmp_path / "cache"))
+    simulation = simprocessor.build_sim_from_tech(
+        tech=technology,
+        layout=layout,
+        in_port=0,
+        wavl_pts=11,
+        z_span=4,
+        visualize=False,
+    )
+    simulation.backend = backends.local_backend()
+    simulation.execute(poll_interval=0, cache=results_cache)
+    assert len(results_cache.entries()) == 1
+    s21 = simulation.s_parameters.S["S21_idx00"].s
+
+    # a cache hit must not submit the job again
+    simulation.backend = backends.local_backend(failure_rate=1.0)
+    simulation.execute(poll_interval=0, cache=results_cache)
+    assert np.allclose(simulation.s_parameters.S["S21_idx00"].s, s21)
+
+
 if __name__ == "__main__":
     pytest.main([__file__])